@@ -1,27 +1,194 @@
-from pprint import pprint
+import logging
 from dotenv import load_dotenv
 import os
 
+from src.core.prompts import getPrompts
+
+logger = logging.getLogger(__name__)
+
+
 load_dotenv()
 
 
 def getConfig() -> dict:
     telegram_bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
     open_ai_api_key = os.getenv("OPEN_AI_API_KEY")
+    openai_base_url = os.getenv("OPENAI_BASE_URL") or None
+    telegram_api_base_url = os.getenv("TELEGRAM_API_BASE_URL") or None
+    telegram_file_base_url = os.getenv("TELEGRAM_FILE_BASE_URL") or None
     aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
     aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
     dynamo_table_name = os.getenv("DYNAMO_TABLE_NAME")
+    # Required: wardrobe items live in their own table. Create and fill it with
+    # `python -m src.tools.migrate_wardrobe --create-table` before deploying a version that reads it.
+    dynamo_wardrobe_table_name = os.getenv("DYNAMO_WARDROBE_TABLE_NAME")
     region_name = os.getenv("REGION_NAME")
     s3_name = os.getenv("S3_NAME")
+    telegram_concurrent_updates = int(os.getenv("TELEGRAM_CONCURRENT_UPDATES", "256"))
+    persistence_backend = os.getenv("PERSISTENCE_BACKEND", "sqlite")
+    persistence_sqlite_path = os.getenv("PERSISTENCE_SQLITE_PATH", "bot_state.sqlite3")
+    persistence_dynamo_table_name = os.getenv("PERSISTENCE_DYNAMO_TABLE_NAME")
+    persistence_flush_interval = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "5"))
+    dynamo_write_behind_interval = float(os.getenv("DYNAMO_WRITE_BEHIND_INTERVAL", "0.5"))
+    dynamo_write_behind_max_items = int(os.getenv("DYNAMO_WRITE_BEHIND_MAX_ITEMS", "25"))
+    profile_cache_max_entries = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "1000"))
+    profile_cache_ttl_seconds = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+    profile_cache_max_bytes = int(os.getenv("PROFILE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    history_backend = os.getenv("HISTORY_BACKEND", "memory")
+    history_sqlite_path = os.getenv("HISTORY_SQLITE_PATH", "history.sqlite3")
+    history_max_turns = int(os.getenv("HISTORY_MAX_TURNS", "20"))
+    history_max_user_chars = int(os.getenv("HISTORY_MAX_USER_CHARS", "16000"))
+    history_max_users = int(os.getenv("HISTORY_MAX_USERS", "10000"))
+    history_max_total_chars = int(os.getenv("HISTORY_MAX_TOTAL_CHARS", "50000000"))
+    history_idle_ttl_seconds = float(os.getenv("HISTORY_IDLE_TTL_SECONDS", str(24 * 3600)))
+    prompt_budget_tokens = int(os.getenv("PROMPT_BUDGET_TOKENS", "3000"))
+    history_summarize_after_tokens = int(os.getenv("HISTORY_SUMMARIZE_AFTER_TOKENS", "1500"))
+    history_keep_recent_turns = int(os.getenv("HISTORY_KEEP_RECENT_TURNS", "4"))
+    embedding_provider = os.getenv("EMBEDDING_PROVIDER", "openai")
+    embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "256"))
+    style_candidates_per_category = int(os.getenv("STYLE_CANDIDATES_PER_CATEGORY", "5"))
+    style_mode = os.getenv("STYLE_MODE", "two_step")
+    style_catalog_max_items = int(os.getenv("STYLE_CATALOG_MAX_ITEMS", "40"))
+    style_catalog_summary_chars = int(os.getenv("STYLE_CATALOG_SUMMARY_CHARS", "60"))
+    s3_fetch_concurrency = int(os.getenv("S3_FETCH_CONCURRENCY", "16"))
+    photo_phash_max_distance = int(os.getenv("PHOTO_PHASH_MAX_DISTANCE", "6"))
+    album_window_seconds = float(os.getenv("ALBUM_WINDOW_SECONDS", "1.0"))
+    message_window_seconds = float(os.getenv("MESSAGE_WINDOW_SECONDS", "1.0"))
+    message_max_delay_seconds = float(os.getenv("MESSAGE_MAX_DELAY_SECONDS", "4.0"))
+    image_original_max_edge = int(os.getenv("IMAGE_ORIGINAL_MAX_EDGE", "2560"))
+    image_analysis_max_edge = int(os.getenv("IMAGE_ANALYSIS_MAX_EDGE", "1024"))
+    image_thumbnail_max_edge = int(os.getenv("IMAGE_THUMBNAIL_MAX_EDGE", "512"))
+    image_jpeg_quality = int(os.getenv("IMAGE_JPEG_QUALITY", "90"))
+    vision_detail = os.getenv("VISION_DETAIL", "auto")
+    vision_image_source = os.getenv("VISION_IMAGE_SOURCE", "inline")
+    s3_presigned_url_expires_seconds = int(os.getenv("S3_PRESIGNED_URL_EXPIRES_SECONDS", "3600"))
+    s3_presigned_url_refresh_margin_seconds = float(os.getenv("S3_PRESIGNED_URL_REFRESH_MARGIN_SECONDS", "300"))
+    s3_presigned_url_cache_max_entries = int(os.getenv("S3_PRESIGNED_URL_CACHE_MAX_ENTRIES", "10000"))
+    outfit_cache_max_entries = int(os.getenv("OUTFIT_CACHE_MAX_ENTRIES", "5000"))
+    outfit_cache_alternatives = int(os.getenv("OUTFIT_CACHE_ALTERNATIVES", "1"))
+    outfit_cache_ttl_seconds = float(os.getenv("OUTFIT_CACHE_TTL_SECONDS", str(24 * 3600)))
+    stream_answers = os.getenv("STREAM_ANSWERS", "true").lower() == "true"
+    stream_edit_interval = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+    prewarm_clients = os.getenv("PREWARM_CLIENTS", "true").lower() == "true"
+    openai_limits = {
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "16")),
+        "requests_per_minute": float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500")),
+        "tokens_per_minute": float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000")),
+        "max_retries": int(os.getenv("OPENAI_MAX_RETRIES", "4")),
+        "backoff_base": float(os.getenv("OPENAI_BACKOFF_BASE", "0.5")),
+        "backoff_max": float(os.getenv("OPENAI_BACKOFF_MAX", "20")),
+    }
+    transport = {
+        "aws_max_pool_connections": int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50")),
+        "aws_connect_timeout": float(os.getenv("AWS_CONNECT_TIMEOUT", "2")),
+        "aws_read_timeout": float(os.getenv("AWS_READ_TIMEOUT", "10")),
+        "aws_retry_mode": os.getenv("AWS_RETRY_MODE", "adaptive"),
+        "aws_max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "4")),
+        "aws_tcp_keepalive": os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true",
+        "openai_max_connections": int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        "openai_max_keepalive_connections": int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        "openai_keepalive_expiry": float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+        "openai_connect_timeout": float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+        "openai_read_timeout": float(os.getenv("OPENAI_READ_TIMEOUT", "60")),
+        "executor_workers": int(os.getenv("BLOCKING_IO_WORKERS", "64")),
+    }
+    job_queue = {
+        "backend": os.getenv("JOB_QUEUE_BACKEND", "sqlite"),
+        "sqlite_path": os.getenv("JOB_QUEUE_SQLITE_PATH", "jobs.sqlite3"),
+        "workers": int(os.getenv("JOB_QUEUE_WORKERS", "4")),
+        "max_attempts": int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "5")),
+        "backoff_base": float(os.getenv("JOB_QUEUE_BACKOFF_BASE", "2")),
+        "backoff_max": float(os.getenv("JOB_QUEUE_BACKOFF_MAX", "300")),
+        "retention_seconds": float(os.getenv("JOB_QUEUE_RETENTION_SECONDS", str(7 * 24 * 3600))),
+    }
+    log_level = os.getenv("LOG_LEVEL", "INFO")
+    log_format = os.getenv("LOG_FORMAT", "json")
+    metrics = {
+        "host": os.getenv("METRICS_HOST", "0.0.0.0"),
+        "port": int(os.getenv("METRICS_PORT", "9090")),
+    }
+    telegram_webhook = {
+        "mode": os.getenv("TELEGRAM_MODE", "polling"),
+        "url": os.getenv("WEBHOOK_URL", ""),
+        "path": os.getenv("WEBHOOK_PATH", "/telegram"),
+        "listen_host": os.getenv("WEBHOOK_LISTEN_HOST", "0.0.0.0"),
+        "port": int(os.getenv("WEBHOOK_PORT", "8080")),
+        "secret_token": os.getenv("WEBHOOK_SECRET_TOKEN") or None,
+        "queue_size": int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+        "workers": int(os.getenv("WEBHOOK_WORKERS", "64")),
+        "max_connections": int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+    }
+
+    prompts = getPrompts()
 
-    pprint({"INFO": "Loaded config"})
+    logger.info("Loaded config")
 
     return {
         "telegram_bot_token": telegram_bot_token,
         "open_ai_api_key": open_ai_api_key,
+        "openai_base_url": openai_base_url,
+        "telegram_api_base_url": telegram_api_base_url,
+        "telegram_file_base_url": telegram_file_base_url,
         "aws_access_key_id": aws_access_key_id,
         "aws_secret_access_key": aws_secret_access_key,
         "dynamo_table_name": dynamo_table_name,
+        "dynamo_wardrobe_table_name": dynamo_wardrobe_table_name,
         "region_name": region_name,
         "s3_name": s3_name,
+        "telegram_concurrent_updates": telegram_concurrent_updates,
+        "persistence_backend": persistence_backend,
+        "persistence_sqlite_path": persistence_sqlite_path,
+        "persistence_dynamo_table_name": persistence_dynamo_table_name,
+        "persistence_flush_interval": persistence_flush_interval,
+        "dynamo_write_behind_interval": dynamo_write_behind_interval,
+        "dynamo_write_behind_max_items": dynamo_write_behind_max_items,
+        "profile_cache_max_entries": profile_cache_max_entries,
+        "profile_cache_ttl_seconds": profile_cache_ttl_seconds,
+        "profile_cache_max_bytes": profile_cache_max_bytes,
+        "history_backend": history_backend,
+        "history_sqlite_path": history_sqlite_path,
+        "history_max_turns": history_max_turns,
+        "history_max_user_chars": history_max_user_chars,
+        "history_max_users": history_max_users,
+        "history_max_total_chars": history_max_total_chars,
+        "history_idle_ttl_seconds": history_idle_ttl_seconds,
+        "prompt_budget_tokens": prompt_budget_tokens,
+        "history_summarize_after_tokens": history_summarize_after_tokens,
+        "history_keep_recent_turns": history_keep_recent_turns,
+        "embedding_provider": embedding_provider,
+        "embedding_model": embedding_model,
+        "embedding_dimensions": embedding_dimensions,
+        "style_candidates_per_category": style_candidates_per_category,
+        "style_mode": style_mode,
+        "style_catalog_max_items": style_catalog_max_items,
+        "style_catalog_summary_chars": style_catalog_summary_chars,
+        "s3_fetch_concurrency": s3_fetch_concurrency,
+        "photo_phash_max_distance": photo_phash_max_distance,
+        "album_window_seconds": album_window_seconds,
+        "message_window_seconds": message_window_seconds,
+        "message_max_delay_seconds": message_max_delay_seconds,
+        "image_original_max_edge": image_original_max_edge,
+        "image_analysis_max_edge": image_analysis_max_edge,
+        "image_thumbnail_max_edge": image_thumbnail_max_edge,
+        "image_jpeg_quality": image_jpeg_quality,
+        "vision_detail": vision_detail,
+        "vision_image_source": vision_image_source,
+        "s3_presigned_url_expires_seconds": s3_presigned_url_expires_seconds,
+        "s3_presigned_url_refresh_margin_seconds": s3_presigned_url_refresh_margin_seconds,
+        "s3_presigned_url_cache_max_entries": s3_presigned_url_cache_max_entries,
+        "outfit_cache_max_entries": outfit_cache_max_entries,
+        "outfit_cache_alternatives": outfit_cache_alternatives,
+        "outfit_cache_ttl_seconds": outfit_cache_ttl_seconds,
+        "stream_answers": stream_answers,
+        "stream_edit_interval": stream_edit_interval,
+        "prewarm_clients": prewarm_clients,
+        "openai_limits": openai_limits,
+        "transport": transport,
+        "job_queue": job_queue,
+        "log_level": log_level,
+        "log_format": log_format,
+        "metrics": metrics,
+        "telegram_webhook": telegram_webhook,
+        "prompts": prompts,
     }
@@ -1,8 +1,7 @@
-from pprint import pprint
-from dotenv import load_dotenv
+import logging
 import os
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 
 def getPrompts() -> dict:
@@ -10,7 +9,7 @@ def getPrompts() -> dict:
     prompt_image_analysis = os.getenv("PROMPT_IMAGE_ANALYSIS")
     model = os.getenv("MODEL")
 
-    pprint({"INFO": "Loaded prompts"})
+    logger.info("Loaded prompts")
 
     return {
         "model": model,
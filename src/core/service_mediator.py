@@ -1,21 +1,55 @@
+import asyncio
 import base64
+import logging
 import os
-from pprint import pprint
-import re
-import io
+import time
+from botocore.exceptions import BotoCoreError, ClientError
 from telegram import InputMediaPhoto
+from telegram.error import BadRequest
 
 from src.core.config import getConfig
 from src.core.messages import MESSAGES
 from src.services.bucket_s3.bucket_s3_service import S3ImageStorage
+from src.services.bucket_s3.presigned_url_cache import PresignedUrlCache
 from src.services.dynamo_db.dynamo_db_service import DynamoDBService
-from src.services.open_ai.open_ai_chat import OpenAIChat
+from src.services.dynamo_db.profile_cache import ProfileCache
+from src.services.http_server.http_server import HttpRequest, HttpResponse, HttpServer
+from src.services.job_queue.job_queue import create_job_queue
+from src.services.metrics.metrics import REGISTRY, observe_callback, register_stats
+from src.services.open_ai.embeddings import create_embedding_provider
+from src.services.open_ai.history_store import create_history_store
+from src.services.open_ai.open_ai_chat import OpenAIChat, is_image_url_error
+from src.services.open_ai.request_scheduler import OpenAIRequestError, RequestScheduler
+from src.services.telegram.message_coalescer import mark_answer_stored
+from src.services.telegram.persistence import create_persistence
 from src.services.telegram.telegram_service import TelegramService
+from src.services.transport.transport import Transport
+from src.services.wardrobe_index.outfit_cache import OutfitCache
+from src.services.wardrobe_index.photo_hash_index import PhotoHashIndex
+from src.services.wardrobe_index.wardrobe_catalog import WardrobeCatalog
+from src.services.wardrobe_index.wardrobe_index import WardrobeIndex, detect_category
+from src.utils.image_hashing import content_hash, perceptual_hash
+from src.utils.image_processing import prepare_photo
+from src.utils.style_tags import StyleTagParser, parse_style_tags
+
+logger = logging.getLogger(__name__)
+
+
+def _data_url(image_bytes: bytes) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
 
 
 class ServiceMediator:
-    def __init__(self):
-        config = getConfig()
+    def __init__(self, config: dict = None):
+        config = config or getConfig()
+
+        self.transport = Transport(
+            region_name=config["region_name"],
+            aws_access_key_id=config["aws_access_key_id"],
+            aws_secret_access_key=config["aws_secret_access_key"],
+            **config["transport"]
+        )
+        self.job_queue = create_job_queue(**config["job_queue"])
 
         self.telegram_service = TelegramService(
             message_callback=self.process_message,
@@ -23,31 +57,158 @@ class ServiceMediator:
             find_user_callback=self.find_user,
             save_survey_callback=self.save_survey_data,
             registration_callback=self.handle_registration,
-            update_wardrobe_callback=self.update_wardrobe,
-            upload_user_photo_callback=self.upload_user_photo,
             generate_tempo_url_callback=self.generate_tempo_url,
-            vision_wardrobe_photo_callback=self.vision_wardrobe_photo
+            ingest_wardrobe_photos_callback=self.ingest_wardrobe_photos,
+            concurrent_updates=config["telegram_concurrent_updates"],
+            album_window_seconds=config["album_window_seconds"],
+            message_window_seconds=config["message_window_seconds"],
+            message_max_delay_seconds=config["message_max_delay_seconds"],
+            job_queue=self.job_queue,
+            stream_edit_interval=config["stream_edit_interval"],
+            webhook_settings=config["telegram_webhook"],
+            api_base_url=config["telegram_api_base_url"],
+            file_base_url=config["telegram_file_base_url"],
+            persistence=create_persistence(
+                backend=config["persistence_backend"],
+                update_interval=config["persistence_flush_interval"],
+                sqlite_path=config["persistence_sqlite_path"],
+                dynamo_table_name=config["persistence_dynamo_table_name"],
+                transport=self.transport
+            )
         )
-        self.openai_chat = OpenAIChat(api_key=config["open_ai_api_key"])
+        self.stream_answers = config["stream_answers"]
+        self.openai_chat = OpenAIChat(
+            api_key=config["open_ai_api_key"],
+            base_url=config["openai_base_url"],
+            prompt_budget_tokens=config["prompt_budget_tokens"],
+            summarize_after_tokens=config["history_summarize_after_tokens"],
+            keep_recent_turns=config["history_keep_recent_turns"],
+            vision_detail=config["vision_detail"],
+            prompts=config["prompts"],
+            transport=self.transport,
+            scheduler=RequestScheduler(**config["openai_limits"]),
+            history_store=create_history_store(
+                backend=config["history_backend"],
+                sqlite_path=config["history_sqlite_path"],
+                max_total_chars=config["history_max_total_chars"],
+                max_turns=config["history_max_turns"],
+                max_user_chars=config["history_max_user_chars"],
+                max_users=config["history_max_users"],
+                idle_ttl_seconds=config["history_idle_ttl_seconds"]
+            )
+        )
+        self.wardrobe_index = WardrobeIndex(
+            embedding_provider=create_embedding_provider(
+                provider=config["embedding_provider"],
+                get_client=lambda: self.openai_chat.chat_client,
+                scheduler=self.openai_chat.scheduler,
+                model=config["embedding_model"],
+                dimensions=config["embedding_dimensions"]
+            )
+        )
+        self.style_candidates_per_category = config["style_candidates_per_category"]
+        # "single": the chat request picks the outfit from a wardrobe catalog; "two_step": a second request does.
+        self.style_mode = config["style_mode"]
+        self.style_catalog_max_items = config["style_catalog_max_items"]
+        self.style_catalog_summary_chars = config["style_catalog_summary_chars"]
+        self.photo_hash_index = PhotoHashIndex(max_phash_distance=config["photo_phash_max_distance"])
+        self.outfit_cache = OutfitCache(
+            max_entries=config["outfit_cache_max_entries"],
+            alternatives=config["outfit_cache_alternatives"],
+            ttl_seconds=config["outfit_cache_ttl_seconds"]
+        )
+        self.image_settings = {
+            "original_max_edge": config["image_original_max_edge"],
+            "analysis_max_edge": config["image_analysis_max_edge"],
+            "thumbnail_max_edge": config["image_thumbnail_max_edge"],
+            "quality": config["image_jpeg_quality"],
+        }
         self.dynamo_db = DynamoDBService(
-            region_name=config["region_name"],
-            aws_access_key_id=config["aws_access_key_id"],
+            transport=self.transport,
             dynamo_table_name=config["dynamo_table_name"],
-            aws_secret_access_key=config["aws_secret_access_key"]
+            wardrobe_table_name=config["dynamo_wardrobe_table_name"],
+            write_behind_interval=config["dynamo_write_behind_interval"],
+            write_behind_max_items=config["dynamo_write_behind_max_items"],
+            profile_cache=ProfileCache(
+                max_entries=config["profile_cache_max_entries"],
+                ttl_seconds=config["profile_cache_ttl_seconds"],
+                max_bytes=config["profile_cache_max_bytes"]
+            ),
+            wardrobe_cache=ProfileCache(
+                max_entries=config["profile_cache_max_entries"],
+                ttl_seconds=config["profile_cache_ttl_seconds"],
+                max_bytes=config["profile_cache_max_bytes"]
+            )
         )
         self.s3_storage = S3ImageStorage(
+            transport=self.transport,
             bucket_name=config["s3_name"],
             region_name=config["region_name"],
-            aws_access_key_id=config["aws_access_key_id"],
-            aws_secret_access_key=config["aws_secret_access_key"]
+            url_expires_in=config["s3_presigned_url_expires_seconds"],
+            url_cache=PresignedUrlCache(
+                max_entries=config["s3_presigned_url_cache_max_entries"],
+                refresh_margin_seconds=config["s3_presigned_url_refresh_margin_seconds"]
+            )
         )
+        # "presigned": OpenAI fetches the uploaded photos from S3; "inline": they are sent as base64 data URLs.
+        self.vision_image_source = config["vision_image_source"]
+        self.s3_fetch_semaphore = asyncio.Semaphore(config["s3_fetch_concurrency"])
 
-        pprint({"INFO": "ServiceMediator initialized."})
+        # The executor has to be in place before anything runs blocking calls in it.
+        self.telegram_service.startup_callbacks.append(self.transport.start)
+        if self.job_queue is not None:
+            self.telegram_service.startup_callbacks.append(self.job_queue.start)
+        self.metrics_server = None
+        if config["metrics"]["port"]:
+            self.metrics_server = HttpServer(config["metrics"]["host"], config["metrics"]["port"])
+            self.metrics_server.add_route("GET", "/metrics", self._render_metrics)
+            self.telegram_service.startup_callbacks.append(self.metrics_server.start)
+            self.telegram_service.shutdown_callbacks.append(self.metrics_server.stop)
+        # Running jobs finish first, then queued DynamoDB writes go out before the transport closes.
+        if self.job_queue is not None:
+            self.telegram_service.shutdown_callbacks.append(self.job_queue.stop)
+        self.telegram_service.shutdown_callbacks.append(self.dynamo_db.close)
+        self.telegram_service.shutdown_callbacks.append(self.transport.close)
+        if config["prewarm_clients"]:
+            self.telegram_service.startup_callbacks.append(self._start_prewarm)
+        self._prewarm_task = None
+        self._background_tasks = set()
+        register_stats("transport", self.transport.stats, label="service")
+        register_stats("openai_scheduler", self.openai_chat.scheduler.stats, label="priority")
+        register_stats("profile_cache", self.dynamo_db.profile_cache.stats)
+        register_stats("wardrobe_cache", self.dynamo_db.wardrobe_cache.stats)
+        register_stats("dynamo_write_behind", self.dynamo_db.write_buffer.stats)
+        register_stats("outfit_cache", self.outfit_cache.stats)
+        register_stats("presigned_url_cache", self.s3_storage.url_cache.stats)
+        register_stats("message_coalescer", self.telegram_service.message_coalescer.stats)
+        if self.telegram_service.app.persistence is not None:
+            register_stats("persistence", self.telegram_service.app.persistence.stats)
+        if self.job_queue is not None:
+            register_stats("job_queue", self.job_queue.stats)
 
+        logger.info("ServiceMediator initialized.")
+
+    async def _start_prewarm(self):
+        self._prewarm_task = asyncio.create_task(self._prewarm())
+
+    async def _prewarm(self):
+        """
+        Builds the OpenAI, DynamoDB and S3 clients in a worker thread while the bot already takes updates,
+        so the first requests do not pay for imports and client setup.
+        """
+        started_at = time.perf_counter()
+        for component in (self.openai_chat, self.dynamo_db, self.s3_storage):
+            try:
+                await asyncio.to_thread(component.prewarm)
+            except Exception as e:
+                logger.warning(f"Pre-warming {type(component).__name__} failed: {e!r}")
+        logger.info(f"Clients pre-warmed in {time.perf_counter() - started_at:.2f}s")
+
+    @observe_callback("handle_registration")
     async def handle_registration(self, user_id: int, user_data: dict):
-        pprint({"INFO": f"handle_registration -> user_id={user_id}, data={user_data}"})
+        logger.info(f"handle_registration -> user_id={user_id}")
 
-        saved_user = self.dynamo_db.save_user(
+        saved_user = await self.dynamo_db.save_user(
             user_id,
             user_data["phone_number"],
             user_data.get("first_name", ""),
@@ -59,95 +220,344 @@ class ServiceMediator:
         else:
             await self.telegram_service.send_message(user_id, MESSAGES["registration_error"])
 
+    @observe_callback("process_message")
     async def process_message(self, user_id: int, user_message: str):
         await self.telegram_service.handle_send_typing(user_id)
-        user_info = self.find_user(user_id)
+        user_info, wardrobe = await asyncio.gather(self.find_user(user_id), self._catalog_wardrobe(user_id))
 
-        user_info_formated = f"""
-        last_name:{user_info["last_name"]}\n
-        first_name:{user_info["first_name"]}\n
-        brands:{user_info["brands"]}\n
-        weight:{user_info["weight"]}\n
-        style:{user_info["style"]}\n
-        gender:{user_info["gender"]}\n
-        colors:{user_info["colors"]}\n
-        height:{user_info["height"]}\n"""
+        user_info_formated = "\n".join(
+            f"{field}: {user_info.get(field, '')}"
+            for field in ("last_name", "first_name", "brands", "weight", "style", "gender", "colors", "height")
+        )
+        catalog = WardrobeCatalog(wardrobe, summary_chars=self.style_catalog_summary_chars) if wardrobe else None
 
-        answer = self.openai_chat.get_answer_ai(user_id, user_message, user_info_formated=user_info_formated)
+        if self.stream_answers:
+            await self._stream_answer(user_id, user_message, user_info_formated, catalog, wardrobe)
+            return
 
-        if re.search(r"<style_request>", answer):
-            metadata_match = re.search(r"<metadata>(.*?)</metadata>", answer)
-            style_description = metadata_match.group(1) if metadata_match else "base style"
+        chosen = []
+        try:
+            answer = await self.openai_chat.get_answer_ai(
+                user_id, user_message, user_info_formated=user_info_formated, catalog=catalog,
+                on_outfit=lambda outfit, style_description: chosen.append((outfit, style_description)),
+                on_stored=mark_answer_stored
+            )
+        except OpenAIRequestError as e:
+            logger.error(f"Answer failed for user {user_id}: {e}")
+            await self.telegram_service.send_message(user_id, MESSAGES["error_ai_unavailable"])
+            return
 
-            clean_answer = re.sub(r"<style_request>|<metadata>.*?</metadata>", "", answer).strip()
+        clean_answer, style_description = parse_style_tags(answer)
+        if chosen:
+            await self.show_outfit(user_id, *chosen[0], wardrobe=wardrobe)
+        elif style_description is not None:
             await self.find_style(user_id, style_description)
+        # An answer that is only a show_outfit call has no text; Telegram rejects empty messages.
+        if clean_answer:
             await self.telegram_service.send_message(user_id, clean_answer)
-        else:
-            await self.telegram_service.send_message(user_id, answer)
 
-    async def find_style(self, user_id: int, style_description: str):
-        user = self.dynamo_db.get_user(user_id)
+    async def _catalog_wardrobe(self, user_id: int) -> list:
+        """The wardrobe to list in the chat prompt in single style mode; empty when it would not fit."""
+        if self.style_mode != "single":
+            return []
+        wardrobe = await self.dynamo_db.get_wardrobe(user_id)
+        if len(wardrobe) > self.style_catalog_max_items:
+            # Too big to list every time; the outfit is picked by the two-step search over the index.
+            return []
+        return wardrobe
+
+    async def _stream_answer(self, user_id: int, user_message: str, user_info_formated: str,
+                             catalog: WardrobeCatalog = None, wardrobe: list = None):
+        """
+        Streams the answer to the user. The outfit is sent as soon as the model picked it from the catalog,
+        or searched for as soon as the style tags are complete.
+        """
+        parser = StyleTagParser()
+        style_task = None
+
+        def on_outfit(outfit: list, style_description: str):
+            nonlocal style_task
+            if style_task is None:
+                style_task = asyncio.create_task(self.show_outfit(user_id, outfit, style_description, wardrobe))
+
+        async def visible_chunks():
+            nonlocal style_task
+            try:
+                async for chunk in self.openai_chat.stream_answer_ai(user_id, user_message,
+                                                                     user_info_formated=user_info_formated,
+                                                                     catalog=catalog, on_outfit=on_outfit,
+                                                                     on_stored=mark_answer_stored):
+                    visible = parser.feed(chunk)
+                    if style_task is None and parser.style_description is not None:
+                        style_task = asyncio.create_task(self.find_style(user_id, parser.style_description))
+                    if visible:
+                        yield visible
+            except OpenAIRequestError as e:
+                logger.error(f"Answer stream failed for user {user_id}: {e}")
+                parser.finish()
+                yield f"\n\n{MESSAGES['error_ai_unavailable']}"
+                return
+
+            rest = parser.finish()
+            if style_task is None and parser.style_description is not None:
+                style_task = asyncio.create_task(self.find_style(user_id, parser.style_description))
+            if rest:
+                yield rest
+
+        try:
+            await self.telegram_service.send_streaming_message(user_id, visible_chunks())
+        except asyncio.CancelledError:
+            # Superseded by a newer message: the outfit for this answer is not wanted either.
+            if style_task is not None:
+                style_task.cancel()
+            raise
 
-        wardrobe = user.get("wardrobe", [])
+        # The answer is out; the outfit search finishes on its own, so a new message does not cancel it.
+        if style_task is not None:
+            self._run_in_background(style_task)
+
+    def _run_in_background(self, awaitable):
+        task = asyncio.ensure_future(awaitable)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._finish_background_task)
+
+    def _finish_background_task(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background task failed: {task.exception()!r}")
+
+    @observe_callback("find_style")
+    async def find_style(self, user_id: int, style_description: str):
+        wardrobe = await self.dynamo_db.get_wardrobe(user_id)
         if not wardrobe:
-            pprint({"INFO": f"User {user_id} has empty wardrobe."})
+            logger.info(f"User {user_id} has empty wardrobe.")
             return []
 
-        wardrobe_list_str = ""
-        for idx, item in enumerate(wardrobe, start=1):
-            s3_key = item["s3_key"]
-            summary = item["summary"].replace("\n", " ")
-            wardrobe_list_str += f"{idx}) s3_key: {s3_key}\n   summary: {summary}\n\n"
+        user = await self.dynamo_db.get_user(user_id)
+        cache_key = self.outfit_cache.make_key(user_id, (user or {}).get("wardrobe_version", 0), style_description)
+        outfits = self.outfit_cache.get(cache_key)
+
+        if outfits is None:
+            outfits = await self._select_outfit(user_id, wardrobe, style_description)
+            self.outfit_cache.put(cache_key, outfits)
+
+        await self._send_outfit(user_id, outfits, wardrobe)
 
-        outfits = self.openai_chat.find_style(wardrobe_list_str=wardrobe_list_str, style_description=style_description)
+    @observe_callback("show_outfit")
+    async def show_outfit(self, user_id: int, outfit: list, style_description: str, wardrobe: list):
+        """Sends an outfit the chat request already picked, and keeps it for repeats of the same request."""
+        user = await self.dynamo_db.get_user(user_id)
+        self.outfit_cache.put(
+            self.outfit_cache.make_key(user_id, (user or {}).get("wardrobe_version", 0), style_description), outfit)
+        await self._send_outfit(user_id, outfit, wardrobe)
+
+    async def _send_outfit(self, user_id: int, outfits: list, wardrobe: list):
         if len(outfits) > 0:
             await self.telegram_service.send_message(user_id, MESSAGES["wardrobe_analysis_start"])
-        await self.send_style_photo(user_id=user_id, outfits=outfits)
+        await self.send_style_photo(user_id=user_id, outfits=outfits, wardrobe=wardrobe)
+
+    async def _select_outfit(self, user_id: int, wardrobe: list, style_description: str) -> list:
+        try:
+            if self.wardrobe_index.size(user_id) != len(wardrobe):
+                embedded = await self.wardrobe_index.load(user_id, wardrobe)
+                if embedded:
+                    # Saved with the items, so the next load does not embed them again.
+                    self._run_in_background(self.dynamo_db.update_wardrobe_embeddings(
+                        user_id, {s3_key: vector.tobytes() for s3_key, vector in embedded.items()}))
+            query = await self.wardrobe_index.embed_one(style_description)
+            candidates = self.wardrobe_index.top_k_per_category(user_id, query, k=self.style_candidates_per_category)
+        except OpenAIRequestError as e:
+            logger.warning(f"Embedding failed for user {user_id}, listing the whole wardrobe: {str(e)}")
+            candidates = [
+                (item["s3_key"], item["summary"], item.get("category") or detect_category(item["summary"]))
+                for item in wardrobe
+            ]
+
+        wardrobe_list_str = ""
+        for idx, (s3_key, summary, category) in enumerate(candidates, start=1):
+            summary = summary.replace("\n", " ")
+            wardrobe_list_str += f"{idx}) s3_key: {s3_key}\n   category: {category}\n   summary: {summary}\n\n"
+
+        return await self.openai_chat.find_style(wardrobe_list_str=wardrobe_list_str,
+                                                 style_description=style_description)
+
+    async def send_style_photo(self, user_id: int, outfits: list, wardrobe: list = None):
+        logger.debug(f"Outfit for user {user_id}: {outfits}")
+        items = {item["s3_key"]: item for item in wardrobe or []}
+        file_ids = {
+            s3_key: items[s3_key]["file_id"]
+            for s3_key in outfits
+            if s3_key in items and items[s3_key].get("file_id")
+        }
+        fetch_keys = {
+            s3_key: (items[s3_key].get("thumbnail_key") or s3_key) if s3_key in items else s3_key
+            for s3_key in outfits
+        }
 
-    async def send_style_photo(self, user_id: int, outfits: list):
-        media_group = []
-        pprint(f"outfits, {outfits}")
+        sent_keys, sent_messages = [], None
+        if file_ids:
+            try:
+                sent_keys, media_group = await self._build_media_group(outfits, file_ids, fetch_keys)
+                sent_messages = await self.telegram_service.send_media_group(user_id=user_id, media_group=media_group)
+            except BadRequest as e:
+                logger.warning(f"Telegram rejected stored file ids for user {user_id}: {str(e)}")
+                file_ids = {}
+
+        if sent_messages is None:
+            sent_keys, media_group = await self._build_media_group(outfits, {}, fetch_keys)
+            if not media_group:
+                await self.telegram_service.send_message(user_id, MESSAGES["error_photo"])
+                return
+            sent_messages = await self.telegram_service.send_media_group(user_id=user_id, media_group=media_group)
+
+        new_file_ids = {
+            s3_key: message.photo[-1].file_id
+            for s3_key, message in zip(sent_keys, sent_messages)
+            if s3_key in items and s3_key not in file_ids and message.photo
+        }
+        await self.dynamo_db.update_wardrobe_file_ids(user_id, new_file_ids)
+
+    async def _build_media_group(self, outfits: list, file_ids: dict, fetch_keys: dict):
+        """Sends known Telegram file_ids as-is and downloads the remaining photos (or their thumbnails) from S3."""
+        to_fetch = [s3_key for s3_key in outfits if s3_key not in file_ids]
+        fetched = dict(zip(to_fetch, await asyncio.gather(*(
+            self._fetch_photo(fetch_keys[s3_key]) for s3_key in to_fetch
+        ))))
+
+        sent_keys, media_group = [], []
         for s3_key in outfits:
-            encoded_file = self.s3_storage.get_file_from_s3(s3_key)
+            file_name = os.path.basename(s3_key)
+            if s3_key in file_ids:
+                media_group.append(InputMediaPhoto(media=file_ids[s3_key], caption=file_name))
+            elif fetched.get(s3_key):
+                media_group.append(InputMediaPhoto(media=fetched[s3_key], caption=file_name, filename=file_name))
+            else:
+                continue
+            sent_keys.append(s3_key)
+        return sent_keys, media_group
 
-            if encoded_file:
-                file_bytes = base64.b64decode(encoded_file)
-                file_name = os.path.basename(s3_key)
+    async def _fetch_photo(self, s3_key: str):
+        async with self.s3_fetch_semaphore:
+            return await self.s3_storage.get_file_bytes(s3_key)
 
-                file_stream = io.BytesIO(file_bytes)
-                file_stream.name = file_name
+    @observe_callback("find_user")
+    async def find_user(self, user_id: int):
+        return await self.dynamo_db.get_user(user_id)
 
-                media_group.append(InputMediaPhoto(media=file_stream, caption=file_name))
+    @observe_callback("save_survey_data")
+    async def save_survey_data(self, user_id: int, survey_data: dict):
+        logger.info(f"save_survey_data -> user_id={user_id}")
+        await self.dynamo_db.update_survey(user_id, survey_data)
+        logger.info(f"Survey saved for user {user_id}.")
 
-        if media_group:
-            pprint(f"media_group ${media_group}")
-            await self.telegram_service.send_media_group(user_id=user_id, media_group=media_group)
-        else:
-            await self.telegram_service.send_message(user_id, MESSAGES["error_photo"])
+    async def generate_tempo_url(self, s3_key: str):
+        return await self.s3_storage.generate_tempo_url_url(s3_key=s3_key)
 
-    def find_user(self, user_id: int):
-        return self.dynamo_db.get_user(user_id)
+    async def fingerprint_photo(self, user_id: int, image_bytes: bytes) -> dict:
+        """Hashes an incoming photo and looks it up among the photos already in the user's wardrobe."""
+        if not self.photo_hash_index.is_loaded(user_id):
+            self.photo_hash_index.load(user_id, await self.dynamo_db.get_wardrobe(user_id))
 
-    def save_survey_data(self, user_id: int, survey_data: dict):
-        pprint({"INFO": f"save_survey_data -> user_id={user_id}"})
-        self.dynamo_db.update_survey(user_id, survey_data)
-        pprint({"INFO": f"Survey saved for user {user_id}."})
+        fingerprint = {"content_hash": content_hash(image_bytes), "phash": None}
+        fingerprint["duplicate"] = self.photo_hash_index.find(user_id, fingerprint["content_hash"])
+        if fingerprint["duplicate"] is None and self.photo_hash_index.max_phash_distance >= 0:
+            fingerprint["phash"] = await asyncio.to_thread(perceptual_hash, image_bytes)
+            fingerprint["duplicate"] = self.photo_hash_index.find(user_id, fingerprint["content_hash"],
+                                                                  fingerprint["phash"])
+        return fingerprint
 
-    def upload_user_photo(self, user_id: int, image_bytes: bytes):
-        return self.s3_storage.upload_user_photo(
-            user_id=user_id,
-            image_bytes=image_bytes,
-        )
+    @observe_callback("ingest_wardrobe_photos")
+    async def ingest_wardrobe_photos(self, user_id: int, photos: list, wait_saved: bool = False) -> dict:
+        """
+        Saves a batch of wardrobe photos ({"image_bytes", "file_id"}): skips duplicates, uploads the rest
+        concurrently, analyzes them in one vision request and writes them in one wardrobe batch.
+        With `wait_saved`, returns only once the items are in DynamoDB and raises WardrobeWriteError otherwise.
+        Objects are stored under the photo's content hash, so running a batch again overwrites its uploads.
+        """
+        fingerprints = await asyncio.gather(*(self.fingerprint_photo(user_id, photo["image_bytes"]) for photo in photos))
+
+        new_photos, seen_hashes = [], set()
+        for photo, fingerprint in zip(photos, fingerprints):
+            if fingerprint["duplicate"] or fingerprint["content_hash"] in seen_hashes:
+                continue
+            seen_hashes.add(fingerprint["content_hash"])
+            new_photos.append((photo, fingerprint))
+
+        logger.info(f"ingest_wardrobe_photos -> user_id={user_id}, new={len(new_photos)}, total={len(photos)}")
+        if not new_photos:
+            return {"saved": 0, "duplicates": len(photos)}
+
+        prepared = await asyncio.gather(*(
+            asyncio.to_thread(prepare_photo, photo["image_bytes"], **self.image_settings) for photo, _ in new_photos
+        ))
+        uploads = await asyncio.gather(*(
+            self.s3_storage.upload_user_photo(
+                user_id=user_id, image_bytes=variants["original"], thumbnail_bytes=variants["thumbnail"],
+                name=fingerprint["content_hash"],
+                # In presigned mode the vision model downloads this variant, not the full-size original.
+                analysis_bytes=variants["analysis"] if self.vision_image_source == "presigned" else None
+            )
+            for (_, fingerprint), variants in zip(new_photos, prepared)
+        ))
+        summaries = await self._analyze_photos(uploads, prepared)
+        try:
+            vectors = list(await self.wardrobe_index.embed_many(summaries))
+        except OpenAIRequestError as e:
+            # Items are saved without a vector; the index embeds them the next time it is loaded.
+            logger.warning(f"Embedding failed for user {user_id}, saving items without vectors: {str(e)}")
+            vectors = [None] * len(summaries)
+
+        items = [
+            {
+                "s3_key": upload["s3_key"],
+                "thumbnail_key": upload["thumbnail_key"],
+                "analysis_key": upload["analysis_key"],
+                "summary": summary,
+                "category": detect_category(summary),
+                "embedding": vector.tobytes() if vector is not None else None,
+                "file_id": photo["file_id"],
+                "content_hash": fingerprint["content_hash"],
+                "phash": fingerprint["phash"],
+            }
+            for (photo, fingerprint), upload, summary, vector in zip(new_photos, uploads, summaries, vectors)
+        ]
+        await self.dynamo_db.add_wardrobe_items(user_id, items, wait=wait_saved)
+
+        for item, vector in zip(items, vectors):
+            if vector is not None:
+                self.wardrobe_index.add(user_id, s3_key=item["s3_key"], summary=item["summary"],
+                                        category=item["category"], vector=vector)
+            self.photo_hash_index.add(user_id, s3_key=item["s3_key"], summary=item["summary"],
+                                      content_hash=item["content_hash"], phash=item["phash"])
+
+        return {"saved": len(items), "duplicates": len(photos) - len(items)}
 
-    def generate_tempo_url(self, s3_key: str):
-        return self.s3_storage.generate_tempo_url_url(s3_key=s3_key)
+    async def _analyze_photos(self, uploads: list, prepared: list) -> list:
+        """
+        Returns one vision summary per photo. In presigned mode OpenAI downloads the uploaded analysis variants
+        from S3, so no image bytes go into the request. If the URLs cannot be signed or OpenAI cannot download
+        them, the same variants are sent inline; other errors (rate limits, outages) are raised.
+        """
+        if self.vision_image_source == "presigned":
+            try:
+                # Keys come from the content hash, so a retried photo job re-signs the same keys from the cache.
+                urls = await asyncio.gather(*(
+                    self.s3_storage.generate_tempo_url_url(upload["analysis_key"]) for upload in uploads
+                ))
+                return await self.openai_chat.vision_imgs(list(urls))
+            except (BotoCoreError, ClientError) as e:
+                logger.warning(f"Presigning photos failed, sending the images inline: {e!r}")
+            except OpenAIRequestError as e:
+                if not is_image_url_error(e):
+                    raise
+                logger.warning(f"OpenAI could not download the presigned photos, sending the images inline: {e!r}")
 
-    def vision_wardrobe_photo(self, url: str):
-        return self.openai_chat.vision_img(url=url)
+        return await self.openai_chat.vision_imgs([_data_url(variants["analysis"]) for variants in prepared])
 
-    def update_wardrobe(self, user_id: int, s3_key: str, summary: str):
-        self.dynamo_db.update_wardrobe(user_id=user_id, s3_key=s3_key, summary=summary)
+    @staticmethod
+    async def _render_metrics(request: HttpRequest) -> HttpResponse:
+        return HttpResponse(200, REGISTRY.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
 
     def run(self):
-        pprint({"INFO": "ServiceMediator run -> starting TelegramService."})
+        logger.info("ServiceMediator run -> starting TelegramService.")
         self.telegram_service.run()
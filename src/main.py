@@ -1,10 +1,42 @@
-from pprint import pprint
-from src.core.service_mediator import ServiceMediator
+import time
+
+# Taken before the other imports, so the reported startup time includes them.
+STARTED_AT = time.perf_counter()
+
+import logging  # noqa: E402
+
+from src.core.config import getConfig  # noqa: E402
+from src.core.logger import setup_logging  # noqa: E402
+from src.core.service_mediator import ServiceMediator  # noqa: E402
+from src.services.metrics.metrics import REGISTRY  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = REGISTRY.gauge("bot_startup_seconds", "Seconds from process start until updates are accepted.",
+                                 ("phase",))
 
 
 def main():
-    pprint({"INFO": "Starting application..."})
-    mediator = ServiceMediator()
+    imported_at = time.perf_counter()
+    config = getConfig()
+    setup_logging(config["log_level"], config["log_format"])
+    logger.info("Starting application...")
+    mediator = ServiceMediator(config)
+    initialized_at = time.perf_counter()
+
+    async def report_startup():
+        finished_at = time.perf_counter()
+        phases = {
+            "imports": imported_at - STARTED_AT,
+            "services": initialized_at - imported_at,
+            "telegram": finished_at - initialized_at,
+            "total": finished_at - STARTED_AT,
+        }
+        for phase, seconds in phases.items():
+            STARTUP_SECONDS.set(round(seconds, 3), phase=phase)
+        logger.info("Startup finished in " + ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in phases.items()))
+
+    mediator.telegram_service.startup_callbacks.append(report_startup)
     mediator.run()
 
 
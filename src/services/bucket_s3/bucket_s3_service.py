@@ -1,55 +1,102 @@
-import base64
+import asyncio
 import io
+import logging
+import time
 import uuid
-import boto3
-from botocore.exceptions import BotoCoreError, NoCredentialsError
-from pprint import pprint
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+
+from src.services.bucket_s3.presigned_url_cache import PresignedUrlCache
+from src.services.metrics.metrics import track
+from src.services.transport.transport import Transport
+from src.utils.lazy import lazy_property
+
+logger = logging.getLogger(__name__)
 
 
 class S3ImageStorage:
-    def __init__(self, region_name: str, aws_access_key_id: str, aws_secret_access_key: str, bucket_name: str):
-        self.s3_client = boto3.client(
-            "s3",
-            region_name=region_name,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
-        )
+    def __init__(self, transport: Transport, region_name: str, bucket_name: str, url_cache: PresignedUrlCache = None,
+                 url_expires_in: int = 3600):
+        self.transport = transport
         self.bucket_name = bucket_name
         self.region_name = region_name
-        pprint({"INFO": f"S3ImageStorage initialized with bucket={self.bucket_name}, region={region_name}"})
+        self.url_cache = url_cache or PresignedUrlCache()
+        self.url_expires_in = url_expires_in
+
+    @lazy_property
+    def s3_client(self):
+        client = self.transport.aws_client("s3")
+        logger.info(f"S3ImageStorage initialized with bucket={self.bucket_name}, region={self.region_name}")
+        return client
 
-    def upload_user_photo(self, user_id: int, image_bytes: bytes, extension: str = "jpg", public: bool = False) -> dict:
-        unique_filename = f"photo_{uuid.uuid4()}.{extension}"
+    def prewarm(self):
+        """Builds the S3 client (blocking)."""
+        return self.s3_client
+
+    async def upload_user_photo(self, user_id: int, image_bytes: bytes, extension: str = "jpg", public: bool = False,
+                                thumbnail_bytes: bytes = None, analysis_bytes: bytes = None, name: str = None) -> dict:
+        """
+        Uploads a photo and its variants. With `name` (e.g. the content hash) the keys are derived from it,
+        so uploading the same photo again overwrites the same objects; otherwise a random name is used.
+        """
+        unique_filename = f"photo_{name or uuid.uuid4()}.{extension}"
         s3_key = f"user_{user_id}/{unique_filename}"
+        thumbnail_key = f"user_{user_id}/thumbnails/{unique_filename}" if thumbnail_bytes else None
+        analysis_key = f"user_{user_id}/analysis/{unique_filename}" if analysis_bytes else None
 
-        file_obj = io.BytesIO(image_bytes)
         extra_args = {
             "ContentType": f"image/{extension}"
         }
         if public:
             extra_args["ACL"] = "public-read"
 
+        uploads = [self._upload_bytes(s3_key, image_bytes, extra_args)]
+        if thumbnail_bytes:
+            uploads.append(self._upload_bytes(thumbnail_key, thumbnail_bytes, extra_args))
+        if analysis_bytes:
+            uploads.append(self._upload_bytes(analysis_key, analysis_bytes, extra_args))
+
         try:
-            self.s3_client.upload_fileobj(
-                Fileobj=file_obj,
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                ExtraArgs=extra_args
-            )
-            pprint({"INFO": f"Uploaded photo to s3://{self.bucket_name}/{s3_key}"})
+            await asyncio.gather(*uploads)
+            logger.info(f"Uploaded photo to s3://{self.bucket_name}/{s3_key}")
 
             public_url = f"https://{self.bucket_name}.s3.{self.region_name}.amazonaws.com/{s3_key}" if public else None
             return {
                 "s3_key": s3_key,
+                "thumbnail_key": thumbnail_key,
+                "analysis_key": analysis_key,
                 "public_url": public_url
             }
         except Exception as e:
-            pprint({"ERROR": f"Failed to upload photo: {str(e)}"})
+            logger.error(f"Failed to upload photo: {str(e)}")
             raise e
 
-    def generate_tempo_url_url(self, s3_key: str, expires_in: int = 3600) -> str:
+    async def _upload_bytes(self, s3_key: str, data: bytes, extra_args: dict):
+        with track("s3", "upload_file_to_s3"):
+            await asyncio.to_thread(
+                self.s3_client.upload_fileobj,
+                Fileobj=io.BytesIO(data),
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                ExtraArgs=extra_args
+            )
+
+    async def generate_tempo_url_url(self, s3_key: str, expires_in: int = None, cache: bool = True) -> str:
+        """
+        A presigned GET URL for the object. With `cache`, a URL is reused while it has enough lifetime left;
+        keys that are signed only once should skip the cache.
+        Signing is local, but botocore may build the client and resolve credentials on first use, so it
+        runs in a worker thread.
+        """
+        expires_in = expires_in or self.url_expires_in
+        if cache:
+            url = self.url_cache.get(s3_key, expires_in)
+            if url is not None:
+                return url
+
+        signed_at = time.monotonic()
         try:
-            url = self.s3_client.generate_presigned_url(
+            url = await asyncio.to_thread(
+                self.s3_client.generate_presigned_url,
                 ClientMethod='get_object',
                 Params={
                     'Bucket': self.bucket_name,
@@ -57,19 +104,21 @@ class S3ImageStorage:
                 },
                 ExpiresIn=expires_in
             )
+            if cache:
+                self.url_cache.put(s3_key, expires_in, url, signed_at)
             return url
         except Exception as e:
-            pprint({"ERROR": f"Failed to generate tempo URL: {str(e)}"})
+            logger.error(f"Failed to generate tempo URL: {str(e)}")
             raise e
 
-    def get_file_from_s3(self, s3_key):
+    async def get_file_bytes(self, s3_key: str):
         try:
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
-            file_content = response["Body"].read()
-
-            encoded_file = base64.b64encode(file_content).decode("utf-8")
-            return encoded_file
-
-        except (BotoCoreError, NoCredentialsError) as e:
-            pprint({"ERROR": "Failed to get file from S3", "reason": str(e)})
+            with track("s3", "get_file_from_s3"):
+                return await asyncio.to_thread(self._read_object, s3_key)
+        except (BotoCoreError, ClientError, NoCredentialsError) as e:
+            logger.error(f"Failed to get file {s3_key} from S3: {str(e)}")
             return None
+
+    def _read_object(self, s3_key: str) -> bytes:
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
+        return response["Body"].read()
@@ -0,0 +1,46 @@
+import time
+from collections import OrderedDict
+
+
+class PresignedUrlCache:
+    """
+    LRU cache of presigned GET URLs per (s3_key, expires_in). A URL is reused until less than
+    `refresh_margin_seconds` of its lifetime is left, so whoever receives it still has time to fetch it.
+    """
+
+    def __init__(self, max_entries: int = 10000, refresh_margin_seconds: float = 300):
+        self.max_entries = max_entries
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._entries: OrderedDict[tuple, tuple[str, float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, s3_key: str, expires_in: int):
+        key = (s3_key, expires_in)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] - time.monotonic() < self.refresh_margin_seconds:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, s3_key: str, expires_in: int, url: str, signed_at: float):
+        """`signed_at` is the time.monotonic() taken before the URL was signed."""
+        key = (s3_key, expires_in)
+        self._entries[key] = (url, signed_at + expires_in)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
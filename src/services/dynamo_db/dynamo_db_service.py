@@ -1,35 +1,77 @@
-from pprint import pprint
-import boto3
-from botocore.exceptions import BotoCoreError, NoCredentialsError
+import asyncio
+import logging
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+
+from src.services.dynamo_db.profile_cache import ProfileCache
+from src.services.dynamo_db.write_behind import PendingWrites, WriteBehindBuffer
+from src.services.metrics.metrics import track
+from src.services.transport.transport import Transport
+from src.utils.lazy import lazy_property
+
+logger = logging.getLogger(__name__)
+
+
+class WardrobeWriteError(Exception):
+    """Raised when wardrobe items that the caller waits for could not be written."""
 
 
 class DynamoDBService:
-    def __init__(self, region_name: str, aws_access_key_id: str, aws_secret_access_key: str, dynamo_table_name: str):
-        self.dynamodb = boto3.resource(
-            "dynamodb",
-            region_name=region_name,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
-        )
+    def __init__(self, transport: Transport, dynamo_table_name: str, wardrobe_table_name: str,
+                 profile_cache: ProfileCache = None, wardrobe_cache: ProfileCache = None,
+                 write_behind_interval: float = 0.5, write_behind_max_items: int = 25):
+        if not wardrobe_table_name:
+            # Without it every wardrobe read and write would fail at request time instead.
+            raise ValueError("DYNAMO_WARDROBE_TABLE_NAME is not set; create the table with "
+                             "`python -m src.tools.migrate_wardrobe --create-table` before deploying")
+        self.transport = transport
         self.table_name = dynamo_table_name
-        self.table = self.dynamodb.Table(self.table_name)
+        self.wardrobe_table_name = wardrobe_table_name
+        # The caches hold what is stored in the tables; queued writes are overlaid by the buffer.
+        self.profile_cache = profile_cache or ProfileCache()
+        self.wardrobe_cache = wardrobe_cache or ProfileCache()
+        self.write_buffer = WriteBehindBuffer(self._write_pending, interval=write_behind_interval,
+                                              max_items=write_behind_max_items)
+
+    @lazy_property
+    def dynamodb(self):
+        # Built on first use, or by the pre-warm after startup.
+        resource = self.transport.aws_resource("dynamodb")
+        logger.info(f"Connected to DynamoDB table: {self.table_name}")
+        return resource
 
-        pprint({"INFO": f"Connected to DynamoDB table: {self.table_name}"})
+    @lazy_property
+    def table(self):
+        return self.dynamodb.Table(self.table_name)
 
-    def get_user(self, user_id: int):
+    @lazy_property
+    def wardrobe_table(self):
+        return self.dynamodb.Table(self.wardrobe_table_name)
+
+    def prewarm(self):
+        """Builds the resource and tables (blocking)."""
+        return self.table, self.wardrobe_table
+
+    async def get_user(self, user_id: int):
         user_id = str(user_id)
 
+        cached_user = self.profile_cache.get(user_id)
+        if cached_user is not None:
+            return self.write_buffer.overlay_user(user_id, cached_user)
+
         try:
-            response = self.table.get_item(Key={"user_id": user_id})
-            return response.get("Item")
+            response = await self._call("get_user", self.table.get_item, Key={"user_id": user_id})
+            user = response.get("Item")
+            if user:
+                self.profile_cache.set(user_id, user)
+            return self.write_buffer.overlay_user(user_id, user)
         except (BotoCoreError, NoCredentialsError) as e:
-            pprint({"ERROR": f"Error fetching user from {self.table_name}: {str(e)}"})
+            logger.error(f"Error fetching user from {self.table_name}: {str(e)}")
             return None
 
-    def save_user(self, user_id: int, phone_number: str, first_name: str, last_name: str):
-        existing_user = self.get_user(user_id)
+    async def save_user(self, user_id: int, phone_number: str, first_name: str, last_name: str):
+        existing_user = await self.get_user(user_id)
         if existing_user:
-            pprint({"INFO": f"User {user_id} already exists."})
+            logger.info(f"User {user_id} already exists.")
             return existing_user
 
         user_id = str(user_id)
@@ -43,23 +85,35 @@ class DynamoDBService:
                 "last_name": last_name or "",
                 "survey_completed": False
             }
-            response = self.table.put_item(Item=new_user)
+            response = await self._call("save_user", self.table.put_item, Item=new_user)
             status_code = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
             if status_code == 200:
-                pprint({"INFO": f"New user {user_id} saved to {self.table_name}."})
+                logger.info(f"New user {user_id} saved to {self.table_name}.")
+                self.profile_cache.set(user_id, new_user)
                 return new_user
-            pprint({"WARNING": "DynamoDB did not return 200 for put_item."})
+            logger.warning("DynamoDB did not return 200 for put_item.")
             return None
         except (BotoCoreError, NoCredentialsError) as e:
-            pprint({"ERROR": f"Error saving user to {self.table_name}: {str(e)}"})
+            logger.error(f"Error saving user to {self.table_name}: {str(e)}")
             return None
 
-    def update_survey(self, user_id: int, survey_data: dict):
-        print(survey_data)
-        user_id = str(user_id)
+    async def update_survey(self, user_id: int, survey_data: dict):
+        """Queues the survey answers. They are visible to get_user at once and written with the next flush."""
+        self.write_buffer.set_survey(str(user_id), {
+            "style": survey_data.get("style", ""),
+            "colors": survey_data.get("colors", ""),
+            "brands": survey_data.get("brands", ""),
+            "gender": survey_data.get("gender", ""),
+            "height": survey_data.get("height", ""),
+            "weight": survey_data.get("weight", ""),
+            "survey_completed": True
+        })
 
+    async def _write_survey(self, user_id: str, attributes: dict) -> bool:
         try:
-            self.table.update_item(
+            response = await self._call(
+                "update_survey",
+                self.table.update_item,
                 Key={"user_id": user_id},
                 UpdateExpression="""
                     SET #sty = :sty,
@@ -79,34 +133,170 @@ class DynamoDBService:
                     "#wt": "weight"
                 },
                 ExpressionAttributeValues={
-                    ":sty": survey_data.get("style", ""),
-                    ":cls": survey_data.get("colors", ""),
-                    ":br": survey_data.get("brands", ""),
-                    ":g": survey_data.get("gender", ""),
-                    ":h": survey_data.get("height", ""),
-                    ":w": survey_data.get("weight", ""),
-                    ":sc": True
-                }
+                    ":sty": attributes["style"],
+                    ":cls": attributes["colors"],
+                    ":br": attributes["brands"],
+                    ":g": attributes["gender"],
+                    ":h": attributes["height"],
+                    ":w": attributes["weight"],
+                    ":sc": attributes["survey_completed"]
+                },
+                ReturnValues="ALL_NEW"
             )
-            pprint({"INFO": f"Survey updated for user {user_id} in {self.table_name}."})
+            self.profile_cache.set(user_id, response["Attributes"])
+            logger.info(f"Survey updated for user {user_id} in {self.table_name}.")
+            return True
+        except (BotoCoreError, ClientError) as e:
+            self.profile_cache.invalidate(user_id)
+            logger.error(f"Error updating survey for {user_id} in {self.table_name}: {str(e)}")
+            return False
+
+    async def get_wardrobe(self, user_id: int) -> list:
+        """Reads all wardrobe items of a user from the wardrobe table, following Query pagination."""
+        user_id = str(user_id)
+
+        cached_wardrobe = self.wardrobe_cache.get(user_id)
+        if cached_wardrobe is not None:
+            return self.write_buffer.overlay_wardrobe(user_id, cached_wardrobe["items"])
+
+        try:
+            items = await self._call("get_wardrobe", self._query_wardrobe, user_id)
+            self.wardrobe_cache.set(user_id, {"items": items})
+            return self.write_buffer.overlay_wardrobe(user_id, items)
         except (BotoCoreError, NoCredentialsError) as e:
-            pprint({"ERROR": f"Error updating survey for {user_id} in {self.table_name}: {str(e)}"})
+            logger.error(f"Error fetching wardrobe for {user_id} from {self.wardrobe_table_name}: {str(e)}")
+            return []
+
+    def _query_wardrobe(self, user_id: str) -> list:
+        from boto3.dynamodb.conditions import Key
+
+        items = []
+        query_kwargs = {"KeyConditionExpression": Key("user_id").eq(user_id)}
+        while True:
+            response = self.wardrobe_table.query(**query_kwargs)
+            items.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return items
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    async def update_wardrobe(self, user_id: int, s3_key: str, summary: str, **attributes):
+        """Adds a wardrobe item. Extra attributes (category, embedding, file_id, hashes) are stored when set."""
+        new_item = {"s3_key": s3_key, "summary": summary}
+        new_item.update(attributes)
+        return await self.add_wardrobe_items(user_id, [new_item])
 
-    def update_wardrobe(self, user_id: int, s3_key: str, summary: str):
+    async def add_wardrobe_items(self, user_id: int, items: list, wait: bool = False):
+        """
+        Queues wardrobe items as separate records (user_id, s3_key). Items queued by all users within
+        the flush interval are written together with BatchWriteItem; get_wardrobe shows them at once.
+        With `wait`, the queue is flushed at once and WardrobeWriteError is raised if the items were not
+        written; they are dropped from the queue then, so a retry by the caller does not write them twice.
+        """
         user_id = str(user_id)
+        new_items = [
+            {"user_id": user_id, **{name: value for name, value in item.items() if value}}
+            for item in items
+        ]
+        self.write_buffer.add_wardrobe_items(user_id, new_items)
+        if wait and not await self.write_buffer.write_now(user_id, {item["s3_key"] for item in new_items}):
+            raise WardrobeWriteError(f"{len(new_items)} wardrobe items of user {user_id} were not written")
+        return new_items
 
+    async def _write_pending(self, batch: dict) -> dict:
+        """Writes a write-behind batch ({user_id: PendingWrites}). Returns the writes that failed, per user."""
+        items = [item for writes in batch.values() for item in writes.wardrobe_items]
+        if items:
+            try:
+                await self._call("update_wardrobe", self._batch_put_wardrobe, items)
+            except (BotoCoreError, ClientError) as e:
+                logger.error(f"Error writing {len(items)} wardrobe items of {len(batch)} users: {e}")
+                return batch
+
+        failed = await asyncio.gather(*(self._apply_user_writes(user_id, writes) for user_id, writes in batch.items()))
+        return {user_id: writes for user_id, writes in zip(batch, failed) if writes}
+
+    async def _apply_user_writes(self, user_id: str, writes: PendingWrites) -> PendingWrites:
+        failed = PendingWrites()
+        if writes.wardrobe_items:
+            cached_wardrobe = self.wardrobe_cache.get(user_id)
+            if cached_wardrobe is not None:
+                stored_keys = {item["s3_key"] for item in cached_wardrobe["items"]}
+                self.wardrobe_cache.set(user_id, {"items": cached_wardrobe["items"] + [
+                    item for item in writes.wardrobe_items if item["s3_key"] not in stored_keys
+                ]})
+            logger.info(f"Wardrobe updated for user {user_id}. Added items: {len(writes.wardrobe_items)}")
+        if writes.version_bumps and not await self._bump_wardrobe_version(user_id, writes.version_bumps):
+            failed.version_bumps = writes.version_bumps
+        if writes.survey is not None and not await self._write_survey(user_id, writes.survey):
+            failed.survey = writes.survey
+        return failed
+
+    async def _bump_wardrobe_version(self, user_id: str, amount: int = 1) -> bool:
+        """Increments the user's wardrobe_version, so results derived from the old wardrobe can be told apart."""
         try:
-            response = self.table.update_item(
+            response = await self._call(
+                "bump_wardrobe_version",
+                self.table.update_item,
                 Key={"user_id": user_id},
-                UpdateExpression="SET wardrobe = list_append(if_not_exists(wardrobe, :empty_list), :new_item)",
-                ExpressionAttributeValues={
-                    ":new_item": [{"s3_key": s3_key, "summary": summary}],
-                    ":empty_list": [],
-                },
+                UpdateExpression="ADD wardrobe_version :amount",
+                ExpressionAttributeValues={":amount": amount},
                 ReturnValues="UPDATED_NEW"
             )
-            pprint(f"Wardrobe updated for user {user_id}. Added item: {s3_key}")
-            return response
-        except (BotoCoreError, NoCredentialsError) as e:
-            pprint(f"Error updating wardrobe for user {user_id}: {e}")
-            return None
+            self.profile_cache.update(user_id, response.get("Attributes", {}))
+            return True
+        except (BotoCoreError, ClientError) as e:
+            self.profile_cache.invalidate(user_id)
+            logger.error(f"Error updating wardrobe version for {user_id}: {str(e)}")
+            return False
+
+    def _batch_put_wardrobe(self, items: list):
+        with self.wardrobe_table.batch_writer(overwrite_by_pkeys=["user_id", "s3_key"]) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+    async def update_wardrobe_file_ids(self, user_id: int, file_ids: dict):
+        """Stores Telegram file_ids ({s3_key: file_id}) on existing wardrobe items."""
+        await self._update_wardrobe_attribute(user_id, "file_id", file_ids)
+
+    async def update_wardrobe_embeddings(self, user_id: int, embeddings: dict):
+        """Stores embedding vectors ({s3_key: float32 bytes}) on existing wardrobe items."""
+        await self._update_wardrobe_attribute(user_id, "embedding", embeddings)
+
+    async def _update_wardrobe_attribute(self, user_id: int, name: str, values: dict):
+        user_id = str(user_id)
+        values = self.write_buffer.set_item_attribute(user_id, name, values)
+        if not values:
+            return
+
+        results = await asyncio.gather(*(
+            self._call(
+                f"update_wardrobe_{name}",
+                self.wardrobe_table.update_item,
+                Key={"user_id": user_id, "s3_key": s3_key},
+                UpdateExpression=f"SET {name} = :value",
+                ConditionExpression="attribute_exists(s3_key)",
+                ExpressionAttributeValues={":value": value}
+            )
+            for s3_key, value in values.items()
+        ), return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, (BotoCoreError, ClientError)):
+                logger.warning(f"Wardrobe {name} not saved for user {user_id}: {str(result)}")
+
+        cached_wardrobe = self.wardrobe_cache.get(user_id)
+        if cached_wardrobe is not None:
+            self.wardrobe_cache.set(user_id, {"items": [
+                {**item, name: values[item["s3_key"]]} if item["s3_key"] in values else item
+                for item in cached_wardrobe["items"]
+            ]})
+
+    @staticmethod
+    async def _call(operation: str, func, *args, **kwargs):
+        """Runs a blocking boto3 call in a worker thread and records it under `operation`."""
+        with track("dynamodb", operation):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def close(self):
+        """Writes all queued changes. Called on shutdown."""
+        await self.write_buffer.close()
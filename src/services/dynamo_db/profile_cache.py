@@ -0,0 +1,86 @@
+import json
+import time
+from collections import OrderedDict
+
+
+def _estimate_size(item: dict) -> int:
+    return len(json.dumps(item, default=str, ensure_ascii=False).encode("utf-8"))
+
+
+class ProfileCache:
+    """
+    In-process LRU cache of user items with a TTL and a total byte-size cap.
+    Entries are evicted from the least recently used end when either cap is exceeded.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[str, tuple[dict, float, int]] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        item, expires_at, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(user_id)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return dict(item)
+
+    def set(self, user_id: str, item: dict):
+        size = _estimate_size(item)
+        self._remove(user_id)
+        if size > self.max_bytes:
+            return
+
+        self._entries[user_id] = (dict(item), time.monotonic() + self.ttl_seconds, size)
+        self._bytes += size
+        self._evict()
+
+    def update(self, user_id: str, attributes: dict):
+        """Merges updated attributes into a cached item. Does nothing when the user is not cached."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+
+        item, _, _ = entry
+        self.set(user_id, {**item, **attributes})
+
+    def invalidate(self, user_id: str):
+        self._remove(user_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def _remove(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
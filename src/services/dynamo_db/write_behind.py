@@ -0,0 +1,181 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY_SECONDS = 30.0
+
+
+class PendingWrites:
+    """The writes of one user that have not reached DynamoDB yet."""
+
+    __slots__ = ("wardrobe_items", "version_bumps", "survey")
+
+    def __init__(self):
+        self.wardrobe_items = []
+        self.version_bumps = 0
+        self.survey = None
+
+    def __bool__(self):
+        return bool(self.wardrobe_items or self.version_bumps or self.survey is not None)
+
+
+class WriteBehindBuffer:
+    """
+    Queues wardrobe appends and survey updates per user and hands them to `write_callback(batch)`
+    together, `interval` seconds after the first one or as soon as `max_items` wardrobe items are
+    queued. The callback returns {user_id: PendingWrites} of what failed; that is queued again and
+    retried with exponential backoff. Queued and in-flight writes are overlaid on reads.
+    """
+
+    def __init__(self, write_callback, interval: float = 0.5, max_items: int = 25):
+        self.write_callback = write_callback
+        self.interval = interval
+        self.max_items = max_items
+        self._pending = {}
+        self._in_flight = {}
+        self._timer = None
+        self._tasks = set()
+        self._lock = asyncio.Lock()
+        self._consecutive_failures = 0
+
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.items_written = 0
+
+    def add_wardrobe_items(self, user_id: str, items: list):
+        writes = self._pending.setdefault(user_id, PendingWrites())
+        writes.wardrobe_items.extend(items)
+        writes.version_bumps += 1
+        self._schedule()
+
+    def set_survey(self, user_id: str, attributes: dict):
+        self._pending.setdefault(user_id, PendingWrites()).survey = attributes
+        self._schedule()
+
+    def set_item_attribute(self, user_id: str, name: str, values: dict) -> dict:
+        """Sets `name` on queued items ({s3_key: value}). Returns the values of items that are not queued."""
+        writes = self._pending.get(user_id)
+        if writes is None:
+            return values
+
+        remaining = dict(values)
+        for item in writes.wardrobe_items:
+            if item["s3_key"] in remaining:
+                item[name] = remaining.pop(item["s3_key"])
+        return remaining
+
+    async def write_now(self, user_id: str, s3_keys: set) -> bool:
+        """
+        Flushes at once and waits for the queued items with these keys. If they were not written, they are
+        taken out of the queue and False is returned, so the caller can retry them instead.
+        """
+        await self.flush()
+        writes = self._pending.get(user_id)
+        if writes is None or not any(item["s3_key"] in s3_keys for item in writes.wardrobe_items):
+            return True
+
+        writes.wardrobe_items = [item for item in writes.wardrobe_items if item["s3_key"] not in s3_keys]
+        if not writes:
+            del self._pending[user_id]
+        return False
+
+    def overlay_user(self, user_id: str, user):
+        if user is None:
+            return None
+        for writes in self._writes(user_id):
+            if writes.survey is not None:
+                user.update(writes.survey)
+            if writes.version_bumps:
+                user["wardrobe_version"] = int(user.get("wardrobe_version", 0)) + writes.version_bumps
+        return user
+
+    def overlay_wardrobe(self, user_id: str, items: list) -> list:
+        queued = [item for writes in self._writes(user_id) for item in writes.wardrobe_items]
+        if not queued:
+            return items
+        stored_keys = {item["s3_key"] for item in items}
+        return items + [item for item in queued if item["s3_key"] not in stored_keys]
+
+    def _writes(self, user_id: str):
+        for writes in (self._in_flight.get(user_id), self._pending.get(user_id)):
+            if writes is not None:
+                yield writes
+
+    def _schedule(self):
+        queued_items = sum(len(writes.wardrobe_items) for writes in self._pending.values())
+        if queued_items >= self.max_items:
+            self._start_flush()
+        elif self._timer is None:
+            delay = min(MAX_RETRY_DELAY_SECONDS, self.interval * 2 ** self._consecutive_failures)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            self._in_flight = batch
+            try:
+                failed = await self.write_callback(batch)
+            except Exception as e:
+                logger.error(f"Write-behind flush of {len(batch)} users failed: {e!r}")
+                failed = batch
+            finally:
+                self._in_flight = {}
+
+            self.flushes += 1
+            self.items_written += (sum(len(writes.wardrobe_items) for writes in batch.values())
+                                   - sum(len(writes.wardrobe_items) for writes in failed.values()))
+            if failed:
+                self.failed_flushes += 1
+                self._consecutive_failures += 1
+                self._requeue(failed)
+                self._schedule()
+            else:
+                self._consecutive_failures = 0
+
+    def _requeue(self, failed: dict):
+        for user_id, writes in failed.items():
+            newer = self._pending.get(user_id)
+            if newer is not None:
+                writes.wardrobe_items.extend(newer.wardrobe_items)
+                writes.version_bumps += newer.version_bumps
+                if newer.survey is not None:
+                    writes.survey = newer.survey
+            self._pending[user_id] = writes
+
+    async def close(self):
+        """Writes everything that is queued, with one retry."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for _ in range(2):
+            await self.flush()
+            if not self._pending:
+                break
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            logger.error(f"Write-behind buffer closed with unwritten changes of {len(self._pending)} users")
+
+    def stats(self) -> dict:
+        return {
+            "pending_users": len(self._pending),
+            "pending_items": sum(len(writes.wardrobe_items) for writes in self._pending.values()),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "items_written": self.items_written,
+        }
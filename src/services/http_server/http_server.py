@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpRequest:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method: str, path: str, query: str, headers: dict, body: bytes):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+
+class HttpResponse:
+    __slots__ = ("status", "body", "content_type")
+
+    def __init__(self, status: int = 200, body: bytes = b"", content_type: str = "text/plain; charset=utf-8"):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+
+
+class HttpServer:
+    """
+    Minimal asyncio HTTP/1.1 server for the bot's own endpoints (webhook, health, metrics).
+    Routes are registered per (method, path) and handled by `async handler(request) -> HttpResponse`.
+    """
+
+    def __init__(self, host: str, port: int, max_body_bytes: int = 1024 * 1024, idle_timeout: float = 75):
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.idle_timeout = idle_timeout
+        self._routes = {}
+        self._server = None
+        self._connections = {}
+
+    def add_route(self, method: str, path: str, handler):
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Port 0 binds an ephemeral port, report the real one.
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            # Idle keep-alive connections would otherwise stay open until the loop is torn down.
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await asyncio.wait_for(self._read_request(reader), timeout=self.idle_timeout)
+                if request is None:
+                    break
+                if isinstance(request, HttpResponse):
+                    await self._write_response(writer, request, keep_alive=False)
+                    break
+
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                response = await self._dispatch(request)
+                await self._write_response(writer, response, keep_alive)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return HttpResponse(400)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            return HttpResponse(400)
+        if length < 0:
+            return HttpResponse(400)
+        if length > self.max_body_bytes:
+            return HttpResponse(413)
+        body = await reader.readexactly(length) if length else b""
+
+        path, _, query = target.partition("?")
+        return HttpRequest(method.upper(), unquote(path), query, headers, body)
+
+    async def _dispatch(self, request: HttpRequest) -> HttpResponse:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            known_path = any(path == request.path for _, path in self._routes)
+            return HttpResponse(405 if known_path else 404)
+
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(f"HTTP handler {request.method} {request.path} failed: {str(e)}")
+            return HttpResponse(500)
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, response: HttpResponse, keep_alive: bool):
+        head = (
+            f"HTTP/1.1 {response.status} {_REASONS.get(response.status, '')}\r\n"
+            f"Content-Type: {response.content_type}\r\n"
+            f"Content-Length: {len(response.body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + response.body)
+        await writer.drain()
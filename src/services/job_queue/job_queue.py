@@ -0,0 +1,287 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from src.services.metrics.metrics import track
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class SQLiteJobStore:
+    """
+    Jobs and their idempotency keys in a local SQLite file. Methods are blocking and are called from a
+    worker thread. Finished jobs are kept for `retention_seconds`, so a redelivered update is still
+    recognized by its keys.
+    """
+
+    def __init__(self, path: str, retention_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at);
+            CREATE TABLE IF NOT EXISTS job_keys (
+                key TEXT PRIMARY KEY,
+                job_id INTEGER NOT NULL
+            );
+        """)
+
+    def add(self, kind: str, payload: str, keys: list):
+        """Stores a queued job and returns its id, or None when every one of its keys is already known."""
+        now = time.time()
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                job_id = connection.execute(
+                    "INSERT INTO jobs (kind, payload, status, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, payload, QUEUED, now, now, now)
+                ).lastrowid
+                new_keys = connection.executemany("INSERT OR IGNORE INTO job_keys (key, job_id) VALUES (?, ?)",
+                                                  [(key, job_id) for key in keys]).rowcount
+                if keys and new_keys == 0:
+                    connection.execute("ROLLBACK")
+                    return None
+                connection.execute("COMMIT")
+                return job_id
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def claim(self):
+        """Marks the next due job as running and returns (id, kind, payload, attempts), or None."""
+        now = time.time()
+        with self._lock:
+            return self._connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ("
+                "SELECT id FROM jobs WHERE status = ? AND run_at <= ? ORDER BY run_at, id LIMIT 1"
+                ") RETURNING id, kind, payload, attempts",
+                (RUNNING, now, QUEUED, now)
+            ).fetchone()
+
+    def next_run_at(self):
+        with self._lock:
+            return self._connection.execute("SELECT MIN(run_at) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def finish(self, job_id: int, status: str, error: str = None):
+        with self._lock:
+            self._connection.execute("UPDATE jobs SET status = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                                     (status, time.time(), error, job_id))
+
+    def retry(self, job_id: int, run_at: float, error: str):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, run_at = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                (QUEUED, run_at, time.time(), error, job_id)
+            )
+
+    def recover(self) -> int:
+        """Queues the jobs that were running when the process stopped and drops expired finished jobs."""
+        expired_before = time.time() - self.retention_seconds
+        with self._lock:
+            connection = self._connection
+            requeued = connection.execute("UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, RUNNING)).rowcount
+            connection.execute(
+                "DELETE FROM job_keys WHERE job_id IN (SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)",
+                (DONE, FAILED, expired_before)
+            )
+            connection.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                               (DONE, FAILED, expired_before))
+            return requeued
+
+    def queued(self) -> dict:
+        """Returns {job id: created_at} of the queued jobs."""
+        with self._lock:
+            return dict(self._connection.execute("SELECT id, created_at FROM jobs WHERE status = ?", (QUEUED,)))
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class JobQueue:
+    """
+    Durable background jobs, processed by `workers` concurrent tasks. A job that raises is retried with
+    full-jitter exponential backoff until it has run `max_attempts` times, then it is marked failed and
+    handed to its kind's `on_failure(payload)`. Jobs interrupted by a restart run again after it.
+    The queue gauges in `stats()` are kept in memory, counted from the store once on start.
+    """
+
+    def __init__(self, store: SQLiteJobStore, workers: int = 4, max_attempts: int = 5, backoff_base: float = 2.0,
+                 backoff_max: float = 300.0, poll_interval: float = 5.0, shutdown_timeout: float = 30.0):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        self._handlers = {}
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._queued = {}
+        self._claimed_early = set()
+        self._running = 0
+        self._failed_jobs = 0
+
+        self.enqueued = 0
+        self.duplicates = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, kind: str, handler, on_failure=None):
+        """`handler(payload)` processes a job; `on_failure(payload)` runs once a job of this kind gave up."""
+        self._handlers[kind] = (handler, on_failure)
+
+    async def enqueue(self, kind: str, payload: dict, keys=()) -> bool:
+        """
+        Stores a job. Returns False when all of its idempotency keys belong to jobs queued before,
+        e.g. for an update Telegram delivered twice.
+        """
+        job_id = await asyncio.to_thread(self.store.add, kind, json.dumps(payload),
+                                         [f"{kind}:{key}" for key in keys])
+        if job_id is None:
+            self.duplicates += 1
+            return False
+        if job_id in self._claimed_early:
+            self._claimed_early.discard(job_id)
+        else:
+            self._queued[job_id] = time.time()
+        self.enqueued += 1
+        self._wakeup.set()
+        return True
+
+    async def start(self):
+        requeued = await asyncio.to_thread(self.store.recover)
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs interrupted by the last shutdown")
+        self._queued = await asyncio.to_thread(self.store.queued)
+        self._failed_jobs = await asyncio.to_thread(self.store.count, FAILED)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Lets running jobs finish for up to `shutdown_timeout` seconds; the rest run after the next start."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await asyncio.to_thread(self.store.close)
+        # Whatever is left stays in the store for the next start; this process no longer holds any jobs.
+        self._queued = {}
+        self._failed_jobs = 0
+
+    async def _work(self):
+        while not self._stopping:
+            # Cleared before looking for work, so an enqueue from now on wakes this worker.
+            self._wakeup.clear()
+            timeout = self.poll_interval
+            try:
+                job = await asyncio.to_thread(self.store.claim)
+                if job is not None:
+                    created_at = self._queued.pop(job[0], None)
+                    if created_at is None:
+                        # Claimed before enqueue() got the id back from the store.
+                        self._claimed_early.add(job[0])
+                        created_at = time.time()
+                    self._running += 1
+                    try:
+                        retried = await self._run(*job)
+                    finally:
+                        self._running -= 1
+                    if retried:
+                        self._queued[job[0]] = created_at
+                    continue
+                next_run_at = await asyncio.to_thread(self.store.next_run_at)
+                if next_run_at is not None:
+                    timeout = min(timeout, max(0.0, next_run_at - time.time()))
+            except Exception as e:
+                logger.error(f"Job queue worker error: {e!r}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job_id: int, kind: str, payload: str, attempts: int) -> bool:
+        """Runs a claimed job. Returns whether it was queued again for a retry."""
+        handler, on_failure = self._handlers.get(kind, (None, None))
+        payload = json.loads(payload)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {kind}")
+            with track("job_queue", kind):
+                await handler(payload)
+        except Exception as e:
+            if handler is not None and attempts < self.max_attempts:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempts))
+                logger.warning(f"Job {job_id} ({kind}) failed on attempt {attempts}, retrying in {delay:.1f}s: {e!r}")
+                await asyncio.to_thread(self.store.retry, job_id, time.time() + delay, repr(e))
+                self.retried += 1
+                return True
+
+            logger.error(f"Job {job_id} ({kind}) failed after {attempts} attempts: {e!r}")
+            await asyncio.to_thread(self.store.finish, job_id, FAILED, repr(e))
+            self.failed += 1
+            self._failed_jobs += 1
+            if on_failure is not None:
+                try:
+                    await on_failure(payload)
+                except Exception as failure_error:
+                    logger.error(f"Failure callback of job {job_id} ({kind}) failed: {failure_error!r}")
+            return False
+
+        await asyncio.to_thread(self.store.finish, job_id, DONE)
+        self.completed += 1
+        return False
+
+    def stats(self) -> dict:
+        oldest_queued = min(self._queued.values(), default=None)
+        return {
+            "queued": len(self._queued),
+            "running": self._running,
+            "failed_jobs": self._failed_jobs,
+            "oldest_queued_age_seconds": round(time.time() - oldest_queued, 3) if oldest_queued else 0,
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+def create_job_queue(backend: str, sqlite_path: str, retention_seconds: float, **kwargs):
+    if backend == "sqlite":
+        return JobQueue(SQLiteJobStore(sqlite_path, retention_seconds=retention_seconds), **kwargs)
+    return None
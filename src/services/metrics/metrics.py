@@ -0,0 +1,233 @@
+import asyncio
+import functools
+import math
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+                break
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics in the Prometheus text format. Collectors are called on every scrape
+    and refresh gauges from components that keep their own counters (caches, queues).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+DEPENDENCY_LATENCY = REGISTRY.histogram(
+    "bot_dependency_latency_seconds", "Latency of calls to external services.", ("dependency", "operation"))
+DEPENDENCY_ERRORS = REGISTRY.counter(
+    "bot_dependency_errors_total", "Failed calls to external services.", ("dependency", "operation"))
+DEPENDENCY_IN_FLIGHT = REGISTRY.gauge(
+    "bot_dependency_in_flight", "Calls to external services in progress.", ("dependency", "operation"))
+CALLBACK_LATENCY = REGISTRY.histogram(
+    "bot_callback_latency_seconds", "Latency of bot callbacks.", ("callback",))
+CALLBACK_ERRORS = REGISTRY.counter(
+    "bot_callback_errors_total", "Bot callbacks that raised.", ("callback",))
+CALLBACK_IN_FLIGHT = REGISTRY.gauge(
+    "bot_callback_in_flight", "Bot callbacks in progress.", ("callback",))
+OPENAI_TOKENS = REGISTRY.counter(
+    "bot_openai_tokens_total", "OpenAI tokens used.", ("purpose", "kind"))
+OPENAI_REQUEST_TOKENS = REGISTRY.histogram(
+    "bot_openai_request_tokens", "OpenAI tokens per request.", ("purpose", "kind"),
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+
+
+class track:
+    """Context manager that records latency, errors and in-flight count of one external call."""
+
+    __slots__ = ("labels", "started_at")
+
+    def __init__(self, dependency: str, operation: str):
+        self.labels = {"dependency": dependency, "operation": operation}
+
+    def __enter__(self):
+        DEPENDENCY_IN_FLIGHT.inc(**self.labels)
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        DEPENDENCY_LATENCY.observe(time.perf_counter() - self.started_at, **self.labels)
+        DEPENDENCY_IN_FLIGHT.dec(**self.labels)
+        if exc_type is not None and not issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            DEPENDENCY_ERRORS.inc(**self.labels)
+        return False
+
+
+def observe_callback(name: str):
+    """Decorator for async callbacks: records latency, errors and in-flight count under `name`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            CALLBACK_IN_FLIGHT.inc(callback=name)
+            started_at = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                CALLBACK_ERRORS.inc(callback=name)
+                raise
+            finally:
+                CALLBACK_LATENCY.observe(time.perf_counter() - started_at, callback=name)
+                CALLBACK_IN_FLIGHT.dec(callback=name)
+
+        return wrapper
+
+    return decorator
+
+
+def register_stats(name: str, stats, label: str = "kind"):
+    """
+    Exposes a component's stats() dict as gauges named bot_<name>_<key>. Nested dicts become one
+    gauge with `label` set to the inner key.
+    """
+    gauges = {}
+
+    def collect():
+        for key, value in stats().items():
+            metric_name = f"bot_{name}_{key}"
+            if isinstance(value, dict):
+                gauge = gauges.get(key) or gauges.setdefault(key, REGISTRY.gauge(metric_name, metric_name, (label,)))
+                for inner_key, inner_value in value.items():
+                    gauge.set(inner_value, **{label: inner_key})
+            elif isinstance(value, (int, float)):
+                gauge = gauges.get(key) or gauges.setdefault(key, REGISTRY.gauge(metric_name, metric_name))
+                gauge.set(value)
+
+    REGISTRY.add_collector(collect)
+
+
+def record_openai_usage(purpose: str, usage):
+    """Counts a request's tokens, including prompt tokens served from the provider's prompt cache."""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+
+    OPENAI_TOKENS.inc(prompt_tokens, purpose=purpose, kind="prompt")
+    OPENAI_TOKENS.inc(completion_tokens, purpose=purpose, kind="completion")
+    OPENAI_TOKENS.inc(cached_tokens, purpose=purpose, kind="cached_prompt")
+    OPENAI_REQUEST_TOKENS.observe(prompt_tokens, purpose=purpose, kind="prompt")
+    OPENAI_REQUEST_TOKENS.observe(completion_tokens, purpose=purpose, kind="completion")
@@ -0,0 +1,95 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+from src.services.metrics.metrics import track
+from src.services.open_ai.request_scheduler import PRIORITY_BACKGROUND, RequestScheduler
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _normalize_rows(vectors: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into L2-normalized float32 vectors of a fixed dimension."""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    @abstractmethod
+    async def embed(self, texts: list, priority: int = PRIORITY_BACKGROUND) -> "np.ndarray":
+        """Returns a (len(texts), dimensions) float32 matrix."""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, get_client, scheduler: RequestScheduler, model: str = "text-embedding-3-small",
+                 dimensions: int = 256):
+        """
+        `get_client` returns the AsyncOpenAI client, built on first use, with the SDK's retries turned off.
+        Requests are admitted and retried by `scheduler`, the one chat requests use, so embeddings count
+        against the same rate limits. Raises OpenAIRequestError when a request fails for good.
+        """
+        super().__init__(dimensions)
+        self.get_client = get_client
+        self.scheduler = scheduler
+        self.model = model
+
+    async def embed(self, texts: list, priority: int = PRIORITY_BACKGROUND) -> "np.ndarray":
+        async def call():
+            with track("openai", "embedding"):
+                return await self.get_client().embeddings.create(model=self.model, input=texts,
+                                                                 dimensions=self.dimensions)
+
+        response = await self.scheduler.run(
+            call,
+            priority=priority,
+            estimated_tokens=sum(len(text) for text in texts) // 4 + 1
+        )
+        import numpy as np
+
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        return _normalize_rows(vectors)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic local provider: hashes words and character trigrams into a fixed number of buckets.
+    Needs no network access, so it can be used offline and in benchmarks.
+    """
+
+    async def embed(self, texts: list, priority: int = PRIORITY_BACKGROUND) -> "np.ndarray":
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        return _normalize_rows(vectors)
+
+    @staticmethod
+    def _features(text: str):
+        for token in _TOKEN_RE.findall(text.lower()):
+            yield token
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+
+def create_embedding_provider(provider: str, get_client, scheduler: RequestScheduler, model: str,
+                              dimensions: int) -> EmbeddingProvider:
+    if provider == "local":
+        return HashingEmbeddingProvider(dimensions)
+    return OpenAIEmbeddingProvider(get_client, scheduler, model=model, dimensions=dimensions)
@@ -0,0 +1,338 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+
+ROLES = ("user", "assistant")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+class HistoryStore(ABC):
+    """
+    Conversation history of each user, stored as compact (role_code, content) turns.
+    Implementations keep at most `max_turns` turns and `max_user_chars` characters per user.
+    """
+
+    def __init__(self, max_turns: int = 10, max_user_chars: int = 16000, max_users: int = 10000,
+                 idle_ttl_seconds: float = 24 * 3600):
+        self.max_turns = max_turns
+        self.max_user_chars = max_user_chars
+        self.max_users = max_users
+        self.idle_ttl_seconds = idle_ttl_seconds
+
+    @abstractmethod
+    async def get_messages(self, user_id: int) -> list:
+        """Returns the stored turns as chat completion messages, oldest first."""
+
+    @abstractmethod
+    async def append(self, user_id: int, role: str, content: str):
+        pass
+
+    @abstractmethod
+    async def clear(self, user_id: int):
+        pass
+
+    @abstractmethod
+    async def get_summary(self, user_id: int) -> str:
+        """Returns the running summary of turns that were folded out of the history, or ""."""
+
+    @abstractmethod
+    async def fold(self, user_id: int, summary: str, folded_turns: list) -> bool:
+        """
+        Replaces the oldest turns with `summary`, if they still are `folded_turns` (the history may have
+        been trimmed while the summary was written). Returns whether the history was changed.
+        """
+
+    async def close(self):
+        pass
+
+
+class _UserHistory:
+    __slots__ = ("turns", "chars", "summary", "last_active")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.chars = 0
+        self.summary = ""
+        self.last_active = time.monotonic()
+
+
+class InMemoryHistoryStore(HistoryStore):
+    """
+    Process-local store. Users are kept in LRU order and dropped when idle for longer than
+    `idle_ttl_seconds`, or when the `max_users` / `max_total_chars` caps are exceeded.
+    """
+
+    def __init__(self, max_total_chars: int = 50_000_000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_total_chars = max_total_chars
+        self._users: OrderedDict[int, _UserHistory] = OrderedDict()
+        self._total_chars = 0
+
+    async def get_messages(self, user_id: int) -> list:
+        self._expire_idle()
+        history = self._users.get(user_id)
+        if history is None:
+            return []
+
+        self._touch(user_id, history)
+        return [{"role": ROLES[role_code], "content": content} for role_code, content in history.turns]
+
+    async def append(self, user_id: int, role: str, content: str):
+        self._expire_idle()
+        history = self._users.get(user_id)
+        if history is None:
+            history = self._users[user_id] = _UserHistory(self.max_turns)
+        self._touch(user_id, history)
+
+        if len(history.turns) == history.turns.maxlen:
+            history.chars -= len(history.turns[0][1])
+            self._total_chars -= len(history.turns[0][1])
+        history.turns.append((ROLE_CODES[role], content))
+        history.chars += len(content)
+        self._total_chars += len(content)
+
+        while history.chars > self.max_user_chars and len(history.turns) > 1:
+            _, dropped = history.turns.popleft()
+            history.chars -= len(dropped)
+            self._total_chars -= len(dropped)
+
+        self._evict()
+
+    async def clear(self, user_id: int):
+        self._drop(user_id)
+
+    async def get_summary(self, user_id: int) -> str:
+        history = self._users.get(user_id)
+        return history.summary if history is not None else ""
+
+    async def fold(self, user_id: int, summary: str, folded_turns: list) -> bool:
+        history = self._users.get(user_id)
+        expected = [(ROLE_CODES[turn["role"]], turn["content"]) for turn in folded_turns]
+        if history is None or not expected or list(history.turns)[:len(expected)] != expected:
+            return False
+
+        for _ in expected:
+            _, content = history.turns.popleft()
+            history.chars -= len(content)
+            self._total_chars -= len(content)
+        self._total_chars += len(summary) - len(history.summary)
+        history.chars += len(summary) - len(history.summary)
+        history.summary = summary
+        return True
+
+    def stats(self) -> dict:
+        return {"users": len(self._users), "chars": self._total_chars}
+
+    def _touch(self, user_id: int, history: _UserHistory):
+        history.last_active = time.monotonic()
+        self._users.move_to_end(user_id)
+
+    def _drop(self, user_id: int):
+        history = self._users.pop(user_id, None)
+        if history is not None:
+            self._total_chars -= history.chars
+
+    def _expire_idle(self):
+        deadline = time.monotonic() - self.idle_ttl_seconds
+        while self._users:
+            user_id, history = next(iter(self._users.items()))
+            if history.last_active >= deadline:
+                break
+            self._drop(user_id)
+
+    def _evict(self):
+        while len(self._users) > 1 and (
+                len(self._users) > self.max_users or self._total_chars > self.max_total_chars):
+            self._drop(next(iter(self._users)))
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    File-backed store, so history survives restarts. Blocking sqlite calls run in a worker thread.
+    Like the in-memory store, the least recently active users are dropped once the stored turns and
+    summaries exceed `max_total_chars`; the running total is counted once when the file is opened.
+    """
+
+    def __init__(self, path: str, max_total_chars: int = 50_000_000, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_total_chars = max_total_chars
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                role INTEGER NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS turns_user_id ON turns (user_id, id);
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                last_active REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS users_last_active ON users (last_active);
+            CREATE TABLE IF NOT EXISTS summaries (
+                user_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL
+            );
+        """)
+        self._total_chars = self._connection.execute(
+            "SELECT (SELECT COALESCE(SUM(length(content)), 0) FROM turns)"
+            " + (SELECT COALESCE(SUM(length(summary)), 0) FROM summaries)"
+        ).fetchone()[0]
+
+    async def get_messages(self, user_id: int) -> list:
+        rows = await asyncio.to_thread(self._select, user_id)
+        return [{"role": ROLES[role_code], "content": content} for role_code, content in rows]
+
+    async def append(self, user_id: int, role: str, content: str):
+        await asyncio.to_thread(self._insert, user_id, ROLE_CODES[role], content)
+
+    async def clear(self, user_id: int):
+        await asyncio.to_thread(self._delete_users, [user_id])
+
+    async def get_summary(self, user_id: int) -> str:
+        return await asyncio.to_thread(self._select_summary, user_id)
+
+    async def fold(self, user_id: int, summary: str, folded_turns: list) -> bool:
+        expected = [(ROLE_CODES[turn["role"]], turn["content"]) for turn in folded_turns]
+        if not expected:
+            return False
+        return await asyncio.to_thread(self._fold, user_id, summary, expected)
+
+    async def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            users = self._connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return {"users": users, "chars": self._total_chars}
+
+    def _user_chars(self, user_id: int) -> int:
+        return self._connection.execute(
+            "SELECT (SELECT COALESCE(SUM(length(content)), 0) FROM turns WHERE user_id = ?)"
+            " + (SELECT COALESCE(SUM(length(summary)), 0) FROM summaries WHERE user_id = ?)",
+            (user_id, user_id)
+        ).fetchone()[0]
+
+    def _select_summary(self, user_id: int) -> str:
+        with self._lock:
+            row = self._connection.execute("SELECT summary FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else ""
+
+    def _fold(self, user_id: int, summary: str, expected: list) -> bool:
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                chars_before = self._user_chars(user_id)
+                rows = connection.execute(
+                    "SELECT id, role, content FROM turns WHERE user_id = ? ORDER BY id LIMIT ?",
+                    (user_id, len(expected))
+                ).fetchall()
+                if [(role, content) for _, role, content in rows] != expected:
+                    connection.execute("ROLLBACK")
+                    return False
+
+                connection.execute("DELETE FROM turns WHERE user_id = ? AND id <= ?", (user_id, rows[-1][0]))
+                connection.execute(
+                    "INSERT INTO summaries (user_id, summary) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary",
+                    (user_id, summary)
+                )
+                chars_after = self._user_chars(user_id)
+                connection.execute("COMMIT")
+                self._total_chars += chars_after - chars_before
+                return True
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _select(self, user_id: int) -> list:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE users SET last_active = ? WHERE user_id = ?", (time.time(), user_id)
+            )
+            return self._connection.execute(
+                "SELECT role, content FROM turns WHERE user_id = ? ORDER BY id", (user_id,)
+            ).fetchall()
+
+    def _insert(self, user_id: int, role_code: int, content: str):
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                chars_before = self._user_chars(user_id)
+                connection.execute("INSERT INTO turns (user_id, role, content) VALUES (?, ?, ?)",
+                                   (user_id, role_code, content))
+                connection.execute(
+                    "INSERT INTO users (user_id, last_active) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET last_active = excluded.last_active",
+                    (user_id, time.time())
+                )
+                self._trim_user(user_id)
+                chars_after = self._user_chars(user_id)
+                connection.execute("COMMIT")
+                self._total_chars += chars_after - chars_before
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+        self._evict()
+
+    def _trim_user(self, user_id: int):
+        rows = self._connection.execute(
+            "SELECT id, length(content) FROM turns WHERE user_id = ? ORDER BY id DESC", (user_id,)
+        ).fetchall()
+
+        chars = 0
+        for position, (turn_id, length) in enumerate(rows):
+            chars += length
+            if position >= self.max_turns or (chars > self.max_user_chars and position > 0):
+                self._connection.execute("DELETE FROM turns WHERE user_id = ? AND id <= ?", (user_id, turn_id))
+                break
+
+    def _evict(self):
+        with self._lock:
+            deadline = time.time() - self.idle_ttl_seconds
+            expired = [row[0] for row in self._connection.execute(
+                "SELECT user_id FROM users WHERE last_active < ?", (deadline,)
+            )]
+            overflow = [row[0] for row in self._connection.execute(
+                "SELECT user_id FROM users ORDER BY last_active DESC LIMIT -1 OFFSET ?", (self.max_users,)
+            )]
+            dropped = list(dict.fromkeys(expired + overflow))
+            if self._total_chars > self.max_total_chars:
+                excess = self._total_chars - self.max_total_chars - sum(self._user_chars(uid) for uid in dropped)
+                # Least recently active first; the most recent user is kept, as in the in-memory store.
+                users = self._connection.execute("SELECT user_id FROM users ORDER BY last_active").fetchall()
+                for (user_id,) in users[:-1]:
+                    if excess <= 0:
+                        break
+                    if user_id not in dropped:
+                        excess -= self._user_chars(user_id)
+                        dropped.append(user_id)
+        if dropped:
+            self._delete_users(dropped)
+
+    def _delete_users(self, user_ids: list):
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._total_chars -= sum(self._user_chars(uid) for uid in user_ids)
+            self._connection.executemany("DELETE FROM turns WHERE user_id = ?", [(uid,) for uid in user_ids])
+            self._connection.executemany("DELETE FROM users WHERE user_id = ?", [(uid,) for uid in user_ids])
+            self._connection.executemany("DELETE FROM summaries WHERE user_id = ?", [(uid,) for uid in user_ids])
+            self._connection.execute("COMMIT")
+
+
+def create_history_store(backend: str, sqlite_path: str, max_total_chars: int, **kwargs) -> HistoryStore:
+    if backend == "sqlite":
+        return SQLiteHistoryStore(sqlite_path, max_total_chars=max_total_chars, **kwargs)
+    return InMemoryHistoryStore(max_total_chars=max_total_chars, **kwargs)
@@ -1,33 +1,151 @@
+import asyncio
 import json
-
-import openai
-from openai import AuthenticationError, RateLimitError, APIConnectionError
-from pprint import pprint
+import logging
 
 from src.core.prompts import getPrompts
+from src.services.open_ai.history_store import HistoryStore, InMemoryHistoryStore
+from src.services.open_ai.prompt_builder import PromptBuilder
+from src.services.metrics.metrics import record_openai_usage, track
+from src.services.open_ai.request_scheduler import (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_STYLE,
+                                                    OpenAIRequestError, RequestScheduler, estimate_tokens)
+from src.services.open_ai.token_counter import TokenCounter
+from src.services.transport.transport import Transport
+from src.services.wardrobe_index.wardrobe_catalog import WardrobeCatalog
+from src.utils.lazy import lazy_property
 
+logger = logging.getLogger(__name__)
 
-def _make_request(messages: list, model: str = "gpt-4o", temperature: float = 1):
-    try:
-        response = openai.chat.completions.create(
+
+_PURPOSE_PRIORITIES = {"chat": PRIORITY_INTERACTIVE, "style": PRIORITY_STYLE, "vision": PRIORITY_BACKGROUND,
+                       "summary": PRIORITY_BACKGROUND}
+
+SUMMARY_PROMPT = (
+    "You maintain the memory of a personal stylist bot. Merge the previous summary and the new part of the "
+    "conversation into one short summary, at most 150 words, in the language of the conversation. Keep the "
+    "user's preferences, sizes, occasions, requests and the advice they accepted or rejected. "
+    "Return only the summary."
+)
+
+CATALOG_PROMPT = (
+    "When the user asks for an outfit or what to wear, answer with your advice and call show_outfit with the "
+    "ids of the catalog items to show, at most one item per category. Use show_outfit instead of the "
+    "<style_request> and <metadata> tags."
+)
+
+OUTFIT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "show_outfit",
+        "description": "Shows the user the photos of an outfit put together from their wardrobe catalog.",
+        "strict": True,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "item_ids": {"type": "array", "items": {"type": "integer"},
+                             "description": "Catalog ids of the items, at most one per category."},
+                "style": {"type": "string", "description": "A few words describing the look."},
+            },
+            "required": ["item_ids", "style"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+OUTFIT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "outfit",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"outfit": {"type": "array", "items": {"type": "string"}}},
+            "required": ["outfit"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+async def _make_request(client, scheduler: RequestScheduler, messages: list, model: str = "gpt-4o",
+                        temperature: float = 1, purpose: str = "chat", **kwargs) -> str:
+    """Returns the answer text. Raises OpenAIRequestError when the request fails after retries."""
+    message = await _request_message(client, scheduler, messages, model=model, temperature=temperature,
+                                     purpose=purpose, **kwargs)
+    return message.content or ""
+
+
+async def _request_message(client, scheduler: RequestScheduler, messages: list, model: str = "gpt-4o",
+                           temperature: float = 1, purpose: str = "chat", **kwargs):
+    """Returns the answer message, with its tool calls. Raises OpenAIRequestError like _make_request."""
+
+    async def call():
+        with track("openai", purpose):
+            return await client.chat.completions.create(model=model, messages=messages, temperature=temperature,
+                                                        **kwargs)
+
+    response = await scheduler.run(call, priority=_PURPOSE_PRIORITIES[purpose],
+                                   estimated_tokens=estimate_tokens(messages))
+    record_openai_usage(purpose, response.usage)
+    return response.choices[0].message
+
+
+async def _stream_request(client, scheduler: RequestScheduler, messages: list, model: str = "gpt-4o",
+                          temperature: float = 1, on_tool_call=None, **kwargs):
+    """
+    Yields the answer text in chunks. Tool calls are assembled from their argument deltas and passed
+    to `on_tool_call(name, arguments)` as soon as the model has finished the answer.
+    """
+    stream = scheduler.stream(
+        lambda: client.chat.completions.create(
             model=model,
             messages=messages,
-            temperature=temperature
-        )
-        return response.choices[0].message.content
-
-    except AuthenticationError:
-        pprint("❌ Authentication error.")
-        return "Authentication failed."
-    except RateLimitError:
-        pprint("⚠ Rate limit exceeded.")
-        return "Rate limit exceeded."
-    except APIConnectionError:
-        pprint("🌐 API connection error.")
-        return "API connection error."
-    except Exception as e:
-        pprint(f"Unexpected error: {e}")
-        return "An unexpected error occurred."
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        ),
+        priority=PRIORITY_INTERACTIVE,
+        estimated_tokens=estimate_tokens(messages)
+    )
+    tool_calls = {}
+    with track("openai", "chat_stream"):
+        async for chunk in stream:
+            record_openai_usage("chat_stream", chunk.usage)
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.delta.content:
+                yield choice.delta.content
+            for delta in choice.delta.tool_calls or []:
+                call = tool_calls.setdefault(delta.index, {"name": "", "arguments": ""})
+                if delta.function is not None:
+                    call["name"] += delta.function.name or ""
+                    call["arguments"] += delta.function.arguments or ""
+            if choice.finish_reason and on_tool_call is not None:
+                for call in tool_calls.values():
+                    on_tool_call(call["name"], call["arguments"])
+                tool_calls = {}
+
+
+def is_image_url_error(error: Exception) -> bool:
+    """Whether OpenAI rejected a request because it could not download one of its image URLs."""
+    cause = error.__cause__
+    if getattr(cause, "status_code", None) != 400:
+        return False
+    return getattr(cause, "code", None) == "invalid_image_url" or "downloading" in str(cause).lower()
+
+
+def _parse_outfit_call(catalog: WardrobeCatalog, name: str, arguments: str):
+    """Returns (s3_keys, style description) of a show_outfit call, or None for any other call."""
+    if name != OUTFIT_TOOL["function"]["name"]:
+        logger.warning(f"Model called an unknown tool: {name}")
+        return None
+    try:
+        data = json.loads(arguments)
+        return catalog.resolve(data.get("item_ids", [])), str(data.get("style", ""))
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        logger.error(f"Tool call arguments are not valid JSON ({len(arguments)} chars)")
+        return None
 
 
 def _parse_outfit_response(response_text: str) -> list:
@@ -35,38 +153,171 @@ def _parse_outfit_response(response_text: str) -> list:
         data = json.loads(response_text)
         return data.get("outfit", [])
     except json.JSONDecodeError:
-        pprint({"ERROR": "Response is not valid JSON", "response": response_text})
+        logger.error(f"Response is not valid JSON ({len(response_text)} chars)")
+        return []
+
+
+def _parse_summaries_response(response_text: str) -> list:
+    try:
+        summaries = json.loads(response_text).get("summaries", [])
+        return [str(summary) for summary in summaries]
+    except (json.JSONDecodeError, AttributeError):
+        logger.error(f"Response is not valid JSON ({len(response_text)} chars)")
         return []
 
 
 class OpenAIChat:
-    def __init__(self, api_key: str):
-        self.prompts = getPrompts()
+    def __init__(self, api_key: str, history_store: HistoryStore = None, vision_detail: str = "auto",
+                 scheduler: RequestScheduler = None, base_url: str = None, prompt_budget_tokens: int = 3000,
+                 summarize_after_tokens: int = 1500, keep_recent_turns: int = 4, prompts: dict = None,
+                 transport: Transport = None):
+        self.prompts = prompts or getPrompts()
         self.api_key = api_key
-        self.user_histories = {}
-        openai.api_key = self.api_key
+        self.vision_detail = vision_detail
+        self.history_store = history_store or InMemoryHistoryStore()
+        self.scheduler = scheduler or RequestScheduler()
+        self.token_counter = TokenCounter(self.prompts["model"])
+        self.prompt_builder = PromptBuilder(self.token_counter, budget_tokens=prompt_budget_tokens)
+        self.summarize_after_tokens = summarize_after_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.base_url = base_url
+        self.transport = transport
+        self._summary_tasks = {}
 
-    def get_answer_ai(self, user_id: int, user_message: str, temperature: float = 1, user_info_formated: str = ""):
-        if user_id not in self.user_histories:
-            self.user_histories[user_id] = []
+    @lazy_property
+    def client(self):
+        # openai is imported and the client built on first use, or by the pre-warm after startup.
+        from openai import AsyncOpenAI
 
-        self.user_histories[user_id].append({"role": "user", "content": user_message})
+        http_client = self.transport.openai_http_client if self.transport is not None else None
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client)
 
-        self.user_histories[user_id] = self.user_histories[user_id][-10:]
+    @lazy_property
+    def chat_client(self):
+        # Requests are retried by the scheduler, so the SDK's own retries are turned off for them.
+        return self.client.with_options(max_retries=0)
 
+    def prewarm(self):
+        """Builds the clients and loads the tokenizer (blocking)."""
+        return self.chat_client, self.token_counter.encoding
+
+    async def _build_chat_messages(self, user_id: int, user_message: str, user_info_formated: str,
+                                   catalog: WardrobeCatalog = None) -> list:
+        # The user's turn is stored together with the answer, so a failed or cancelled request leaves no trace.
+        history = await self.history_store.get_messages(user_id)
+        history.append({"role": "user", "content": user_message})
+
+        messages, stats = self.prompt_builder.build(
+            base_prompt=self.prompts["base_prompt"],
+            user_info=user_info_formated,
+            summary=await self.history_store.get_summary(user_id),
+            history=history,
+            catalog=f"{CATALOG_PROMPT}\n\n{catalog.text}" if catalog else ""
+        )
+        logger.debug(f"Prompt for user {user_id}: {stats}")
+        return messages
+
+    def _schedule_summary(self, user_id: int):
+        """Folds old turns into the running summary in the background, one task per user at a time."""
+        if user_id in self._summary_tasks:
+            return
+        task = asyncio.create_task(self._summarize(user_id))
+        self._summary_tasks[user_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(user_id, None))
+
+    async def _summarize(self, user_id: int):
+        history = await self.history_store.get_messages(user_id)
+        if len(history) <= self.keep_recent_turns:
+            return
+        if (self.token_counter.count_messages(history) < self.summarize_after_tokens
+                and len(history) < self.history_store.max_turns):
+            return
+
+        folded_turns = history[:-self.keep_recent_turns]
+        previous_summary = await self.history_store.get_summary(user_id)
+        conversation = "\n".join(f"{turn['role']}: {turn['content']}" for turn in folded_turns)
         messages = [
-            {"role": "system", "content": self.prompts["base_prompt"]},
-            {"role": "user", "content": f"INFO USE IN YOUR ANSWER {user_info_formated}"}
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Previous summary: {previous_summary or '-'}\n\nConversation:\n{conversation}"}
         ]
-        messages.extend(self.user_histories[user_id])
 
-        response_text = _make_request(messages, temperature=temperature, model=self.prompts["model"])
+        try:
+            summary = await _make_request(self.chat_client, self.scheduler, messages, model=self.prompts["model"],
+                                          temperature=0.3, purpose="summary")
+        except OpenAIRequestError as e:
+            logger.warning(f"History summary failed for user {user_id}: {e}")
+            return
+
+        if await self.history_store.fold(user_id, summary.strip(), folded_turns):
+            logger.info(f"Folded {len(folded_turns)} turns into the summary for user {user_id}")
+
+    @staticmethod
+    def _tool_kwargs(catalog: WardrobeCatalog) -> dict:
+        if not catalog:
+            return {}
+        return {"tools": [OUTFIT_TOOL], "tool_choice": "auto", "parallel_tool_calls": False}
+
+    async def get_answer_ai(self, user_id: int, user_message: str, temperature: float = 1, user_info_formated: str = "",
+                            catalog: WardrobeCatalog = None, on_outfit=None, on_stored=None):
+        """
+        With a wardrobe catalog, the model can pick an outfit in the same request: the selected s3_keys and
+        the style description are passed to `on_outfit(outfit, style_description)`.
+        `on_stored()` is called when the message and the answer are about to be added to the history.
+        """
+        messages = await self._build_chat_messages(user_id, user_message, user_info_formated, catalog)
+
+        message = await _request_message(self.chat_client, self.scheduler, messages, temperature=temperature,
+                                         model=self.prompts["model"], **self._tool_kwargs(catalog))
+        response_text = message.content or ""
 
-        self.user_histories[user_id].append({"role": "assistant", "content": response_text})
+        outfit = None
+        for call in (message.tool_calls or []) if catalog else []:
+            outfit = outfit or _parse_outfit_call(catalog, call.function.name, call.function.arguments)
+        if outfit is not None and on_outfit is not None:
+            on_outfit(*outfit)
 
+        await self._store_turns(user_id, user_message, self._stored_answer(response_text, outfit), on_stored)
         return response_text
 
-    def vision_img(self, url: str):
+    async def stream_answer_ai(self, user_id: int, user_message: str, temperature: float = 1,
+                               user_info_formated: str = "", catalog: WardrobeCatalog = None, on_outfit=None,
+                               on_stored=None):
+        """Same as get_answer_ai, but yields the answer in chunks as the model produces them."""
+        messages = await self._build_chat_messages(user_id, user_message, user_info_formated, catalog)
+        outfit = None
+
+        def on_tool_call(name: str, arguments: str):
+            nonlocal outfit
+            if outfit is not None:
+                return
+            outfit = _parse_outfit_call(catalog, name, arguments)
+            if outfit is not None and on_outfit is not None:
+                on_outfit(*outfit)
+
+        chunks = []
+        async for chunk in _stream_request(self.chat_client, self.scheduler, messages, temperature=temperature,
+                                           model=self.prompts["model"], on_tool_call=on_tool_call,
+                                           **self._tool_kwargs(catalog)):
+            chunks.append(chunk)
+            yield chunk
+
+        await self._store_turns(user_id, user_message, self._stored_answer("".join(chunks), outfit), on_stored)
+
+    @staticmethod
+    def _stored_answer(answer: str, outfit) -> str:
+        # A tool call alone leaves no text; the history still has to show that an outfit was answered.
+        if answer.strip() or outfit is None:
+            return answer
+        return f"(Showed an outfit from the wardrobe: {outfit[1]})"
+
+    async def _store_turns(self, user_id: int, user_message: str, answer: str, on_stored=None):
+        if on_stored is not None:
+            on_stored()
+        await self.history_store.append(user_id, "user", user_message)
+        await self.history_store.append(user_id, "assistant", answer)
+        self._schedule_summary(user_id)
+
+    async def vision_img(self, url: str):
         messages = [
             {
                 "role": "user",
@@ -74,16 +325,17 @@ class OpenAIChat:
                     {"type": "text", "text": self.prompts["prompt_image_analysis"]},
                     {
                         "type": "image_url",
-                        "image_url": {"url": url},
+                        "image_url": {"url": url, "detail": self.vision_detail},
                     },
                 ],
             }
         ]
 
-        response_text = _make_request(messages=messages, temperature=1, model=self.prompts["model"])
+        response_text = await _make_request(self.chat_client, self.scheduler, messages=messages, temperature=1,
+                                            model=self.prompts["model"], purpose="vision")
         return response_text
 
-    def find_style(self, wardrobe_list_str: str, style_description: str):
+    async def find_style(self, wardrobe_list_str: str, style_description: str):
         prompt = f"""
         You are an AI personal stylist. The user has the following wardrobe items (each has a 'summary'):
 
@@ -108,10 +360,47 @@ class OpenAIChat:
             {"role": "system", "content": "You are an AI that outputs only valid JSON."},
             {"role": "user", "content": prompt}
         ]
-        response_text = _make_request(messages=messages, model=self.prompts["model"], temperature=1)
+        try:
+            response_text = await _make_request(self.chat_client, self.scheduler, messages=messages,
+                                                model=self.prompts["model"], temperature=1, purpose="style",
+                                                response_format=OUTFIT_RESPONSE_FORMAT)
+        except OpenAIRequestError as e:
+            logger.error(f"Outfit selection failed: {e}")
+            return []
 
         outfit = _parse_outfit_response(response_text)
 
-        pprint({"INFO": "OpenAI style result", "response": response_text, "outfit": outfit})
+        logger.info(f"OpenAI style result: {len(outfit)} items")
 
         return outfit
+
+    async def vision_imgs(self, urls: list) -> list:
+        """Analyzes several images in one request and returns one summary per image, in order."""
+        if len(urls) == 1:
+            return [await self.vision_img(url=urls[0])]
+
+        instructions = (
+            f"{self.prompts['prompt_image_analysis']}\n\n"
+            f"You are given {len(urls)} images. Analyze each image separately, in the order they are given.\n"
+            "Return ONLY a valid JSON object, with NO extra text, in this format:\n"
+            '{"summaries": ["<analysis of image 1>", "<analysis of image 2>"]}\n'
+            f"The list must contain exactly {len(urls)} strings."
+        )
+        content = [{"type": "text", "text": instructions}]
+        content.extend({"type": "image_url", "image_url": {"url": url, "detail": self.vision_detail}} for url in urls)
+
+        response_text = await _make_request(
+            self.chat_client,
+            self.scheduler,
+            messages=[{"role": "user", "content": content}],
+            temperature=1,
+            model=self.prompts["model"],
+            purpose="vision",
+            response_format={"type": "json_object"}
+        )
+
+        summaries = _parse_summaries_response(response_text)
+        if len(summaries) != len(urls):
+            logger.warning("Batched vision returned a wrong number of summaries, analyzing one by one.")
+            return list(await asyncio.gather(*(self.vision_img(url=url) for url in urls)))
+        return summaries
@@ -0,0 +1,48 @@
+from src.services.open_ai.token_counter import TokenCounter
+
+
+class PromptBuilder:
+    """
+    Assembles chat messages within a prompt token budget. Content that changes least goes first,
+    so consecutive requests share the longest possible prefix for provider-side prompt caching:
+    the base prompt, then the user's profile, then the wardrobe catalog, then the running summary,
+    then recent turns.
+    Turns that do not fit are left out of the request, newest turns are kept.
+    """
+
+    def __init__(self, token_counter: TokenCounter, budget_tokens: int = 3000):
+        self.token_counter = token_counter
+        self.budget_tokens = budget_tokens
+
+    def build(self, base_prompt: str, user_info: str, summary: str, history: list, catalog: str = "") -> tuple:
+        """Returns (messages, stats) with stats = {"prompt_tokens", "history_turns", "dropped_turns"}."""
+        messages = [{"role": "system", "content": base_prompt or ""}]
+        if user_info:
+            messages.append({"role": "system", "content": f"INFO USE IN YOUR ANSWER {user_info}"})
+        if catalog:
+            messages.append({"role": "system", "content": catalog})
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+
+        used = self.token_counter.count_messages(messages)
+        selected = []
+        for message in reversed(history):
+            cost = self.token_counter.count_message(message)
+            if used + cost > self.budget_tokens:
+                if not selected:
+                    # The current user message is always sent, cut down to the remaining budget.
+                    available = self.budget_tokens - used - self.token_counter.count_message(
+                        {"role": message["role"], "content": ""})
+                    content = self.token_counter.truncate(message["content"], available)
+                    selected.append({"role": message["role"], "content": content})
+                    used += self.token_counter.count_message(selected[-1])
+                break
+            selected.append(message)
+            used += cost
+
+        messages.extend(reversed(selected))
+        return messages, {
+            "prompt_tokens": used,
+            "history_turns": len(selected),
+            "dropped_turns": len(history) - len(selected),
+        }
@@ -0,0 +1,273 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+
+from src.services.metrics.metrics import REGISTRY
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STYLE = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_STYLE: "style", PRIORITY_BACKGROUND: "background"}
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "bot_openai_queue_wait_seconds", "Time OpenAI requests waited for admission.", ("priority",))
+
+
+@functools.lru_cache(maxsize=None)
+def _openai_errors() -> tuple:
+    """(retryable error types, status error type). openai is imported on first use, it is slow to import."""
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, InternalServerError, RateLimitError
+
+    return (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError), APIStatusError
+
+
+class OpenAIRequestError(Exception):
+    """Raised when an OpenAI request failed for good, after the scheduler's retries."""
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute's worth. The level may go negative."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.level = rate_per_minute
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available. Amounts above capacity only need a full bucket."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+
+def _retry_after_seconds(error: Exception):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class RequestScheduler:
+    """
+    Admits OpenAI requests in priority order under a concurrency cap and requests/tokens per minute
+    buckets, and retries transient failures with jittered exponential backoff. A retry-after from
+    the API pauses admission of every request, not only the one that got it.
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: float = 500,
+                 tokens_per_minute: float = 200_000, max_retries: int = 4, backoff_base: float = 0.5,
+                 backoff_max: float = 20.0):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._wakeup = None
+
+        self.waited = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_seconds = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.max_wait_seconds = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.retries = 0
+        self.failures = 0
+        self.tokens_used = 0
+
+    async def run(self, call, priority: int = PRIORITY_INTERACTIVE, estimated_tokens: int = 1000):
+        """Runs `await call()` inside an admission slot, retrying transient errors."""
+        retryable_errors, status_error = _openai_errors()
+        for attempt in range(self.max_retries + 1):
+            async with self.slot(priority, estimated_tokens) as usage:
+                try:
+                    response = await call()
+                    usage.record(getattr(response, "usage", None))
+                    return response
+                except retryable_errors as e:
+                    error = e
+                except status_error as e:
+                    self.failures += 1
+                    raise OpenAIRequestError(f"OpenAI request failed with status {e.status_code}") from e
+
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            await asyncio.sleep(self.backoff_delay(attempt, error))
+
+        self.failures += 1
+        raise OpenAIRequestError(f"OpenAI request failed after {self.max_retries + 1} attempts") from error
+
+    async def stream(self, open_stream, priority: int = PRIORITY_INTERACTIVE, estimated_tokens: int = 1000):
+        """
+        Yields the chunks of `await open_stream()`, holding the slot until the stream ends.
+        Transient errors are retried only while nothing has been yielded yet.
+        """
+        retryable_errors, status_error = _openai_errors()
+        for attempt in range(self.max_retries + 1):
+            started = False
+            async with self.slot(priority, estimated_tokens) as usage:
+                try:
+                    async for chunk in await open_stream():
+                        usage.record(getattr(chunk, "usage", None))
+                        started = True
+                        yield chunk
+                    return
+                except retryable_errors as e:
+                    if started:
+                        self.failures += 1
+                        raise OpenAIRequestError("OpenAI stream was interrupted") from e
+                    error = e
+                except status_error as e:
+                    self.failures += 1
+                    raise OpenAIRequestError(f"OpenAI request failed with status {e.status_code}") from e
+
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            await asyncio.sleep(self.backoff_delay(attempt, error))
+
+        self.failures += 1
+        raise OpenAIRequestError(f"OpenAI request failed after {self.max_retries + 1} attempts") from error
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential delay, never shorter than the server's retry-after."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            delay = max(delay, retry_after)
+        return delay
+
+    @asynccontextmanager
+    async def slot(self, priority: int, estimated_tokens: int):
+        """Holds one admission slot. Actual token usage recorded on the yielded object corrects the estimate."""
+        await self._acquire(priority, estimated_tokens)
+        usage = _Usage(estimated_tokens)
+        try:
+            yield usage
+        finally:
+            self._in_flight -= 1
+            if usage.total_tokens is not None:
+                self.tokens_used += usage.total_tokens
+                self.token_bucket.consume(usage.total_tokens - estimated_tokens)
+            self._dispatch()
+
+    async def _acquire(self, priority: int, estimated_tokens: int):
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), estimated_tokens, future))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._in_flight -= 1
+                self._dispatch()
+            raise
+
+        waited = time.monotonic() - enqueued_at
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        self.waited[name] = self.waited.get(name, 0) + 1
+        self.wait_seconds[name] = self.wait_seconds.get(name, 0.0) + waited
+        self.max_wait_seconds[name] = max(self.max_wait_seconds.get(name, 0.0), waited)
+        QUEUE_WAIT.observe(waited, priority=name)
+
+    def _dispatch(self):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+
+        while self._waiters and self._in_flight < self.max_concurrency:
+            _, _, estimated_tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            delay = max(self._paused_until - time.monotonic(),
+                        self.request_bucket.wait_time(1),
+                        self.token_bucket.wait_time(estimated_tokens))
+            if delay > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(estimated_tokens)
+            self._in_flight += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                queued[name] = queued.get(name, 0) + 1
+
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": queued,
+            "waited": dict(self.waited),
+            "avg_wait_seconds": {
+                name: self.wait_seconds[name] / count if count else 0.0 for name, count in self.waited.items()
+            },
+            "max_wait_seconds": dict(self.max_wait_seconds),
+            "retries": self.retries,
+            "failures": self.failures,
+            "tokens_used": self.tokens_used,
+        }
+
+
+class _Usage:
+    __slots__ = ("estimated_tokens", "total_tokens")
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.total_tokens = None
+
+    def record(self, usage):
+        if usage is not None and getattr(usage, "total_tokens", None) is not None:
+            self.total_tokens = usage.total_tokens
+
+
+def estimate_tokens(messages: list, max_output_tokens: int = 1000, image_tokens: int = 800) -> int:
+    """Rough prompt size: four characters per token, a flat cost per image, plus the expected answer."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                chars += len(part["text"])
+            else:
+                images += 1
+    return chars // 4 + images * image_tokens + max_output_tokens
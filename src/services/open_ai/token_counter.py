@@ -0,0 +1,66 @@
+import logging
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from src.utils.lazy import lazy_property
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Every chat message costs a few tokens for the role and separators, the reply is primed with 3 more.
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken's encoding for the model when it is available, otherwise with a
+    heuristic that slightly overestimates (non-Latin text splits into more tokens than words).
+    """
+
+    def __init__(self, model: str = "gpt-4o"):
+        self.model = model or "gpt-4o"
+
+    @lazy_property
+    def encoding(self):
+        # Loading the BPE ranks takes a while (and a download on a fresh host), so it happens on first use.
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.encoding_for_model(self.model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken encoding unavailable, counting tokens heuristically: {e}")
+            return None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return max(len(text) // 3, len(_WORD_RE.findall(text)))
+
+    def count_message(self, message: dict) -> int:
+        content = message["content"]
+        if not isinstance(content, str):
+            content = " ".join(part.get("text", "") for part in content)
+        return MESSAGE_OVERHEAD_TOKENS + self.count(content)
+
+    def count_messages(self, messages: list) -> int:
+        return sum(self.count_message(message) for message in messages) + REPLY_PRIMING_TOKENS
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keeps the end of `text` within max_tokens, since the latest words of a message matter most."""
+        if self.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[-max_tokens:])
+        return text[-max_tokens * 3:]
@@ -0,0 +1,48 @@
+import asyncio
+
+
+class AlbumBatcher:
+    """
+    Collects the photos of a Telegram album (one update per photo, sharing a media_group_id)
+    and hands them to `flush_callback(key, items)` once no new photo arrived for `window_seconds`.
+    """
+
+    def __init__(self, flush_callback, window_seconds: float = 1.0, max_items: int = 10):
+        self.flush_callback = flush_callback
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+    def add(self, key, item):
+        items = self._pending.setdefault(key, [])
+        items.append(item)
+
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+        if len(items) >= self.max_items:
+            self._flush(key)
+        else:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window_seconds, self._flush, key)
+
+    async def shutdown(self):
+        for key in list(self._pending):
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self, key):
+        self._timers.pop(key, None)
+        items = self._pending.pop(key, [])
+        if not items:
+            return
+
+        task = asyncio.ensure_future(self.flush_callback(key, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
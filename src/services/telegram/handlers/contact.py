@@ -1,9 +1,11 @@
-from pprint import pprint
+import logging
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton
 from telegram.ext import ContextTypes
 
 from src.core.messages import MESSAGES
 
+logger = logging.getLogger(__name__)
+
 
 async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.contact:
@@ -22,9 +24,9 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         telegram_service = context.bot_data["telegram_service"]
 
-        pprint({"INFO": f"User {user_id} sent contact {phone_number}. Checking DB..."})
+        logger.info(f"User {user_id} sent contact. Checking DB...")
 
-        existing_user = telegram_service.find_user_callback(user_id)
+        existing_user = await telegram_service.find_user_callback(user_id)
         if existing_user:
             if existing_user.get("survey_completed") is True:
                 await telegram_service.send_message(user_id, MESSAGES["already_registered_filled"])
@@ -33,7 +35,7 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await telegram_service.start_survey(user_id)
         else:
             if telegram_service.registration_callback:
-                pprint({"INFO": "New user -> registration callback"})
+                logger.info("New user -> registration callback")
                 await telegram_service.registration_callback(user_id, {
                     "phone_number": phone_number,
                     "first_name": first_name,
@@ -42,7 +44,7 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    pprint({"INFO": "/start command invoked"})
+    logger.info("/start command invoked")
 
     keyboard = [[KeyboardButton(MESSAGES["send_number"], request_contact=True)]]
     reply_markup = ReplyKeyboardMarkup(
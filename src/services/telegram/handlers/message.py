@@ -1,14 +1,16 @@
-from pprint import pprint
+import logging
 from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes
 
 from src.core.messages import MESSAGES
 
+logger = logging.getLogger(__name__)
+
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.chat_id
     user_message = update.message.text.strip()
-    pprint({"INFO": f"handle_message from user={user_id}", "message": user_message})
+    logger.info(f"handle_message from user={user_id}, length={len(user_message)}")
 
     if context.user_data.get("awaiting_phone"):
         if any(ch.isdigit() for ch in user_message):
@@ -22,7 +24,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             telegram_service = context.bot_data["telegram_service"]
 
-            existing_user = telegram_service.find_user_callback(user_id)
+            existing_user = await telegram_service.find_user_callback(user_id)
             if existing_user:
                 if existing_user.get("survey_completed") is True:
                     await telegram_service.send_message(user_id, MESSAGES["already_registered_filled"])
@@ -31,7 +33,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await telegram_service.start_survey(user_id)
             else:
                 if telegram_service.registration_callback:
-                    pprint({"INFO": "New user (web version phone) -> registration callback"})
+                    logger.info("New user (web version phone) -> registration callback")
                     await telegram_service.registration_callback(user_id, {
                         "phone_number": phone_number,
                         "first_name": first_name,
@@ -41,6 +43,6 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(MESSAGES["enter_phone_number"])
         return
 
+    # Answered once the user stops typing; the handler returns so the next message is not held back.
     telegram_service = context.bot_data["telegram_service"]
-    if telegram_service.message_callback:
-        await telegram_service.message_callback(user_id, user_message)
+    telegram_service.message_coalescer.add(user_id, user_message)
@@ -1,4 +1,4 @@
-from pprint import pprint
+import logging
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (ConversationHandler, ContextTypes)
 
@@ -6,9 +6,11 @@ from src.core.messages import MESSAGES
 from src.services.telegram.constants import SURVEY_STATES, ALLOWED_SIZES, ALLOWED_STYLES
 from src.utils.normalize_answer_bot import normalize_answer, normalize_input
 
+logger = logging.getLogger(__name__)
+
 
 async def start_survey(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    pprint({"INFO": "start_survey -> ask for SIZE."})
+    logger.info("start_survey -> ask for SIZE.")
     size_keyboard = [["XS", "S"], ["M", "L", "XL"]]
     reply_markup = ReplyKeyboardMarkup(size_keyboard, one_time_keyboard=True, resize_keyboard=True)
 
@@ -18,7 +20,7 @@ async def start_survey(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def size_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answer_raw = update.message.text
-    pprint({"INFO": f"size_handler -> user typed: {answer_raw}"})
+    logger.debug(f"size_handler -> user={update.message.from_user.id}")
 
     answer_norm = normalize_input(answer_raw)
     allowed_lower = [s.lower() for s in ALLOWED_SIZES]
@@ -40,7 +42,7 @@ async def size_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def style_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answer_raw = update.message.text
-    pprint({"INFO": f"style_handler -> user typed: {answer_raw}"})
+    logger.debug(f"style_handler -> user={update.message.from_user.id}")
 
     answer_norm = normalize_input(answer_raw)
     allowed_lower = [s.lower() for s in ALLOWED_STYLES]
@@ -59,7 +61,7 @@ async def style_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def colors_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answer = update.message.text.strip()
-    pprint({"INFO": f"colors_handler -> user typed: {answer}"})
+    logger.debug(f"colors_handler -> user={update.message.from_user.id}")
 
     context.user_data["colors"] = answer
     await update.message.reply_text(MESSAGES["favorite_brands"])
@@ -68,7 +70,7 @@ async def colors_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def brands_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answer = update.message.text.strip()
-    pprint({"INFO": f"brands_handler -> user typed: {answer}"})
+    logger.debug(f"brands_handler -> user={update.message.from_user.id}")
 
     context.user_data["brands"] = answer
     await update.message.reply_text(MESSAGES["height_question"])
@@ -77,7 +79,7 @@ async def brands_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def height_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answer = update.message.text.strip()
-    pprint({"INFO": f"height_handler -> user typed: {answer}"})
+    logger.debug(f"height_handler -> user={update.message.from_user.id}")
 
     context.user_data["height"] = answer
     await update.message.reply_text(MESSAGES["weight_question"])
@@ -129,7 +131,7 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if answer in ["підтверджую", "confirm"]:
         user_data = context.user_data
         telegram_service = context.bot_data["telegram_service"]
-        telegram_service.save_survey(user_id, user_data)
+        await telegram_service.save_survey(user_id, user_data)
 
         await update.message.reply_text(
             MESSAGES["survey_saved"],
@@ -1,6 +1,6 @@
+import asyncio
 import io
-import base64
-from pprint import pprint
+import logging
 
 from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import (ConversationHandler, ContextTypes)
@@ -8,6 +8,10 @@ from src.core.messages import MESSAGES
 from src.utils.normalize_answer_bot import normalize_answer
 from src.services.telegram.constants import SURVEY_STATES
 
+logger = logging.getLogger(__name__)
+
+WARDROBE_PHOTOS_JOB = "wardrobe_photos"
+
 
 async def ask_upload_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answer_raw = update.message.text.strip()
@@ -26,40 +30,97 @@ async def handle_wardrobe_photo(update: Update, context: ContextTypes.DEFAULT_TY
 
     photo = update.message.photo[-1]
     user_id = update.message.from_user.id
-    pprint({"INFO": f"handle_wardrobe_photo -> user_id={user_id}"})
+    media_group_id = update.message.media_group_id
+    logger.info(f"handle_wardrobe_photo -> user_id={user_id}, media_group_id={media_group_id}")
 
-    telegram_file = await context.bot.get_file(photo.file_id)
+    if media_group_id:
+        telegram_service.album_batcher.add((user_id, media_group_id), (photo.file_id, photo.file_unique_id))
+    else:
+        await submit_wardrobe_photos(telegram_service, user_id, [(photo.file_id, photo.file_unique_id)])
 
-    file_bytes = io.BytesIO()
-    await telegram_file.download_to_memory(out=file_bytes)
+    return SURVEY_STATES["PHOTO_UPLOAD"]
 
-    image_content = file_bytes.getvalue()
 
-    base64_image = base64.b64encode(image_content).decode("utf-8")
-    base64_string = f"data:image/jpeg;base64,{base64_image}"
+async def submit_wardrobe_photos(telegram_service, user_id: int, photos: list):
+    """
+    Queues photos ((file_id, file_unique_id) pairs) for analysis and acknowledges them right away.
+    A photo whose file_unique_id was queued before is not queued again. Without a job queue the
+    photos are processed before returning.
+    """
+    file_ids = [file_id for file_id, _ in photos]
+    if telegram_service.job_queue is None:
+        await process_wardrobe_photos(telegram_service, user_id, file_ids)
+        return
 
     try:
-        result = telegram_service.upload_user_photo_callback(
-            user_id=user_id,
-            image_bytes=image_content,
+        queued = await telegram_service.job_queue.enqueue(
+            WARDROBE_PHOTOS_JOB,
+            {"user_id": user_id, "file_ids": file_ids},
+            keys=[file_unique_id for _, file_unique_id in photos]
         )
+    except Exception as e:
+        logger.exception(f"Queueing wardrobe photos failed for user {user_id}: {e}")
+        await telegram_service.send_message(user_id, MESSAGES["error_photo_upload"])
+        return
 
-        await update.message.reply_text(MESSAGES["photo_processing"])
+    if queued:
+        await telegram_service.send_message(user_id, MESSAGES["photo_queued"])
+    else:
+        logger.info(f"Wardrobe photos of user {user_id} are already queued")
 
-        summary = telegram_service.vision_wardrobe_photo_callback(base64_string)
 
-        telegram_service.update_wardrobe_callback(
-            user_id=user_id,
-            s3_key=result["s3_key"],
-            summary=summary
-        )
-        await update.message.reply_text(MESSAGES["photo_saved_no_url"])
+async def run_wardrobe_photos_job(telegram_service, payload: dict):
+    """Job handler. Raises when the photos could not be saved, so the job is retried."""
+    # The job is only done once the items are written, not when they are queued for the write-behind buffer.
+    await _ingest_photos(telegram_service, payload["user_id"], payload["file_ids"], processing_notice=False,
+                         wait_saved=True)
+
+
+async def notify_wardrobe_photos_failed(telegram_service, payload: dict):
+    await telegram_service.send_message(payload["user_id"], MESSAGES["error_photo_upload"])
 
+
+async def process_wardrobe_photos(telegram_service, user_id: int, file_ids: list):
+    try:
+        await _ingest_photos(telegram_service, user_id, file_ids, processing_notice=True)
     except Exception as e:
-        pprint(f"{e}")
-        await update.message.reply_text(MESSAGES["error_photo_upload"])
+        logger.exception(f"Wardrobe photo upload failed for user {user_id}: {e}")
+        await telegram_service.send_message(user_id, MESSAGES["error_photo_upload"])
 
-    return SURVEY_STATES["PHOTO_UPLOAD"]
+
+async def _ingest_photos(telegram_service, user_id: int, file_ids: list, processing_notice: bool,
+                         wait_saved: bool = False):
+    images = await asyncio.gather(*(_download_photo(telegram_service, file_id) for file_id in file_ids))
+
+    if processing_notice:
+        await telegram_service.send_message(user_id, MESSAGES["photo_processing"])
+
+    result = await telegram_service.ingest_wardrobe_photos_callback(
+        user_id=user_id,
+        photos=[{"image_bytes": image, "file_id": file_id} for image, file_id in zip(images, file_ids)],
+        wait_saved=wait_saved
+    )
+
+    if result["saved"] == 0:
+        message = MESSAGES["photo_duplicate"]
+    elif len(file_ids) == 1:
+        message = MESSAGES["photo_saved_no_url"]
+    else:
+        message = MESSAGES["photos_saved"].format(saved=result["saved"])
+
+    try:
+        await telegram_service.send_message(user_id, message)
+    except Exception as e:
+        # The photos are saved; running the job again would only report them as duplicates.
+        logger.warning(f"Completion notice not sent to user {user_id}: {e!r}")
+
+
+async def _download_photo(telegram_service, file_id: str) -> bytes:
+    telegram_file = await telegram_service.app.bot.get_file(file_id)
+
+    file_bytes = io.BytesIO()
+    await telegram_file.download_to_memory(out=file_bytes)
+    return file_bytes.getvalue()
 
 
 async def done_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
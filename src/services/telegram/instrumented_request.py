@@ -0,0 +1,27 @@
+import time
+
+from telegram.request import HTTPXRequest
+
+from src.services.metrics.metrics import DEPENDENCY_ERRORS, DEPENDENCY_IN_FLIGHT, DEPENDENCY_LATENCY
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records latency, errors and in-flight count of every Bot API method."""
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        labels = {"dependency": "telegram", "operation": url.rsplit("/", 1)[-1]}
+        DEPENDENCY_IN_FLIGHT.inc(**labels)
+        started_at = time.perf_counter()
+        status = 0
+        try:
+            status, payload = await super().do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+                connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+            return status, payload
+        finally:
+            DEPENDENCY_LATENCY.observe(time.perf_counter() - started_at, **labels)
+            DEPENDENCY_IN_FLIGHT.dec(**labels)
+            if not 200 <= status < 300:
+                DEPENDENCY_ERRORS.inc(**labels)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def mark_answer_stored():
+    """
+    Called by a coalescer callback once its messages and answer are in the history. A newer message
+    then no longer cancels the callback or merges its messages; it gets an answer of its own.
+    """
+    task = asyncio.current_task()
+    if task is not None:
+        task.answer_stored = True
+
+
+class MessageCoalescer:
+    """
+    Merges the text messages a user sends in a burst and hands them to `callback(user_id, text)` once
+    no new message arrived for `window_seconds`, or `max_delay_seconds` after the first one.
+    A message that arrives while the callback for the same user still runs cancels it and is merged
+    with the messages that callback was answering, so each user has at most one answer in progress,
+    unless the callback already stored its answer (see `mark_answer_stored`).
+    """
+
+    def __init__(self, callback, window_seconds: float = 1.0, max_delay_seconds: float = 4.0):
+        self.callback = callback
+        self.window_seconds = window_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._pending = {}
+        self._first_at = {}
+        self._timers = {}
+        self._running = {}
+        self._finishing = set()
+
+        self.dispatched = 0
+        self.merged = 0
+        self.superseded = 0
+
+    def add(self, user_id: int, text: str):
+        texts = self._pending.setdefault(user_id, [])
+        running = self._running.get(user_id)
+        if running is not None and not running.done() and not running.answer_stored:
+            running.cancel()
+            self.superseded += 1
+            # The cancelled answer was never stored, so its messages are answered together with the new one.
+            texts[:0] = running.texts
+        if texts:
+            self.merged += 1
+        texts.append(text)
+
+        loop = asyncio.get_running_loop()
+        first_at = self._first_at.setdefault(user_id, loop.time())
+        timer = self._timers.pop(user_id, None)
+        if timer:
+            timer.cancel()
+        delay = min(self.window_seconds, max(0.0, first_at + self.max_delay_seconds - loop.time()))
+        self._timers[user_id] = loop.call_later(delay, self._dispatch, user_id)
+
+    def _dispatch(self, user_id: int):
+        self._timers.pop(user_id, None)
+        self._first_at.pop(user_id, None)
+        texts = self._pending.pop(user_id, [])
+        if not texts:
+            return
+
+        previous = self._running.get(user_id)
+        if previous is not None and not previous.done():
+            # Its answer is stored and only being delivered; shutdown still waits for it.
+            self._finishing.add(previous)
+            previous.add_done_callback(self._finishing.discard)
+
+        task = asyncio.ensure_future(self._run(user_id, "\n".join(texts)))
+        task.texts = texts
+        task.answer_stored = False
+        self._running[user_id] = task
+        task.add_done_callback(lambda done: self._finished(user_id, done))
+        self.dispatched += 1
+
+    async def _run(self, user_id: int, text: str):
+        try:
+            await self.callback(user_id, text)
+        except asyncio.CancelledError:
+            logger.info(f"Answer for user={user_id} superseded by a newer message")
+            raise
+        except Exception as e:
+            logger.error(f"Message callback failed for user={user_id}: {e!r}")
+
+    def _finished(self, user_id: int, task: asyncio.Task):
+        if self._running.get(user_id) is task:
+            del self._running[user_id]
+
+    async def shutdown(self):
+        """Answers the messages still waiting for their window to close and waits for running answers."""
+        for user_id in list(self._pending):
+            timer = self._timers.pop(user_id, None)
+            if timer:
+                timer.cancel()
+            self._dispatch(user_id)
+        if self._running or self._finishing:
+            await asyncio.gather(*self._running.values(), *self._finishing, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending_users": len(self._pending),
+            "running": len(self._running),
+            "dispatched": self.dispatched,
+            "merged": self.merged,
+            "superseded": self.superseded,
+        }
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src.services.metrics.metrics import track
+from src.services.transport.transport import Transport
+from src.utils.lazy import lazy_property
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+CONVERSATION = "conversation"
+
+
+class StateStore(ABC):
+    """
+    Durable (kind, key) -> JSON value rows behind `CoalescingPersistence`. Methods are blocking
+    and are called from a worker thread.
+    """
+
+    @abstractmethod
+    def load(self) -> list:
+        """Returns every stored row as (kind, key, value) tuples."""
+
+    @abstractmethod
+    def write(self, changes: dict):
+        """Applies {(kind, key): value} in one batch. A value of None deletes the row."""
+
+    def close(self):
+        pass
+
+
+class SQLiteStateStore(StateStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS bot_state (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            );
+        """)
+
+    def load(self) -> list:
+        with self._lock:
+            return self._connection.execute("SELECT kind, key, value FROM bot_state").fetchall()
+
+    def write(self, changes: dict):
+        now = time.time()
+        upserts = [(kind, key, value, now) for (kind, key), value in changes.items() if value is not None]
+        deletes = [(kind, key) for (kind, key), value in changes.items() if value is None]
+
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                connection.executemany(
+                    "INSERT INTO bot_state (kind, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(kind, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                    upserts
+                )
+                connection.executemany("DELETE FROM bot_state WHERE kind = ? AND key = ?", deletes)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class DynamoDBStateStore(StateStore):
+    """
+    Rows in a DynamoDB table with the string partition key `state_key`, so that every replica
+    (and a replacement instance after a deploy) starts from the same conversations.
+    """
+
+    def __init__(self, table_name: str, transport: Transport):
+        self.table_name = table_name
+        self.transport = transport
+
+    @lazy_property
+    def table(self):
+        return self.transport.aws_resource("dynamodb").Table(self.table_name)
+
+    def load(self) -> list:
+        rows = []
+        kwargs = {}
+        while True:
+            response = self.table.scan(**kwargs)
+            rows.extend((item["kind"], item["key"], item["value"]) for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return rows
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def write(self, changes: dict):
+        with self.table.batch_writer() as batch:
+            for (kind, key), value in changes.items():
+                state_key = f"{kind}#{key}"
+                if value is None:
+                    batch.delete_item(Key={"state_key": state_key})
+                else:
+                    batch.put_item(Item={"state_key": state_key, "kind": kind, "key": key, "value": value,
+                                         "updated_at": int(time.time())})
+
+
+def _conversation_key(name: str, key: tuple) -> str:
+    return f"{name}:{json.dumps(list(key))}"
+
+
+class CoalescingPersistence(BasePersistence):
+    """
+    PTB persistence for `user_data` and ConversationHandler states. PTB hands over changed entries
+    every `update_interval` seconds, outside the update handlers; they are buffered here and
+    written as one batch, and an entry changed again before its batch was written is written once.
+    Failed batches stay buffered and are retried with the next batch and on shutdown.
+    """
+
+    def __init__(self, store: StateStore, update_interval: float = 5.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self._rows = None
+        self._pending = {}
+        self._write_lock = asyncio.Lock()
+        self._write_task = None
+        self.batches = 0
+        self.rows_written = 0
+        self.failed_batches = 0
+
+    async def _load(self) -> dict:
+        if self._rows is None:
+            rows = {USER_DATA: {}, CONVERSATION: {}}
+            with track("persistence", "load"):
+                for kind, key, value in await asyncio.to_thread(self.store.load):
+                    rows.setdefault(kind, {})[key] = value
+            self._rows = rows
+            logger.info(f"Restored {len(rows[USER_DATA])} user data entries and "
+                        f"{len(rows[CONVERSATION])} conversations from persistence")
+        return self._rows
+
+    async def get_user_data(self) -> dict:
+        rows = await self._load()
+        return {int(user_id): json.loads(value) for user_id, value in rows[USER_DATA].items()}
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await self._load()
+        prefix = f"{name}:"
+        return {
+            tuple(json.loads(key[len(prefix):])): json.loads(value)
+            for key, value in rows[CONVERSATION].items() if key.startswith(prefix)
+        }
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_user_data(self, user_id: int, data: dict):
+        value = json.dumps(data, ensure_ascii=False, default=str) if data else None
+        self._stage(USER_DATA, str(user_id), value)
+
+    async def drop_user_data(self, user_id: int):
+        self._stage(USER_DATA, str(user_id), None)
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        value = json.dumps(new_state) if new_state is not None else None
+        self._stage(CONVERSATION, _conversation_key(name, key), value)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def flush(self):
+        if self._write_task is not None:
+            await self._write_task
+        await self._write_pending()
+        if self._pending:
+            logger.error(f"Persistence shut down with {len(self._pending)} unwritten entries")
+        await asyncio.to_thread(self.store.close)
+
+    def _stage(self, kind: str, key: str, value):
+        self._pending[(kind, key)] = value
+        # PTB gathers all update_* calls of one run, so the batch is written once they have been staged.
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self):
+        async with self._write_lock:
+            # Entries staged while a batch is being written go into the next one.
+            while self._pending:
+                changes, self._pending = self._pending, {}
+                try:
+                    with track("persistence", "write"):
+                        await asyncio.to_thread(self.store.write, changes)
+                except Exception as e:
+                    self.failed_batches += 1
+                    logger.error(f"Failed to write {len(changes)} persistence entries: {e!r}")
+                    for entry, value in changes.items():
+                        self._pending.setdefault(entry, value)
+                    return
+
+                self.batches += 1
+                self.rows_written += len(changes)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "failed_batches": self.failed_batches,
+        }
+
+
+def create_persistence(backend: str, update_interval: float, sqlite_path: str, dynamo_table_name: str = None,
+                       transport: Transport = None):
+    if backend == "sqlite":
+        return CoalescingPersistence(SQLiteStateStore(sqlite_path), update_interval=update_interval)
+    if backend == "dynamodb":
+        return CoalescingPersistence(DynamoDBStateStore(dynamo_table_name, transport),
+                                     update_interval=update_interval)
+    return None
@@ -1,4 +1,10 @@
-from pprint import pprint
+import asyncio
+import logging
+import signal
+import time
+from telegram import Update
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -9,49 +15,165 @@ from telegram.ext import (
 from telegram.constants import ChatAction
 
 from src.core.messages import MESSAGES
+from src.services.telegram.album_batcher import AlbumBatcher
 from src.services.telegram.constants import SURVEY_STATES
 from src.services.telegram.handlers.contact import start, handle_contact
 from src.services.telegram.handlers.message import handle_message
 from src.services.telegram.handlers.survey import start_survey, size_handler, style_handler, colors_handler, \
     brands_handler, height_handler, weight_handler, confirm_handler, gender_handler
-from src.services.telegram.handlers.upload import ask_upload_handler, handle_wardrobe_photo, done_photo
+from src.services.telegram.handlers.upload import ask_upload_handler, handle_wardrobe_photo, done_photo, \
+    submit_wardrobe_photos, run_wardrobe_photos_job, notify_wardrobe_photos_failed, WARDROBE_PHOTOS_JOB
+from src.services.telegram.instrumented_request import InstrumentedRequest
+from src.services.telegram.message_coalescer import MessageCoalescer
+from src.services.telegram.update_processor import PerUserUpdateProcessor
+from src.services.telegram.webhook_server import WebhookServer
+
+logger = logging.getLogger(__name__)
 
 
 class TelegramService:
     def __init__(self, telegram_bot_token: str, registration_callback=None, message_callback=None,
-                 save_survey_callback=None, find_user_callback=None, upload_user_photo_callback=None,
-                 generate_tempo_url_callback=None, vision_wardrobe_photo_callback=None, update_wardrobe_callback=None):
+                 save_survey_callback=None, find_user_callback=None, generate_tempo_url_callback=None,
+                 ingest_wardrobe_photos_callback=None, concurrent_updates: int = 256,
+                 album_window_seconds: float = 1.0, stream_edit_interval: float = 1.0, webhook_settings: dict = None,
+                 api_base_url: str = None, file_base_url: str = None, persistence=None,
+                 message_window_seconds: float = 1.0, message_max_delay_seconds: float = 4.0, job_queue=None):
         self.telegram_bot_token = telegram_bot_token
         self.registration_callback = registration_callback
         self.message_callback = message_callback
         self.save_survey_callback = save_survey_callback
         self.find_user_callback = find_user_callback
-        self.upload_user_photo_callback = upload_user_photo_callback
         self.generate_tempo_url_callback = generate_tempo_url_callback
-        self.vision_wardrobe_photo_callback = vision_wardrobe_photo_callback
-        self.update_wardrobe_callback = update_wardrobe_callback
+        self.ingest_wardrobe_photos_callback = ingest_wardrobe_photos_callback
+        self.album_batcher = AlbumBatcher(self._flush_album, window_seconds=album_window_seconds)
+        self.message_coalescer = MessageCoalescer(self._answer_messages, window_seconds=message_window_seconds,
+                                                  max_delay_seconds=message_max_delay_seconds)
+        self.stream_edit_interval = stream_edit_interval
+        # Wardrobe photos are analyzed by the queue's workers; without a queue, inside the update handler.
+        self.job_queue = job_queue
+        if job_queue is not None:
+            job_queue.register(WARDROBE_PHOTOS_JOB, lambda payload: run_wardrobe_photos_job(self, payload),
+                               on_failure=lambda payload: notify_wardrobe_photos_failed(self, payload))
+        self.webhook_settings = webhook_settings or {"mode": "polling"}
+        # Async callables run once the application is initialized and after it stops.
+        self.startup_callbacks = []
+        self.shutdown_callbacks = []
 
-        self.app = ApplicationBuilder().token(self.telegram_bot_token).build()
+        builder = (
+            ApplicationBuilder()
+            .token(self.telegram_bot_token)
+            .concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+            .request(InstrumentedRequest(connection_pool_size=256))
+            .post_init(self._post_init)
+            .post_stop(self._post_stop)
+        )
+        # Self-hosted Bot API servers and the benchmark's fake server are reached through these.
+        if api_base_url:
+            builder = builder.base_url(api_base_url)
+        if file_base_url:
+            builder = builder.base_file_url(file_base_url)
+        # Survey states and user_data survive restarts and are shared by replicas using the same store.
+        if persistence is not None:
+            builder = builder.persistence(persistence)
+        self.app = builder.build()
         self.app.bot_data["telegram_service"] = self
 
     async def handle_send_typing(self, user_id: int):
         await self.app.bot.send_chat_action(chat_id=user_id, action=ChatAction.TYPING)
 
     async def send_message(self, user_id: int, message: str):
-        pprint({"INFO": f"Sending message to user={user_id}"})
+        logger.info(f"Sending message to user={user_id}")
         await self.app.bot.send_message(chat_id=user_id, text=message)
 
+    async def send_streaming_message(self, user_id: int, chunks) -> str:
+        """
+        Sends a placeholder and edits it with the text received so far, at most once per
+        `stream_edit_interval` seconds and never sooner than Telegram's RetryAfter allows.
+        Returns the full text.
+        """
+        placeholder = await self.app.bot.send_message(chat_id=user_id, text=MESSAGES["answer_placeholder"])
+
+        text, shown = "", ""
+        next_edit_at = time.monotonic() + self.stream_edit_interval
+        try:
+            async for chunk in chunks:
+                text += chunk
+                visible = text.strip()[:MessageLimit.MAX_TEXT_LENGTH]
+                if not visible or visible == shown or time.monotonic() < next_edit_at:
+                    continue
+
+                shown = visible
+                retry_after = await self._edit_message(placeholder, visible)
+                next_edit_at = time.monotonic() + max(self.stream_edit_interval, retry_after)
+        except asyncio.CancelledError:
+            # The answer was superseded by a newer message; the partial text would only confuse.
+            await asyncio.shield(self._delete_message(placeholder))
+            raise
+
+        text = text.strip()
+        if not text:
+            await placeholder.delete()
+            return text
+
+        parts = [text[i:i + MessageLimit.MAX_TEXT_LENGTH] for i in range(0, len(text), MessageLimit.MAX_TEXT_LENGTH)]
+        if parts[0] != shown:
+            retry_after = await self._edit_message(placeholder, parts[0])
+            if retry_after:
+                await asyncio.sleep(retry_after)
+                await self._edit_message(placeholder, parts[0])
+        for part in parts[1:]:
+            await self.send_message(user_id, part)
+        return text
+
+    @staticmethod
+    async def _edit_message(message, text: str) -> float:
+        """Edits a message and returns how many seconds Telegram asked to wait (0 on success)."""
+        try:
+            await message.edit_text(text)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        return 0
+
+    @staticmethod
+    async def _delete_message(message):
+        try:
+            await message.delete()
+        except BadRequest as e:
+            logger.warning(f"Could not delete message {message.message_id}: {e}")
+
     async def send_media_group(self, user_id, media_group):
-        await self.app.bot.send_media_group(chat_id=user_id, media=media_group)
+        return await self.app.bot.send_media_group(chat_id=user_id, media=media_group)
+
+    async def _flush_album(self, key, photos: list):
+        user_id, _ = key
+        await submit_wardrobe_photos(self, user_id, photos)
+
+    async def _answer_messages(self, user_id: int, text: str):
+        if self.message_callback:
+            await self.message_callback(user_id, text)
+
+    async def _post_init(self, app):
+        for callback in self.startup_callbacks:
+            await callback()
+
+    async def _post_stop(self, app):
+        await self.album_batcher.shutdown()
+        await self.message_coalescer.shutdown()
+        for callback in self.shutdown_callbacks:
+            await callback()
 
     async def start_survey(self, user_id: int):
-        pprint({"INFO": f"Prompt user={user_id} to start survey."})
+        logger.info(f"Prompt user={user_id} to start survey.")
         await self.send_message(user_id, MESSAGES["start_survey_prompt"])
 
-    def save_survey(self, user_id, survey_data):
-        pprint({"INFO": f"save_survey called for user={user_id}"})
+    async def save_survey(self, user_id, survey_data):
+        logger.info(f"save_survey called for user={user_id}")
         if self.save_survey_callback:
-            self.save_survey_callback(user_id, survey_data)
+            await self.save_survey_callback(user_id, survey_data)
 
     def _register_handlers(self):
         survey_handler = ConversationHandler(
@@ -71,7 +193,9 @@ class TelegramService:
                     CommandHandler("done_photo", done_photo)
                 ],
             },
-            fallbacks=[]
+            fallbacks=[],
+            name="survey",
+            persistent=self.app.persistence is not None
         )
         self.app.add_handler(CommandHandler("start", start))
         self.app.add_handler(survey_handler)
@@ -79,6 +203,49 @@ class TelegramService:
         self.app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
     def run(self):
-        pprint({"INFO": "TelegramService run_polling() started."})
         self._register_handlers()
-        self.app.run_polling()
+        if self.webhook_settings["mode"] == "webhook":
+            logger.info("TelegramService webhook mode started.")
+            asyncio.run(self._run_webhook())
+        else:
+            logger.info("TelegramService run_polling() started.")
+            self.app.run_polling()
+
+    async def _run_webhook(self):
+        settings = self.webhook_settings
+        server = WebhookServer(
+            self.app,
+            host=settings["listen_host"],
+            port=settings["port"],
+            path=settings["path"],
+            secret_token=settings["secret_token"],
+            queue_size=settings["queue_size"],
+            workers=settings["workers"]
+        )
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop_event.set)
+
+        async with self.app:
+            if self.app.post_init:
+                await self.app.post_init(self.app)
+            await self.app.start()
+            await server.start()
+            await self.app.bot.set_webhook(
+                url=settings["url"].rstrip("/") + settings["path"],
+                secret_token=settings["secret_token"],
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=settings["max_connections"]
+            )
+            try:
+                await stop_event.wait()
+            finally:
+                logger.info("TelegramService webhook mode stopping.")
+                await server.stop()
+                await self.app.stop()
+                if self.app.post_stop:
+                    await self.app.post_stop(self.app)
+        if self.app.post_shutdown:
+            await self.app.post_shutdown(self.app)
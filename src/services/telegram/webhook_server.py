@@ -0,0 +1,81 @@
+import asyncio
+import hmac
+import json
+import logging
+
+from telegram import Update
+from telegram.ext import Application
+
+from src.services.http_server.http_server import HttpServer, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    """
+    Receives Telegram webhook calls into a bounded queue that a fixed pool of workers drains.
+    When the queue is full the call is answered with 503, so Telegram retries it later
+    instead of the process buffering without limit.
+    """
+
+    def __init__(self, app: Application, host: str, port: int, path: str, secret_token: str = None,
+                 queue_size: int = 1000, workers: int = 64):
+        self.app = app
+        self.path = path
+        self.secret_token = secret_token
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.http_server = HttpServer(host, port)
+        self._worker_tasks = []
+
+        self.http_server.add_route("POST", path, self._handle_update)
+        self.http_server.add_route("GET", "/healthz", self._handle_health)
+        self.http_server.add_route("GET", "/readyz", self._handle_ready)
+
+    async def start(self):
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        await self.http_server.start()
+
+    async def stop(self):
+        await self.http_server.stop()
+        await self.queue.join()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def _handle_update(self, request) -> HttpResponse:
+        if self.secret_token:
+            received = request.headers.get("x-telegram-bot-api-secret-token", "")
+            if not hmac.compare_digest(received, self.secret_token):
+                return HttpResponse(401)
+
+        try:
+            update = Update.de_json(json.loads(request.body), self.app.bot)
+        except (ValueError, TypeError):
+            return HttpResponse(400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logger.warning(f"Webhook queue is full ({self.queue.maxsize}), asking Telegram to retry.")
+            return HttpResponse(503)
+        return HttpResponse(200)
+
+    async def _handle_health(self, request) -> HttpResponse:
+        return HttpResponse(200, b"ok")
+
+    async def _handle_ready(self, request) -> HttpResponse:
+        if self.app.running and not self.queue.full():
+            return HttpResponse(200, f"ready queue={self.queue.qsize()}".encode())
+        return HttpResponse(503, f"not ready queue={self.queue.qsize()}".encode())
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.app.update_processor.process_update(update, self.app.process_update(update))
+            except Exception as e:
+                logger.error(f"Failed to process webhook update: {str(e)}")
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.lazy import is_loaded, lazy_property
+
+logger = logging.getLogger(__name__)
+
+
+class Transport:
+    """
+    Owns the connections of the process: one boto3 session whose clients share a botocore Config
+    (pool size, timeouts, retry mode), one pooled httpx client for OpenAI, and the thread pool that
+    runs blocking boto3 calls. The pool is sized so it does not cap the AWS connection pools.
+    Clients are built on first use.
+    """
+
+    def __init__(self, region_name: str = None, aws_access_key_id: str = None, aws_secret_access_key: str = None,
+                 aws_max_pool_connections: int = 50, aws_connect_timeout: float = 2.0, aws_read_timeout: float = 10.0,
+                 aws_retry_mode: str = "adaptive", aws_max_attempts: int = 4, aws_tcp_keepalive: bool = True,
+                 openai_max_connections: int = 100, openai_max_keepalive_connections: int = 20,
+                 openai_keepalive_expiry: float = 30.0, openai_connect_timeout: float = 5.0,
+                 openai_read_timeout: float = 60.0, executor_workers: int = 64):
+        self.region_name = region_name
+        self.aws_access_key_id = aws_access_key_id
+        self.aws_secret_access_key = aws_secret_access_key
+        self.aws_max_pool_connections = aws_max_pool_connections
+        self.aws_connect_timeout = aws_connect_timeout
+        self.aws_read_timeout = aws_read_timeout
+        self.aws_retry_mode = aws_retry_mode
+        self.aws_max_attempts = aws_max_attempts
+        self.aws_tcp_keepalive = aws_tcp_keepalive
+        self.openai_max_connections = openai_max_connections
+        self.openai_max_keepalive_connections = openai_max_keepalive_connections
+        self.openai_keepalive_expiry = openai_keepalive_expiry
+        self.openai_connect_timeout = openai_connect_timeout
+        self.openai_read_timeout = openai_read_timeout
+        self.executor_workers = executor_workers
+
+        # boto3 sessions must not create clients from several threads at once.
+        self._aws_lock = threading.RLock()
+        self._aws_clients = {}
+        self._aws_in_flight = {}
+        self._aws_max_in_flight = {}
+        self._counter_lock = threading.Lock()
+
+    @lazy_property
+    def aws_session(self):
+        import boto3
+
+        return boto3.session.Session(
+            region_name=self.region_name,
+            aws_access_key_id=self.aws_access_key_id,
+            aws_secret_access_key=self.aws_secret_access_key
+        )
+
+    @lazy_property
+    def aws_config(self):
+        from botocore.config import Config
+
+        return Config(
+            max_pool_connections=self.aws_max_pool_connections,
+            connect_timeout=self.aws_connect_timeout,
+            read_timeout=self.aws_read_timeout,
+            retries={"mode": self.aws_retry_mode, "max_attempts": self.aws_max_attempts},
+            tcp_keepalive=self.aws_tcp_keepalive
+        )
+
+    def aws_client(self, service_name: str):
+        """The shared low-level client of an AWS service."""
+        return self._aws(("client", service_name))
+
+    def aws_resource(self, service_name: str):
+        """The shared boto3 resource of an AWS service."""
+        return self._aws(("resource", service_name))
+
+    def _aws(self, key: tuple):
+        client = self._aws_clients.get(key)
+        if client is not None:
+            return client
+
+        with self._aws_lock:
+            if key not in self._aws_clients:
+                kind, service_name = key
+                factory = self.aws_session.client if kind == "client" else self.aws_session.resource
+                client = factory(service_name, config=self.aws_config)
+                events = client.meta.events if kind == "client" else client.meta.client.meta.events
+                events.register("before-send", lambda **_: self._count_aws(service_name, 1))
+                events.register("response-received", lambda **_: self._count_aws(service_name, -1))
+                self._aws_clients[key] = client
+                logger.info(f"Created AWS {kind} for {service_name}")
+            return self._aws_clients[key]
+
+    def _count_aws(self, service_name: str, delta: int):
+        with self._counter_lock:
+            in_flight = self._aws_in_flight.get(service_name, 0) + delta
+            self._aws_in_flight[service_name] = in_flight
+            self._aws_max_in_flight[service_name] = max(self._aws_max_in_flight.get(service_name, 0), in_flight)
+
+    @lazy_property
+    def openai_http_client(self):
+        """The httpx client every OpenAI SDK client is built on."""
+        import httpx
+
+        return httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(limits=httpx.Limits(
+                max_connections=self.openai_max_connections,
+                max_keepalive_connections=self.openai_max_keepalive_connections,
+                keepalive_expiry=self.openai_keepalive_expiry
+            )),
+            timeout=httpx.Timeout(self.openai_read_timeout, connect=self.openai_connect_timeout)
+        )
+
+    async def start(self):
+        """Replaces the loop's default executor, which asyncio.to_thread uses, with one of executor_workers."""
+        executor = ThreadPoolExecutor(max_workers=self.executor_workers, thread_name_prefix="blocking-io")
+        asyncio.get_running_loop().set_default_executor(executor)
+
+    async def close(self):
+        if is_loaded(self, "openai_http_client"):
+            await self.openai_http_client.aclose()
+
+    def _openai_pool(self) -> dict:
+        if not is_loaded(self, "openai_http_client"):
+            return {"connections": 0, "idle_connections": 0, "queued_requests": 0}
+        # httpx does not expose its connection pool; the attributes are checked so a change only empties the stats.
+        pool = getattr(getattr(self.openai_http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        requests = list(getattr(pool, "_requests", []))
+        return {
+            "connections": len(connections),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+            "queued_requests": sum(1 for request in requests if request.is_queued()),
+        }
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            aws_in_flight = dict(self._aws_in_flight)
+            aws_max_in_flight = dict(self._aws_max_in_flight)
+        openai_pool = self._openai_pool()
+        return {
+            "aws_in_flight": aws_in_flight,
+            "aws_max_in_flight": aws_max_in_flight,
+            "aws_pool_utilization": {
+                service_name: in_flight / self.aws_max_pool_connections
+                for service_name, in_flight in aws_in_flight.items()
+            },
+            "openai_connections": openai_pool["connections"],
+            "openai_idle_connections": openai_pool["idle_connections"],
+            "openai_queued_requests": openai_pool["queued_requests"],
+            "openai_pool_utilization":
+                (openai_pool["connections"] - openai_pool["idle_connections"]) / self.openai_max_connections,
+        }
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+
+from src.utils.normalize_answer_bot import normalize_answer
+
+
+def normalize_style_description(style_description: str) -> str:
+    """Lowercases, drops punctuation and word order, so rephrasings of the same request share a key."""
+    return " ".join(sorted(set(normalize_answer(style_description).split())))
+
+
+class _OutfitEntry:
+    __slots__ = ("alternatives", "next_index", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.alternatives = []
+        self.next_index = 0
+        self.expires_at = expires_at
+
+
+class OutfitCache:
+    """
+    Bounded LRU cache from (user, wardrobe version, normalized style description) to outfit s3_keys.
+    An entry collects up to `alternatives` different outfits; until it is full, lookups miss so a new
+    alternative gets generated, then repeat requests rotate through the stored ones.
+    """
+
+    def __init__(self, max_entries: int = 5000, alternatives: int = 1, ttl_seconds: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.alternatives = alternatives
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple, _OutfitEntry] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(user_id, wardrobe_version: int, style_description: str) -> tuple:
+        return str(user_id), int(wardrobe_version), normalize_style_description(style_description)
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            del self._entries[key]
+            entry = None
+
+        if entry is None or len(entry.alternatives) < self.alternatives:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        outfit = entry.alternatives[entry.next_index % len(entry.alternatives)]
+        entry.next_index += 1
+        return list(outfit)
+
+    def put(self, key: tuple, outfit: list):
+        if not outfit:
+            return
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _OutfitEntry(time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+
+        outfit = tuple(outfit)
+        if outfit not in entry.alternatives and len(entry.alternatives) < self.alternatives:
+            entry.alternatives.append(outfit)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "llm_calls_avoided": self.hits,
+            "entries": len(self._entries),
+        }
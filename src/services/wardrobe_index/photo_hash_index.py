@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+from src.utils.image_hashing import hamming_distance
+
+
+class _UserHashes:
+    __slots__ = ("exact", "perceptual")
+
+    def __init__(self):
+        self.exact = {}
+        self.perceptual = []
+
+
+class PhotoHashIndex:
+    """
+    Per-user index from photo hashes to the wardrobe entry that already holds the photo.
+    Exact matches use the SHA-256 of the bytes; near-duplicates use the perceptual hash.
+    """
+
+    def __init__(self, max_phash_distance: int = 6, max_users: int = 1000):
+        self.max_phash_distance = max_phash_distance
+        self.max_users = max_users
+        self._users: OrderedDict[str, _UserHashes] = OrderedDict()
+
+    def is_loaded(self, user_id) -> bool:
+        return str(user_id) in self._users
+
+    def load(self, user_id, wardrobe: list):
+        hashes = _UserHashes()
+        for item in wardrobe:
+            self._add(hashes, item["s3_key"], item["summary"], item.get("content_hash"), item.get("phash"))
+
+        user_id = str(user_id)
+        self._users[user_id] = hashes
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def add(self, user_id, s3_key: str, summary: str, content_hash: str, phash: str = None):
+        hashes = self._users.get(str(user_id))
+        if hashes is not None:
+            self._add(hashes, s3_key, summary, content_hash, phash)
+
+    def find(self, user_id, content_hash: str, phash: str = None):
+        """Returns the matching {"s3_key", "summary"} entry, or None."""
+        hashes = self._users.get(str(user_id))
+        if hashes is None:
+            return None
+
+        match = hashes.exact.get(content_hash)
+        if match is None and phash and self.max_phash_distance >= 0:
+            match = next((entry for stored_phash, entry in hashes.perceptual
+                          if hamming_distance(stored_phash, phash) <= self.max_phash_distance), None)
+        return match
+
+    @staticmethod
+    def _add(hashes: _UserHashes, s3_key: str, summary: str, content_hash: str, phash: str):
+        entry = {"s3_key": s3_key, "summary": summary}
+        if content_hash:
+            hashes.exact[content_hash] = entry
+        if phash:
+            hashes.perceptual.append((phash, entry))
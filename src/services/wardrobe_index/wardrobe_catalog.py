@@ -0,0 +1,41 @@
+from src.services.wardrobe_index.wardrobe_index import detect_category
+
+CATALOG_HEADER = "WARDROBE CATALOG (id|category|item):"
+
+
+class WardrobeCatalog:
+    """
+    A compact listing of a user's wardrobe for the chat prompt, one "id|category|summary" line per item.
+    The model refers to items by their short numeric ids, which are mapped back to s3_keys.
+    Items are ordered by s3_key, so the text stays the same between requests while the wardrobe does not change.
+    """
+
+    def __init__(self, wardrobe: list, summary_chars: int = 60):
+        self.s3_keys = []
+        self.categories = []
+        lines = [CATALOG_HEADER]
+        for item in sorted(wardrobe, key=lambda item: item["s3_key"]):
+            summary = " ".join(str(item.get("summary", "")).split())
+            category = item.get("category") or detect_category(summary)
+            if len(summary) > summary_chars:
+                summary = summary[:summary_chars - 1].rstrip() + "…"
+            self.s3_keys.append(item["s3_key"])
+            self.categories.append(category)
+            lines.append(f"{len(self.s3_keys)}|{category}|{summary}")
+        self.text = "\n".join(lines)
+
+    def __len__(self):
+        return len(self.s3_keys)
+
+    def resolve(self, item_ids: list) -> list:
+        """Maps item ids to s3_keys, skipping unknown ids and keeping the first item of each category."""
+        outfit, categories = [], set()
+        for item_id in item_ids:
+            if not isinstance(item_id, int) or not 1 <= item_id <= len(self.s3_keys):
+                continue
+            category = self.categories[item_id - 1]
+            if category in categories:
+                continue
+            categories.add(category)
+            outfit.append(self.s3_keys[item_id - 1])
+        return outfit
@@ -0,0 +1,159 @@
+import re
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from src.services.open_ai.embeddings import EmbeddingProvider
+from src.services.open_ai.request_scheduler import PRIORITY_BACKGROUND, PRIORITY_STYLE
+
+if TYPE_CHECKING:
+    import numpy as np
+
+CATEGORY_KEYWORDS = {
+    "outerwear": ["jacket", "coat", "blazer", "parka", "trench", "cardigan", "vest",
+                  "куртк", "пальт", "піджак", "жакет", "тренч", "кардиган", "жилет", "пуховик"],
+    "dress": ["dress", "jumpsuit", "overall", "сукн", "плаття", "комбінезон"],
+    "top": ["shirt", "t-shirt", "tee", "blouse", "sweater", "hoodie", "sweatshirt", "top", "polo", "jumper",
+            "футболк", "сорочк", "блуз", "светр", "худі", "світшот", "топ", "поло", "лонгслів", "водолазк"],
+    "bottom": ["pants", "trousers", "jeans", "shorts", "skirt", "chinos", "leggings",
+               "штани", "брюк", "джинс", "шорти", "спідниц", "легінс"],
+    "shoes": ["shoes", "sneakers", "boots", "loafers", "sandals", "heels", "trainers",
+              "взуття", "кросівк", "черевик", "туфл", "кеди", "чобот", "сандал", "лофер"],
+    "accessory": ["bag", "belt", "scarf", "hat", "cap", "glasses", "watch", "tie",
+                  "сумк", "ремін", "шарф", "капелюх", "кепк", "окуляр", "годинник", "краватк"],
+}
+DEFAULT_CATEGORY = "other"
+
+_CATEGORY_PATTERNS = {
+    category: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")")
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+
+def detect_category(summary: str) -> str:
+    """Picks the category whose keyword starts a word earliest in the summary."""
+    text = summary.lower()
+    best_category, best_position = DEFAULT_CATEGORY, len(text) + 1
+    for category, pattern in _CATEGORY_PATTERNS.items():
+        match = pattern.search(text)
+        if match and match.start() < best_position:
+            best_category, best_position = category, match.start()
+    return best_category
+
+
+def vector_from_bytes(value, dimensions: int):
+    if value is None:
+        return None
+    import numpy as np
+
+    vector = np.frombuffer(bytes(value), dtype=np.float32)
+    return vector if vector.shape[0] == dimensions else None
+
+
+class _UserIndex:
+    __slots__ = ("vectors", "count", "s3_keys", "summaries", "categories")
+
+    def __init__(self, dimensions: int, capacity: int):
+        import numpy as np
+
+        self.vectors = np.zeros((max(capacity, 8), dimensions), dtype=np.float32)
+        self.count = 0
+        self.s3_keys = []
+        self.summaries = []
+        self.categories = []
+
+    def add(self, s3_key: str, summary: str, category: str, vector: "np.ndarray"):
+        if self.count == self.vectors.shape[0]:
+            import numpy as np
+
+            grown = np.zeros((self.vectors.shape[0] * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:self.count] = self.vectors
+            self.vectors = grown
+        self.vectors[self.count] = vector
+        self.count += 1
+        self.s3_keys.append(s3_key)
+        self.summaries.append(summary)
+        self.categories.append(category)
+
+
+class WardrobeIndex:
+    """
+    Per-user cosine index over wardrobe summaries. Vectors are normalized, so cosine similarity is
+    a single matrix-vector product. The index keeps the most recently used `max_users` wardrobes.
+    """
+
+    def __init__(self, embedding_provider: EmbeddingProvider, max_users: int = 1000):
+        self.embedding_provider = embedding_provider
+        self.max_users = max_users
+        self._users: OrderedDict[str, _UserIndex] = OrderedDict()
+
+    def size(self, user_id) -> int:
+        index = self._users.get(str(user_id))
+        return index.count if index else -1
+
+    async def embed_one(self, text: str) -> "np.ndarray":
+        """Embeds a style query; a user is waiting for the outfit."""
+        return (await self.embedding_provider.embed([text], priority=PRIORITY_STYLE))[0]
+
+    async def embed_many(self, texts: list) -> "np.ndarray":
+        """Embeds new wardrobe items in the background."""
+        return await self.embedding_provider.embed(texts, priority=PRIORITY_BACKGROUND)
+
+    async def load(self, user_id, wardrobe: list) -> dict:
+        """
+        Builds a user's index from wardrobe items, embedding only the items stored without a vector.
+        It is loaded while an outfit is picked, so those embeddings run at style priority.
+        Returns the new vectors as {s3_key: vector}, for the caller to store with the items.
+        """
+        dimensions = self.embedding_provider.dimensions
+        vectors = [vector_from_bytes(item.get("embedding"), dimensions) for item in wardrobe]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        embedded = {}
+        if missing:
+            new_vectors = await self.embedding_provider.embed([wardrobe[i]["summary"] for i in missing],
+                                                              priority=PRIORITY_STYLE)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+                embedded[wardrobe[i]["s3_key"]] = vector
+
+        index = _UserIndex(dimensions, len(wardrobe))
+        for item, vector in zip(wardrobe, vectors):
+            index.add(item["s3_key"], item["summary"], item.get("category") or detect_category(item["summary"]),
+                      vector)
+
+        user_id = str(user_id)
+        self._users[user_id] = index
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return embedded
+
+    def add(self, user_id, s3_key: str, summary: str, category: str, vector: "np.ndarray"):
+        """Appends an item to a loaded index. Unloaded users pick the item up on their next load."""
+        index = self._users.get(str(user_id))
+        if index is not None:
+            index.add(s3_key, summary, category, vector)
+
+    def top_k_per_category(self, user_id, query: "np.ndarray", k: int) -> list:
+        """Returns (s3_key, summary, category) of the k best matches in every category."""
+        import numpy as np
+
+        user_id = str(user_id)
+        index = self._users.get(user_id)
+        if index is None or index.count == 0:
+            return []
+        self._users.move_to_end(user_id)
+
+        scores = index.vectors[:index.count] @ query
+        by_category = {}
+        for position in np.argsort(-scores):
+            category = index.categories[position]
+            selected = by_category.setdefault(category, [])
+            if len(selected) < k:
+                selected.append(position)
+
+        return [
+            (index.s3_keys[position], index.summaries[position], category)
+            for category, positions in by_category.items()
+            for position in positions
+        ]
@@ -0,0 +1,4 @@
+from src.tools.benchmark.runner import main
+
+if __name__ == "__main__":
+    main()
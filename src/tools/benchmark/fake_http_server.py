@@ -0,0 +1,66 @@
+"""
+HttpServer with the extras the fake Telegram and OpenAI servers need: prefix routes for the Bot API's
+per-method paths and chunked responses for OpenAI's server-sent events. The bot's own HttpServer
+serves fixed routes and bodies only.
+"""
+import asyncio
+import logging
+
+from src.services.http_server.http_server import _REASONS, HttpRequest, HttpResponse, HttpServer
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingResponse(HttpResponse):
+    """A chunked response whose body is produced by `chunks`, an async iterable of bytes."""
+
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks, status: int = 200, content_type: str = "text/event-stream"):
+        super().__init__(status, b"", content_type)
+        self.chunks = chunks
+
+
+class FakeHttpServer(HttpServer):
+    """A route path ending in "/*" matches every path under that prefix."""
+
+    def __init__(self, host: str, port: int, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self._prefix_routes = []
+
+    def add_route(self, method: str, path: str, handler):
+        if path.endswith("/*"):
+            self._prefix_routes.append((method.upper(), path[:-1], handler))
+        else:
+            super().add_route(method, path, handler)
+
+    async def _dispatch(self, request: HttpRequest) -> HttpResponse:
+        if (request.method, request.path) not in self._routes:
+            handler = next((handler for method, prefix, handler in self._prefix_routes
+                            if method == request.method and request.path.startswith(prefix)), None)
+            if handler is not None:
+                try:
+                    return await handler(request)
+                except Exception as e:
+                    logger.error(f"HTTP handler {request.method} {request.path} failed: {str(e)}")
+                    return HttpResponse(500)
+        return await super()._dispatch(request)
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, response: HttpResponse, keep_alive: bool):
+        if not isinstance(response, StreamingResponse):
+            await HttpServer._write_response(writer, response, keep_alive)
+            return
+
+        writer.write((
+            f"HTTP/1.1 {response.status} {_REASONS.get(response.status, '')}\r\n"
+            f"Content-Type: {response.content_type}\r\n"
+            f"Transfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1"))
+        async for chunk in response.chunks:
+            if chunk:
+                writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
@@ -0,0 +1,322 @@
+"""
+Offline benchmark of the bot's hot paths against local stand-ins for Telegram, OpenAI, S3 and DynamoDB.
+
+    python -m src.tools.benchmark [--concurrency 1,8,32] [--wardrobe-sizes 10,100,500] [--ops 100]
+
+Scenarios, each at every concurrency level (one simulated user per concurrent worker):
+  chat    ServiceMediator.process_message with a streamed answer
+  style   ServiceMediator.find_style including send_style_photo, at every wardrobe size
+  outfit  process_message asking for an outfit, until the photos are sent; compare --style-mode runs
+  ingest  process_wardrobe_photos: download from Telegram, normalize, upload, vision, wardrobe write
+
+Results (ops/sec and p50/p95/p99 latency) are printed and written as JSON for comparing runs.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.core.config import getConfig
+from src.core.logger import setup_logging
+from src.tools.benchmark.fake_services import (SUMMARIES, FakeDynamoTable, FakeOpenAIServer, FakeS3Client,
+                                               FakeTelegramServer)
+
+logger = logging.getLogger(__name__)
+
+BOT_TOKEN = "123456:BENCHMARK"
+FIRST_USER_ID = 100_000
+
+
+def _percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.array(latencies), [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4)}
+
+
+async def _measure(operation, total_ops: int, concurrency: int) -> dict:
+    """Runs `await operation(worker, index)` total_ops times on `concurrency` workers."""
+    latencies, errors = [], 0
+    next_index = iter(range(total_ops))
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        for index in next_index:
+            started_at = time.perf_counter()
+            try:
+                await operation(worker_id, index)
+                latencies.append(time.perf_counter() - started_at)
+            except Exception as e:
+                errors += 1
+                logger.warning(f"Benchmark operation failed: {e!r}")
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "ops": total_ops,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "ops_per_second": round(len(latencies) / elapsed, 3) if elapsed else None,
+        **_percentiles(latencies),
+    }
+
+
+def _random_jpeg(seed: int, size: tuple = (800, 600)) -> bytes:
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (size[1] // 40, size[0] // 40, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize(size, Image.BILINEAR)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Benchmark:
+    def __init__(self, options: argparse.Namespace):
+        self.options = options
+        self.telegram = FakeTelegramServer(BOT_TOKEN, latency=options.telegram_latency)
+        self.openai = FakeOpenAIServer(latency=options.openai_latency, tokens_per_second=options.openai_token_rate,
+                                       answer_tokens=options.answer_tokens,
+                                       style_request_ratio=options.style_request_ratio)
+        self.users_table = FakeDynamoTable(("user_id",), latency=options.dynamo_latency)
+        self.wardrobe_table = FakeDynamoTable(("user_id", "s3_key"), latency=options.dynamo_latency)
+        self.s3_client = FakeS3Client(latency=options.s3_latency)
+        self.mediator = None
+        self._next_user_id = FIRST_USER_ID
+
+    def _config(self) -> dict:
+        config = getConfig()
+        config.update({
+            "telegram_bot_token": BOT_TOKEN,
+            "open_ai_api_key": "sk-benchmark",
+            "openai_base_url": self.openai.base_url,
+            "telegram_api_base_url": self.telegram.api_base_url,
+            "telegram_file_base_url": self.telegram.file_base_url,
+            "aws_access_key_id": "benchmark",
+            "aws_secret_access_key": "benchmark",
+            "region_name": "us-east-1",
+            "dynamo_table_name": "benchmark-users",
+            "dynamo_wardrobe_table_name": "benchmark-wardrobe",
+            "s3_name": "benchmark-bucket",
+            "history_backend": "memory",
+            "persistence_backend": "none",
+            "job_queue": {**config["job_queue"], "backend": "none"},
+            "embedding_provider": self.options.embedding_provider,
+            "style_mode": self.options.style_mode,
+            "vision_image_source": self.options.vision_image_source,
+            "metrics": {"host": "127.0.0.1", "port": 0},
+        })
+        return config
+
+    async def setup(self):
+        os.environ.setdefault("MODEL", "gpt-4o")
+        os.environ.setdefault("BASE_PROMPT", "You are a personal stylist.")
+        os.environ.setdefault("PROMPT_IMAGE_ANALYSIS", "Describe the clothing item.")
+        await self.telegram.start()
+        await self.openai.start()
+
+        from src.core.service_mediator import ServiceMediator
+
+        self.mediator = ServiceMediator(self._config())
+        self.mediator.dynamo_db.table = self.users_table
+        self.mediator.dynamo_db.wardrobe_table = self.wardrobe_table
+        self.mediator.s3_storage.s3_client = self.s3_client
+        await self.mediator.transport.start()
+        await self.mediator.telegram_service.app.initialize()
+
+    async def teardown(self):
+        # Outfits of streamed answers are still being sent in the background.
+        await asyncio.gather(*self.mediator._background_tasks, return_exceptions=True)
+        await self.mediator.telegram_service.app.shutdown()
+        await self.mediator.dynamo_db.close()
+        await self.mediator.transport.close()
+        await self.openai.stop()
+        await self.telegram.stop()
+
+    def _create_users(self, count: int, wardrobe_size: int = 0) -> list:
+        user_ids = []
+        for _ in range(count):
+            user_id = self._next_user_id
+            self._next_user_id += 1
+            user_ids.append(user_id)
+            self.users_table.items[(str(user_id),)] = {
+                "user_id": str(user_id), "phone": "380000000000", "first_name": "Bench", "last_name": "User",
+                "survey_completed": True, "style": "casual", "colors": "blue, black", "brands": "any",
+                "gender": "female", "height": "170", "weight": "60",
+            }
+            for index in range(wardrobe_size):
+                s3_key = f"user_{user_id}/photo_{index}.jpg"
+                self.wardrobe_table.items[(str(user_id), s3_key)] = {
+                    "user_id": str(user_id), "s3_key": s3_key, "summary": SUMMARIES[index % len(SUMMARIES)],
+                    "file_id": f"seed-{user_id}-{index}",
+                }
+        return user_ids
+
+    async def run_chat(self, concurrency: int) -> dict:
+        users = self._create_users(concurrency)
+
+        async def operation(worker: int, index: int):
+            await self.mediator.process_message(users[worker], f"What should I wear today? #{index}")
+
+        return await _measure(operation, self.options.ops, concurrency)
+
+    async def run_style(self, concurrency: int, wardrobe_size: int) -> dict:
+        users = self._create_users(concurrency, wardrobe_size)
+        # Warm-up: loads each user's wardrobe and index, like the first request after a deploy.
+        await asyncio.gather(*(self.mediator.find_style(user_id, "warm-up") for user_id in users))
+
+        async def operation(worker: int, index: int):
+            # A distinct description per request, so the outfit cache does not answer it.
+            await self.mediator.find_style(users[worker], f"smart casual office look {index}")
+
+        return await _measure(operation, self.options.ops, concurrency)
+
+    async def run_outfit(self, concurrency: int, wardrobe_size: int) -> dict:
+        """
+        A chat message asking for an outfit, measured until the photos are sent. The answer is not streamed,
+        because a streamed answer hands the photos to a background task. In single style mode every other
+        message asks for "just the outfit", which the fake model answers with a tool call and no text.
+        """
+        users = self._create_users(concurrency, wardrobe_size)
+
+        async def operation(worker: int, index: int):
+            message = (f"Just the outfit for the office #{index}, please" if index % 2
+                       else f"Put together an outfit for the office #{index}")
+            await self.mediator.process_message(users[worker], message)
+
+        self.mediator.stream_answers = False
+        try:
+            return await _measure(operation, self.options.ops, concurrency)
+        finally:
+            self.mediator.stream_answers = True
+
+    async def run_ingest(self, concurrency: int) -> dict:
+        from src.services.telegram.handlers.upload import process_wardrobe_photos
+
+        users = self._create_users(concurrency)
+        file_ids = []
+        for index in range(self.options.ops):
+            file_id = f"upload-{concurrency}-{index}"
+            self.telegram.add_file(file_id, _random_jpeg(seed=concurrency * 100_000 + index))
+            file_ids.append(file_id)
+
+        async def operation(worker: int, index: int):
+            await process_wardrobe_photos(self.mediator.telegram_service, users[worker], [file_ids[index]])
+
+        return await _measure(operation, self.options.ops, concurrency)
+
+    async def run(self) -> list:
+        results = []
+        for concurrency in self.options.concurrency:
+            if "chat" in self.options.scenarios:
+                results.append({"scenario": "chat", "concurrency": concurrency, **await self.run_chat(concurrency)})
+            if "style" in self.options.scenarios:
+                for wardrobe_size in self.options.wardrobe_sizes:
+                    results.append({"scenario": "style", "concurrency": concurrency, "wardrobe_size": wardrobe_size,
+                                    **await self.run_style(concurrency, wardrobe_size)})
+            if "outfit" in self.options.scenarios:
+                for wardrobe_size in self.options.wardrobe_sizes:
+                    results.append({"scenario": "outfit", "concurrency": concurrency, "wardrobe_size": wardrobe_size,
+                                    **await self.run_outfit(concurrency, wardrobe_size)})
+            if "ingest" in self.options.scenarios:
+                results.append({"scenario": "ingest", "concurrency": concurrency,
+                                **await self.run_ingest(concurrency)})
+            logger.info(f"Benchmark finished concurrency {concurrency}")
+        return results
+
+    def calls(self) -> dict:
+        return {
+            "telegram": dict(self.telegram.calls),
+            "openai": dict(self.openai.calls),
+            "openai_tokens": dict(self.openai.tokens),
+            "dynamodb": {"users": dict(self.users_table.calls), "wardrobe": dict(self.wardrobe_table.calls)},
+            "s3": dict(self.s3_client.calls),
+        }
+
+
+async def run_benchmark(options: argparse.Namespace) -> dict:
+    benchmark = Benchmark(options)
+    await benchmark.setup()
+    try:
+        results = await benchmark.run()
+    finally:
+        await benchmark.teardown()
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "options": {name: value for name, value in vars(options).items() if name != "output"},
+        "results": results,
+        "calls": benchmark.calls(),
+    }
+
+
+def _print_table(results: list):
+    print(f"{'scenario':<8} {'conc':>5} {'wardrobe':>8} {'ops/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>6}")
+    for row in results:
+        print(f"{row['scenario']:<8} {row['concurrency']:>5} {row.get('wardrobe_size', '-'):>8} "
+              f"{row['ops_per_second']:>9} {row['p50']!s:>8} {row['p95']!s:>8} {row['p99']!s:>8} {row['errors']:>6}")
+
+
+def _int_list(value: str) -> list:
+    return [int(part) for part in value.split(",") if part]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="chat,style,ingest", type=lambda value: value.split(","),
+                        help="comma separated scenarios to run (chat, style, outfit, ingest)")
+    parser.add_argument("--concurrency", default="1,8,32", type=_int_list, help="concurrency levels")
+    parser.add_argument("--wardrobe-sizes", default="10,100,500", type=_int_list,
+                        help="wardrobe sizes for the style and outfit scenarios")
+    parser.add_argument("--ops", default=100, type=int, help="operations per scenario and level")
+    parser.add_argument("--openai-latency", default=0.3, type=float, help="seconds before the first token")
+    parser.add_argument("--openai-token-rate", default=80.0, type=float, help="generated tokens per second")
+    parser.add_argument("--answer-tokens", default=120, type=int, help="tokens in a chat answer")
+    parser.add_argument("--style-request-ratio", default=0.0, type=float,
+                        help="share of chat answers that trigger the outfit search")
+    parser.add_argument("--telegram-latency", default=0.03, type=float, help="seconds per Bot API call")
+    parser.add_argument("--dynamo-latency", default=0.005, type=float, help="seconds per DynamoDB call")
+    parser.add_argument("--s3-latency", default=0.02, type=float, help="seconds per S3 call")
+    parser.add_argument("--style-mode", default="two_step", choices=("two_step", "single"),
+                        help="how outfit requests are answered, see STYLE_MODE")
+    parser.add_argument("--vision-image-source", default="inline", choices=("inline", "presigned"),
+                        help="how photos reach the vision model, see VISION_IMAGE_SOURCE")
+    parser.add_argument("--embedding-provider", default="openai", choices=("openai", "local"))
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", default=None,
+                        help="result file, benchmark-results/benchmark-<timestamp>.json by default")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    setup_logging(options.log_level, "text")
+
+    report = asyncio.run(run_benchmark(options))
+    _print_table(report["results"])
+
+    output = options.output or os.path.join(
+        "benchmark-results", f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
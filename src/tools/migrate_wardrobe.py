@@ -0,0 +1,115 @@
+"""
+Moves wardrobe lists stored inside user items into the per-item wardrobe table.
+
+    python -m src.tools.migrate_wardrobe [--create-table] [--dry-run]
+
+Each user's `wardrobe` list is copied into (user_id, s3_key) records with BatchWriteItem, then the list
+attribute is removed from the user item only if it did not change during the copy. Re-running is safe:
+records are keyed by s3_key, so already copied items are overwritten with the same data.
+
+Run it before deploying a version that reads the wardrobe table (DYNAMO_WARDROBE_TABLE_NAME): the bot
+refuses to start without the table name, and items still in user records are not read any more.
+"""
+import argparse
+import logging
+
+import boto3
+from botocore.exceptions import ClientError
+
+from src.core.config import getConfig
+from src.core.logger import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_wardrobe_table(dynamodb, table_name: str):
+    try:
+        table = dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {"AttributeName": "user_id", "KeyType": "HASH"},
+                {"AttributeName": "s3_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "user_id", "AttributeType": "S"},
+                {"AttributeName": "s3_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        table.wait_until_exists()
+        logger.info(f"Created wardrobe table {table_name}")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ResourceInUseException":
+            raise
+        logger.info(f"Wardrobe table {table_name} already exists")
+
+
+def iter_users_with_wardrobe(users_table):
+    scan_kwargs = {
+        "ProjectionExpression": "user_id, wardrobe",
+        "FilterExpression": "attribute_exists(wardrobe)",
+    }
+    while True:
+        response = users_table.scan(**scan_kwargs)
+        yield from response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def migrate_user(users_table, wardrobe_table, user: dict, dry_run: bool) -> int:
+    user_id = user["user_id"]
+    wardrobe = user.get("wardrobe", [])
+    if dry_run:
+        return len(wardrobe)
+
+    with wardrobe_table.batch_writer(overwrite_by_pkeys=["user_id", "s3_key"]) as batch:
+        for item in wardrobe:
+            batch.put_item(Item={"user_id": user_id, **item})
+
+    try:
+        users_table.update_item(
+            Key={"user_id": user_id},
+            UpdateExpression="REMOVE wardrobe",
+            ConditionExpression="size(wardrobe) = :count",
+            ExpressionAttributeValues={":count": len(wardrobe)},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        logger.warning(f"Wardrobe of user {user_id} changed during migration, run the tool again.")
+    return len(wardrobe)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--create-table", action="store_true", help="create the wardrobe table if it is missing")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be migrated")
+    args = parser.parse_args()
+
+    config = getConfig()
+    if not config["dynamo_wardrobe_table_name"]:
+        parser.error("DYNAMO_WARDROBE_TABLE_NAME is not set")
+    setup_logging(config["log_level"], config["log_format"])
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name=config["region_name"],
+        aws_access_key_id=config["aws_access_key_id"],
+        aws_secret_access_key=config["aws_secret_access_key"]
+    )
+    if args.create_table:
+        create_wardrobe_table(dynamodb, config["dynamo_wardrobe_table_name"])
+
+    users_table = dynamodb.Table(config["dynamo_table_name"])
+    wardrobe_table = dynamodb.Table(config["dynamo_wardrobe_table_name"])
+
+    users, items = 0, 0
+    for user in iter_users_with_wardrobe(users_table):
+        items += migrate_user(users_table, wardrobe_table, user, args.dry_run)
+        users += 1
+
+    logger.info(f"Wardrobe migration {'dry run ' if args.dry_run else ''}finished: users={users}, items={items}")
+
+
+if __name__ == "__main__":
+    main()
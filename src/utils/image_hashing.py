@@ -0,0 +1,36 @@
+import hashlib
+import io
+
+
+def content_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes: bytes, hash_size: int = 8):
+    """
+    Difference hash (dHash) of the image as a hex string, or None when Pillow is not installed
+    or the bytes cannot be decoded. Re-encoded or resized copies of a photo get close hashes.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.draft("L", (hash_size * 8, hash_size * 8))
+            pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(first_hash: str, second_hash: str) -> int:
+    return (int(first_hash, 16) ^ int(second_hash, 16)).bit_count()
@@ -0,0 +1,36 @@
+import io
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+def _encode_jpeg(image: "Image.Image", max_edge: int, quality: int) -> bytes:
+    from PIL import Image
+
+    if max(image.size) > max_edge:
+        image = image.copy()
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def prepare_photo(image_bytes: bytes, original_max_edge: int = 2560, analysis_max_edge: int = 1024,
+                  thumbnail_max_edge: int = 512, quality: int = 90) -> dict:
+    """
+    Decodes a photo once and returns EXIF-free JPEG variants:
+    "original" for storage, "analysis" for the vision model and "thumbnail" for outfit replies.
+    Orientation from EXIF is applied to the pixels before the metadata is dropped.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    return {
+        "original": _encode_jpeg(image, original_max_edge, quality),
+        "analysis": _encode_jpeg(image, analysis_max_edge, quality),
+        "thumbnail": _encode_jpeg(image, thumbnail_max_edge, quality),
+    }
@@ -0,0 +1,36 @@
+import threading
+
+
+class lazy_property:
+    """
+    Like functools.cached_property, but builds the value once even when worker threads and the event
+    loop ask for it at the same time (boto3 sessions must not create clients concurrently).
+    Assigning the attribute replaces the value, e.g. with a stand-in in the benchmark.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self._lock = threading.RLock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.func(instance)
+            return instance.__dict__[self.name]
+
+
+def is_loaded(instance, name: str) -> bool:
+    """Whether a lazy_property of `instance` has been built (or assigned) already."""
+    return name in instance.__dict__
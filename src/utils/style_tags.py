@@ -0,0 +1,84 @@
+STYLE_REQUEST_TAG = "<style_request>"
+METADATA_OPEN_TAG = "<metadata>"
+METADATA_CLOSE_TAG = "</metadata>"
+DEFAULT_STYLE_DESCRIPTION = "base style"
+
+_OPENING_TAGS = (STYLE_REQUEST_TAG, METADATA_OPEN_TAG)
+
+
+def _held_back_length(text: str) -> int:
+    """Length of the longest suffix of `text` that may be the start of an opening tag."""
+    for length in range(min(len(text), max(map(len, _OPENING_TAGS)) - 1), 0, -1):
+        suffix = text[-length:]
+        if any(tag.startswith(suffix) for tag in _OPENING_TAGS):
+            return length
+    return 0
+
+
+class StyleTagParser:
+    """
+    Strips <style_request> and <metadata>...</metadata> from a streamed answer chunk by chunk.
+    `style_description` is set as soon as both tags have been seen, so the outfit search can start
+    before the answer is complete.
+    """
+
+    def __init__(self):
+        self.style_requested = False
+        self.metadata = None
+        self._buffer = ""
+        self._in_metadata = False
+
+    @property
+    def style_description(self):
+        if self.style_requested and self.metadata is not None:
+            return self.metadata or DEFAULT_STYLE_DESCRIPTION
+        return None
+
+    def feed(self, chunk: str) -> str:
+        """Consumes a chunk and returns the text that is safe to show to the user."""
+        self._buffer += chunk
+        visible = []
+
+        while self._buffer:
+            if self._in_metadata:
+                end = self._buffer.find(METADATA_CLOSE_TAG)
+                if end == -1:
+                    break
+                self.metadata = self._buffer[:end].strip()
+                self._buffer = self._buffer[end + len(METADATA_CLOSE_TAG):]
+                self._in_metadata = False
+                continue
+
+            positions = [(self._buffer.find(tag), tag) for tag in _OPENING_TAGS]
+            positions = [(position, tag) for position, tag in positions if position != -1]
+            if not positions:
+                keep = _held_back_length(self._buffer)
+                visible.append(self._buffer[:len(self._buffer) - keep])
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                break
+
+            position, tag = min(positions)
+            visible.append(self._buffer[:position])
+            self._buffer = self._buffer[position + len(tag):]
+            if tag == STYLE_REQUEST_TAG:
+                self.style_requested = True
+            else:
+                self._in_metadata = True
+
+        return "".join(visible)
+
+    def finish(self) -> str:
+        """Flushes the rest of the answer. An unterminated <metadata> block is dropped."""
+        rest = "" if self._in_metadata else self._buffer
+        self._buffer = ""
+        self._in_metadata = False
+        if self.style_requested and self.metadata is None:
+            self.metadata = ""
+        return rest
+
+
+def parse_style_tags(answer: str):
+    """Returns (answer without tags, style description or None) for a complete answer."""
+    parser = StyleTagParser()
+    clean_answer = parser.feed(answer) + parser.finish()
+    return clean_answer.strip(), parser.style_description
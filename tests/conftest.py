@@ -0,0 +1,25 @@
+import pytest
+
+
+class FakeClock:
+    """Stands in for the `time` module of the code under test; advanced by hand."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
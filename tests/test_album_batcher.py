@@ -0,0 +1,59 @@
+import asyncio
+
+from src.services.telegram.album_batcher import AlbumBatcher
+
+
+class Recorder:
+    def __init__(self):
+        self.flushed = []
+
+    async def __call__(self, key, items):
+        self.flushed.append((key, items))
+
+
+async def test_album_is_flushed_once_after_the_quiet_window():
+    recorder = Recorder()
+    batcher = AlbumBatcher(recorder, window_seconds=0.05)
+    batcher.add("album", 1)
+    await asyncio.sleep(0.03)
+    batcher.add("album", 2)
+    await asyncio.sleep(0.03)
+
+    assert recorder.flushed == []
+    await asyncio.sleep(0.05)
+    assert recorder.flushed == [("album", [1, 2])]
+
+
+async def test_full_album_is_flushed_without_waiting():
+    recorder = Recorder()
+    batcher = AlbumBatcher(recorder, window_seconds=10, max_items=2)
+    batcher.add("album", 1)
+    batcher.add("album", 2)
+    await asyncio.sleep(0)
+
+    assert recorder.flushed == [("album", [1, 2])]
+
+
+async def test_albums_are_batched_separately():
+    recorder = Recorder()
+    batcher = AlbumBatcher(recorder, window_seconds=0.01)
+    batcher.add("a", 1)
+    batcher.add("b", 2)
+    batcher.add("a", 3)
+    await asyncio.sleep(0.05)
+
+    assert sorted(recorder.flushed) == [("a", [1, 3]), ("b", [2])]
+
+
+async def test_shutdown_flushes_pending_albums_and_waits_for_callbacks():
+    done = []
+
+    async def slow_flush(key, items):
+        await asyncio.sleep(0.01)
+        done.append((key, items))
+
+    batcher = AlbumBatcher(slow_flush, window_seconds=10)
+    batcher.add("album", 1)
+    await batcher.shutdown()
+
+    assert done == [("album", [1])]
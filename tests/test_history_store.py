@@ -0,0 +1,119 @@
+import pytest
+
+from src.services.open_ai import history_store
+from src.services.open_ai.history_store import InMemoryHistoryStore, SQLiteHistoryStore, create_history_store
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    def make(**kwargs):
+        return SQLiteHistoryStore(str(tmp_path / "history.sqlite3"), **kwargs)
+    return make
+
+
+async def test_memory_store_keeps_the_last_turns_per_user():
+    store = InMemoryHistoryStore(max_turns=2)
+    await store.append(1, "user", "hi")
+    await store.append(1, "assistant", "hello")
+    await store.append(1, "user", "bye")
+
+    assert await store.get_messages(1) == [
+        {"role": "assistant", "content": "hello"},
+        {"role": "user", "content": "bye"},
+    ]
+    assert store.stats() == {"users": 1, "chars": 8}
+
+
+async def test_memory_store_trims_to_user_chars_but_keeps_the_latest_turn():
+    store = InMemoryHistoryStore(max_user_chars=5)
+    await store.append(1, "user", "abc")
+    await store.append(1, "assistant", "defgh")
+    await store.append(1, "user", "0123456789")
+
+    assert await store.get_messages(1) == [{"role": "user", "content": "0123456789"}]
+
+
+async def test_memory_store_expires_idle_users(monkeypatch, clock):
+    monkeypatch.setattr(history_store, "time", clock)
+    store = InMemoryHistoryStore(idle_ttl_seconds=60)
+    await store.append(1, "user", "hi")
+    clock.advance(30)
+    await store.append(2, "user", "hi")
+    clock.advance(40)
+
+    assert await store.get_messages(1) == []
+    assert await store.get_messages(2) == [{"role": "user", "content": "hi"}]
+
+
+async def test_memory_store_evicts_least_recently_used_users():
+    store = InMemoryHistoryStore(max_users=2, max_total_chars=100)
+    await store.append(1, "user", "a")
+    await store.append(2, "user", "b")
+    await store.get_messages(1)
+    await store.append(3, "user", "c")
+
+    assert await store.get_messages(2) == []
+    assert await store.get_messages(1) != []
+    assert store.stats()["users"] == 2
+
+
+async def test_memory_store_fold_replaces_turns_only_if_unchanged():
+    store = InMemoryHistoryStore()
+    await store.append(1, "user", "hi")
+    await store.append(1, "assistant", "hello")
+
+    assert not await store.fold(1, "summary", [{"role": "user", "content": "other"}])
+    assert await store.fold(1, "greeted", [{"role": "user", "content": "hi"}])
+    assert await store.get_summary(1) == "greeted"
+    assert await store.get_messages(1) == [{"role": "assistant", "content": "hello"}]
+    assert store.stats()["chars"] == len("hello") + len("greeted")
+
+
+async def test_sqlite_store_trims_and_survives_reopening(sqlite_store):
+    store = sqlite_store(max_turns=2)
+    for content in ("one", "two", "three"):
+        await store.append(1, "user", content)
+    await store.close()
+
+    store = sqlite_store(max_turns=2)
+    assert [turn["content"] for turn in await store.get_messages(1)] == ["two", "three"]
+    assert store.stats() == {"users": 1, "chars": len("twothree")}
+    await store.close()
+
+
+async def test_sqlite_store_drops_least_recently_active_users_over_total_chars(monkeypatch, clock, sqlite_store):
+    monkeypatch.setattr(history_store, "time", clock)
+    store = sqlite_store(max_total_chars=10)
+    await store.append(1, "user", "aaaa")
+    clock.advance(1)
+    await store.append(2, "user", "bbbb")
+    clock.advance(1)
+    await store.get_messages(1)
+    clock.advance(1)
+    await store.append(3, "user", "cccc")
+
+    assert await store.get_messages(2) == []
+    assert await store.get_messages(1) != []
+    assert store.stats() == {"users": 2, "chars": 8}
+    await store.close()
+
+
+async def test_sqlite_store_counts_folded_summaries_and_cleared_users(sqlite_store):
+    store = sqlite_store()
+    await store.append(1, "user", "hi")
+    await store.append(1, "assistant", "hello")
+    assert await store.fold(1, "greeted", [{"role": "user", "content": "hi"}])
+    assert store.stats()["chars"] == len("hello") + len("greeted")
+
+    await store.clear(1)
+    assert await store.get_summary(1) == ""
+    assert store.stats() == {"users": 0, "chars": 0}
+    await store.close()
+
+
+def test_create_history_store_passes_the_total_cap_to_both_backends(tmp_path):
+    memory = create_history_store("memory", "", max_total_chars=123)
+    sqlite = create_history_store("sqlite", str(tmp_path / "history.sqlite3"), max_total_chars=456)
+
+    assert memory.max_total_chars == 123
+    assert sqlite.max_total_chars == 456
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from src.services.http_server.http_server import HttpResponse, HttpServer
+
+
+@pytest.fixture
+async def server():
+    async def echo(request):
+        return HttpResponse(200, request.body)
+
+    server = HttpServer("127.0.0.1", 0, max_body_bytes=16)
+    server.add_route("POST", "/echo", echo)
+    await server.start()
+    yield server
+    await server.stop()
+
+
+async def send(server: HttpServer, content_length: str, body: bytes = b"") -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(f"POST /echo HTTP/1.1\r\nContent-Length: {content_length}\r\nConnection: close\r\n\r\n"
+                 .encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def test_body_is_read_by_content_length(server):
+    response = await send(server, "5", b"hello")
+
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert response.endswith(b"\r\n\r\nhello")
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-1", "1.5"])
+async def test_invalid_content_length_is_a_bad_request(server, content_length):
+    assert (await send(server, content_length)).startswith(b"HTTP/1.1 400 Bad Request")
+
+
+async def test_body_over_the_limit_is_rejected(server):
+    assert (await send(server, "17")).startswith(b"HTTP/1.1 413 Payload Too Large")
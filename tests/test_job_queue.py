@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from src.services.job_queue.job_queue import FAILED, QUEUED, RUNNING, JobQueue, SQLiteJobStore, create_job_queue
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def make_queue(store_path: str, **kwargs) -> JobQueue:
+    kwargs = {"workers": 2, "backoff_base": 0.001, "backoff_max": 0.01, "poll_interval": 0.05, **kwargs}
+    return JobQueue(SQLiteJobStore(store_path), **kwargs)
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+async def test_jobs_are_run_by_their_handler(store_path):
+    queue = make_queue(store_path)
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload)
+
+    queue.register("photos", handler)
+    await queue.start()
+    assert await queue.enqueue("photos", {"user_id": 1})
+    await wait_for(lambda: queue.completed == 1)
+    await queue.stop()
+
+    assert handled == [{"user_id": 1}]
+
+
+async def test_jobs_with_known_keys_are_not_queued_again(store_path):
+    queue = make_queue(store_path)
+
+    assert await queue.enqueue("photos", {"n": 1}, keys=["file-a", "file-b"])
+    assert not await queue.enqueue("photos", {"n": 2}, keys=["file-b", "file-a"])
+    assert await queue.enqueue("photos", {"n": 3}, keys=["file-a", "file-c"])
+    assert await queue.enqueue("other", {"n": 4}, keys=["file-a"])
+
+    assert queue.stats()["duplicates"] == 1
+    assert queue.stats()["queued"] == 3
+    await queue.stop()
+
+
+async def test_failing_job_is_retried_with_backoff_then_reported(store_path):
+    queue = make_queue(store_path, max_attempts=3)
+    attempts, failures = [], []
+
+    async def handler(payload):
+        attempts.append(payload)
+        raise RuntimeError("boom")
+
+    async def on_failure(payload):
+        failures.append(payload)
+
+    queue.register("photos", handler, on_failure)
+    await queue.start()
+    await queue.enqueue("photos", {"user_id": 1})
+    await wait_for(lambda: failures)
+
+    assert len(attempts) == 3
+    assert failures == [{"user_id": 1}]
+    stats = queue.stats()
+    assert (stats["retried"], stats["failed"], stats["failed_jobs"], stats["queued"]) == (2, 1, 1, 0)
+    await queue.stop()
+
+
+async def test_job_that_succeeds_on_retry_is_completed(store_path):
+    queue = make_queue(store_path)
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise RuntimeError("flaky")
+
+    queue.register("photos", handler)
+    await queue.start()
+    await queue.enqueue("photos", {})
+    await wait_for(lambda: queue.completed == 1)
+    await queue.stop()
+
+    assert len(attempts) == 2
+    assert queue.retried == 1
+
+
+async def test_jobs_interrupted_by_a_restart_run_again(store_path):
+    store = SQLiteJobStore(store_path)
+    store.add("photos", '{"user_id": 1}', ["photos:file-a"])
+    store.claim()
+    store.close()
+
+    queue = make_queue(store_path)
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload)
+
+    queue.register("photos", handler)
+    await queue.start()
+    await wait_for(lambda: handled)
+    await queue.stop()
+
+    assert handled == [{"user_id": 1}]
+    store = SQLiteJobStore(store_path)
+    assert (store.count(QUEUED), store.count(RUNNING)) == (0, 0)
+    store.close()
+
+
+async def test_stats_are_counted_in_memory_and_zero_after_stop(store_path):
+    store = SQLiteJobStore(store_path)
+    store.add("photos", "{}", [])
+    job_id = store.add("photos", "{}", [])
+    store.finish(job_id, FAILED)
+    store.close()
+
+    queue = make_queue(store_path)
+    release = asyncio.Event()
+
+    async def handler(payload):
+        await release.wait()
+
+    queue.register("photos", handler)
+    await queue.start()
+    await wait_for(lambda: queue.stats()["running"] == 1)
+    await queue.enqueue("photos", {})
+    await asyncio.sleep(0.01)
+
+    stats = queue.stats()
+    assert (stats["running"], stats["failed_jobs"]) == (2, 1)
+    release.set()
+    await wait_for(lambda: queue.completed == 2)
+
+    await queue.stop()
+    stats = queue.stats()
+    assert (stats["queued"], stats["running"], stats["failed_jobs"]) == (0, 0, 0)
+    assert stats["oldest_queued_age_seconds"] == 0
+    assert stats["completed"] == 2
+
+
+async def test_oldest_queued_age_tracks_waiting_jobs(store_path):
+    queue = make_queue(store_path)
+    await queue.enqueue("photos", {})
+    await asyncio.sleep(0.02)
+
+    assert queue.stats()["oldest_queued_age_seconds"] >= 0.01
+    await queue.stop()
+
+
+def test_create_job_queue_without_a_backend_returns_none(store_path):
+    assert create_job_queue("none", store_path, retention_seconds=60) is None
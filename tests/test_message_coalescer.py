@@ -0,0 +1,88 @@
+import asyncio
+
+from src.services.telegram.message_coalescer import MessageCoalescer, mark_answer_stored
+
+
+class Answerer:
+    """Records every callback; each answer waits for `release` and may store its turns first."""
+
+    def __init__(self, store_first: bool = False):
+        self.store_first = store_first
+        self.started = []
+        self.answered = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, user_id: int, text: str):
+        self.started.append((user_id, text))
+        if self.store_first:
+            mark_answer_stored()
+        await self.release.wait()
+        self.answered.append((user_id, text))
+
+
+async def test_burst_of_messages_is_answered_once():
+    answerer = Answerer()
+    answerer.release.set()
+    coalescer = MessageCoalescer(answerer, window_seconds=0.02)
+    coalescer.add(1, "hi")
+    coalescer.add(1, "are you there?")
+    coalescer.add(2, "hello")
+    await asyncio.sleep(0.05)
+
+    assert sorted(answerer.answered) == [(1, "hi\nare you there?"), (2, "hello")]
+    assert coalescer.stats()["merged"] == 1
+    assert coalescer.stats()["dispatched"] == 2
+
+
+async def test_max_delay_bounds_a_long_burst():
+    answerer = Answerer()
+    answerer.release.set()
+    coalescer = MessageCoalescer(answerer, window_seconds=10, max_delay_seconds=0.05)
+    coalescer.add(1, "a")
+    await asyncio.sleep(0.01)
+    coalescer.add(1, "b")
+    await asyncio.sleep(0.1)
+
+    assert answerer.answered == [(1, "a\nb")]
+
+
+async def test_new_message_cancels_an_unstored_answer_and_is_merged_with_it():
+    answerer = Answerer()
+    coalescer = MessageCoalescer(answerer, window_seconds=0.01)
+    coalescer.add(1, "first")
+    await asyncio.sleep(0.03)
+    assert answerer.started == [(1, "first")]
+
+    coalescer.add(1, "second")
+    answerer.release.set()
+    await asyncio.sleep(0.03)
+
+    assert answerer.answered == [(1, "first\nsecond")]
+    assert coalescer.stats()["superseded"] == 1
+
+
+async def test_stored_answer_is_not_cancelled_or_merged_again():
+    answerer = Answerer(store_first=True)
+    coalescer = MessageCoalescer(answerer, window_seconds=0.01)
+    coalescer.add(1, "first")
+    await asyncio.sleep(0.03)
+
+    coalescer.add(1, "second")
+    await asyncio.sleep(0.03)
+    assert answerer.started == [(1, "first"), (1, "second")]
+
+    answerer.release.set()
+    await coalescer.shutdown()
+    assert sorted(answerer.answered) == [(1, "first"), (1, "second")]
+    assert coalescer.stats()["superseded"] == 0
+
+
+async def test_shutdown_answers_waiting_messages():
+    answerer = Answerer()
+    answerer.release.set()
+    coalescer = MessageCoalescer(answerer, window_seconds=10)
+    coalescer.add(1, "bye")
+    await coalescer.shutdown()
+
+    assert answerer.answered == [(1, "bye")]
+    assert coalescer.stats()["running"] == 0
@@ -0,0 +1,67 @@
+from src.services.wardrobe_index import outfit_cache
+from src.services.wardrobe_index.outfit_cache import OutfitCache
+
+
+def test_rephrased_requests_share_a_key():
+    assert OutfitCache.make_key(1, 2, "Smart, casual!") == OutfitCache.make_key("1", 2, "casual smart")
+    assert OutfitCache.make_key(1, 2, "casual") != OutfitCache.make_key(1, 3, "casual")
+
+
+def test_stored_outfit_is_returned_as_a_copy():
+    cache = OutfitCache()
+    key = cache.make_key(1, 0, "casual")
+    assert cache.get(key) is None
+
+    cache.put(key, ["a", "b"])
+    outfit = cache.get(key)
+    outfit.append("c")
+
+    assert cache.get(key) == ["a", "b"]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_lookups_miss_until_all_alternatives_are_collected_then_rotate():
+    cache = OutfitCache(alternatives=2)
+    key = cache.make_key(1, 0, "casual")
+    cache.put(key, ["a"])
+    assert cache.get(key) is None
+
+    cache.put(key, ["a"])
+    assert cache.get(key) is None
+    cache.put(key, ["b"])
+
+    assert [cache.get(key) for _ in range(3)] == [["a"], ["b"], ["a"]]
+
+
+def test_empty_outfits_are_not_stored():
+    cache = OutfitCache()
+    key = cache.make_key(1, 0, "casual")
+    cache.put(key, [])
+
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch, clock):
+    monkeypatch.setattr(outfit_cache, "time", clock)
+    cache = OutfitCache(ttl_seconds=10)
+    key = cache.make_key(1, 0, "casual")
+    cache.put(key, ["a"])
+
+    clock.advance(11)
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = OutfitCache(max_entries=2)
+    first, second, third = (cache.make_key(1, 0, style) for style in ("one", "two", "three"))
+    cache.put(first, ["a"])
+    cache.put(second, ["b"])
+    cache.get(first)
+    cache.put(third, ["c"])
+
+    assert cache.get(second) is None
+    assert cache.get(first) == ["a"]
+    assert cache.get(third) == ["c"]
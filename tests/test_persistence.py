@@ -0,0 +1,83 @@
+import asyncio
+
+from src.services.telegram.persistence import CoalescingPersistence, SQLiteStateStore, StateStore
+
+
+class FakeStateStore(StateStore):
+    def __init__(self, rows=(), fail_writes: int = 0):
+        self.rows = list(rows)
+        self.fail_writes = fail_writes
+        self.writes = []
+        self.closed = False
+
+    def load(self) -> list:
+        return self.rows
+
+    def write(self, changes: dict):
+        if self.fail_writes:
+            self.fail_writes -= 1
+            raise OSError("store unavailable")
+        self.writes.append(dict(changes))
+
+    def close(self):
+        self.closed = True
+
+
+async def test_stored_rows_are_restored():
+    store = FakeStateStore([
+        ("user_data", "1", '{"lang": "uk"}'),
+        ("conversation", 'survey:[1, 1]', "2"),
+        ("conversation", 'other:[1, 1]', "5"),
+    ])
+    persistence = CoalescingPersistence(store)
+
+    assert await persistence.get_user_data() == {1: {"lang": "uk"}}
+    assert await persistence.get_conversations("survey") == {(1, 1): 2}
+
+
+async def test_changes_staged_together_are_written_in_one_batch():
+    store = FakeStateStore()
+    persistence = CoalescingPersistence(store)
+    await persistence.update_user_data(1, {"lang": "en"})
+    await persistence.update_user_data(1, {"lang": "uk"})
+    await persistence.update_conversation("survey", (1, 1), 3)
+    await persistence.drop_user_data(2)
+    await asyncio.sleep(0.05)
+
+    assert store.writes == [{
+        ("user_data", "1"): '{"lang": "uk"}',
+        ("conversation", "survey:[1, 1]"): "3",
+        ("user_data", "2"): None,
+    }]
+    assert persistence.stats() == {"pending": 0, "batches": 1, "rows_written": 3, "failed_batches": 0}
+
+
+async def test_failed_batch_is_kept_and_newer_values_win_on_retry():
+    store = FakeStateStore(fail_writes=1)
+    persistence = CoalescingPersistence(store)
+    await persistence.update_user_data(1, {"step": 1})
+    await asyncio.sleep(0.05)
+    assert persistence.stats()["failed_batches"] == 1
+    assert persistence.stats()["pending"] == 1
+
+    await persistence.update_user_data(1, {"step": 2})
+    await persistence.flush()
+
+    assert store.writes == [{("user_data", "1"): '{"step": 2}'}]
+    assert store.closed
+
+
+async def test_sqlite_store_round_trip(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    persistence = CoalescingPersistence(SQLiteStateStore(path))
+    await persistence.update_user_data(1, {"lang": "uk"})
+    await persistence.update_conversation("survey", (1, 1), 4)
+    await persistence.flush()
+
+    restored = CoalescingPersistence(SQLiteStateStore(path))
+    assert await restored.get_user_data() == {1: {"lang": "uk"}}
+    assert await restored.get_conversations("survey") == {(1, 1): 4}
+
+    await restored.update_conversation("survey", (1, 1), None)
+    await restored.flush()
+    assert await CoalescingPersistence(SQLiteStateStore(path)).get_conversations("survey") == {}
@@ -0,0 +1,66 @@
+import httpx
+import openai
+
+from src.services.bucket_s3 import presigned_url_cache
+from src.services.bucket_s3.bucket_s3_service import S3ImageStorage
+from src.services.bucket_s3.presigned_url_cache import PresignedUrlCache
+from src.services.open_ai.open_ai_chat import is_image_url_error
+from src.services.open_ai.request_scheduler import OpenAIRequestError
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.signed = 0
+
+    def generate_presigned_url(self, ClientMethod: str, Params: dict, ExpiresIn: int) -> str:
+        self.signed += 1
+        return f"https://s3.test/{Params['Key']}?expires={ExpiresIn}&n={self.signed}"
+
+
+def make_storage() -> S3ImageStorage:
+    storage = S3ImageStorage(transport=None, region_name="test", bucket_name="bucket", url_expires_in=600)
+    storage.s3_client = FakeS3Client()
+    return storage
+
+
+def request_error(status: int, code: str = None, message: str = "error") -> OpenAIRequestError:
+    response = httpx.Response(status, request=httpx.Request("POST", "https://api.test/v1"))
+    body = {"message": message, "code": code}
+    try:
+        raise OpenAIRequestError("failed") from openai.APIStatusError(message, response=response, body=body)
+    except OpenAIRequestError as e:
+        return e
+
+
+def test_cached_url_is_reused_until_the_refresh_margin(monkeypatch, clock):
+    monkeypatch.setattr(presigned_url_cache, "time", clock)
+    cache = PresignedUrlCache(refresh_margin_seconds=100)
+    cache.put("key", 600, "url", signed_at=clock.monotonic())
+
+    clock.advance(499)
+    assert cache.get("key", 600) == "url"
+    assert cache.get("key", 300) is None
+    clock.advance(2)
+    assert cache.get("key", 600) is None
+    assert cache.stats()["hits"] == 1
+
+
+async def test_presigned_urls_are_cached_unless_asked_not_to():
+    storage = make_storage()
+
+    first = await storage.generate_tempo_url_url("user_1/photo.jpg")
+    assert await storage.generate_tempo_url_url("user_1/photo.jpg") == first
+    assert await storage.generate_tempo_url_url("user_1/new.jpg", cache=False) != \
+        await storage.generate_tempo_url_url("user_1/new.jpg", cache=False)
+
+    assert storage.s3_client.signed == 3
+    assert storage.url_cache.stats()["entries"] == 1
+
+
+def test_only_download_failures_count_as_image_url_errors():
+    assert is_image_url_error(request_error(400, "invalid_image_url"))
+    assert is_image_url_error(request_error(400, message="Timeout while downloading https://s3.test/x"))
+    assert not is_image_url_error(request_error(400, "invalid_request_error"))
+    assert not is_image_url_error(request_error(429, "rate_limit_exceeded"))
+    assert not is_image_url_error(request_error(500))
+    assert not is_image_url_error(OpenAIRequestError("failed after retries"))
@@ -0,0 +1,66 @@
+from src.services.dynamo_db import profile_cache
+from src.services.dynamo_db.profile_cache import ProfileCache
+
+
+def test_get_returns_a_copy_and_counts_hits_and_misses():
+    cache = ProfileCache()
+    assert cache.get("1") is None
+
+    cache.set("1", {"user_id": "1", "style": "casual"})
+    item = cache.get("1")
+    item["style"] = "changed"
+
+    assert cache.get("1")["style"] == "casual"
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch, clock):
+    monkeypatch.setattr(profile_cache, "time", clock)
+    cache = ProfileCache(ttl_seconds=10)
+    cache.set("1", {"user_id": "1"})
+
+    clock.advance(9)
+    assert cache.get("1") is not None
+    clock.advance(2)
+    assert cache.get("1") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = ProfileCache(max_entries=2)
+    cache.set("1", {"user_id": "1"})
+    cache.set("2", {"user_id": "2"})
+    cache.get("1")
+    cache.set("3", {"user_id": "3"})
+
+    assert cache.get("2") is None
+    assert cache.get("1") is not None
+    assert cache.get("3") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_cap_evicts_and_oversized_items_are_not_cached():
+    small = {"user_id": "1", "style": "x" * 10}
+    cache = ProfileCache(max_bytes=2 * len(str(small)) + 20)
+    cache.set("1", small)
+    cache.set("2", {**small, "user_id": "2"})
+    cache.set("3", {**small, "user_id": "3"})
+    assert cache.get("1") is None
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+    cache.set("big", {"user_id": "big", "style": "x" * 1000})
+    assert cache.get("big") is None
+
+
+def test_update_merges_into_cached_items_only():
+    cache = ProfileCache()
+    cache.update("1", {"wardrobe_version": 2})
+    assert cache.get("1") is None
+
+    cache.set("1", {"user_id": "1", "wardrobe_version": 1})
+    cache.update("1", {"wardrobe_version": 2})
+    assert cache.get("1") == {"user_id": "1", "wardrobe_version": 2}
+
+    cache.invalidate("1")
+    assert cache.get("1") is None
@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from src.services.open_ai import request_scheduler
+from src.services.open_ai.request_scheduler import (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_STYLE,
+                                                    OpenAIRequestError, RequestScheduler, TokenBucket)
+
+
+def api_error(error_type, status: int, headers: dict = None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api.test/v1"))
+    return error_type("error", response=response, body=None)
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch, clock):
+    monkeypatch.setattr(request_scheduler, "time", clock)
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.consume(60)
+
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.advance(0.5)
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    assert bucket.wait_time(1000) == pytest.approx(59.5)
+
+
+async def test_concurrency_cap_admits_requests_one_by_one():
+    scheduler = RequestScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    running = []
+
+    async def call(name):
+        running.append(name)
+        await release.wait()
+        return name
+
+    first = asyncio.create_task(scheduler.run(lambda: call("first")))
+    second = asyncio.create_task(scheduler.run(lambda: call("second")))
+    await asyncio.sleep(0.01)
+
+    assert running == ["first"]
+    assert scheduler.stats()["in_flight"] == 1
+    assert scheduler.stats()["queue_depth"]["interactive"] == 1
+
+    release.set()
+    assert await asyncio.gather(first, second) == ["first", "second"]
+    assert scheduler.stats()["in_flight"] == 0
+
+
+async def test_waiting_requests_are_admitted_in_priority_order():
+    scheduler = RequestScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    async def call(name):
+        order.append(name)
+        await release.wait()
+
+    blocker = asyncio.create_task(scheduler.run(lambda: call("blocker")))
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(scheduler.run(lambda name=name: call(name), priority=priority))
+        for name, priority in (("background", PRIORITY_BACKGROUND), ("style", PRIORITY_STYLE),
+                               ("interactive", PRIORITY_INTERACTIVE))
+    ]
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(blocker, *tasks)
+
+    assert order == ["blocker", "interactive", "style", "background"]
+
+
+async def test_retry_after_delays_the_retry_and_pauses_admission():
+    scheduler = RequestScheduler(backoff_base=0.001)
+    attempts = []
+
+    async def call():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) == 1:
+            raise api_error(openai.RateLimitError, 429, {"retry-after-ms": "50"})
+        return "ok"
+
+    assert await scheduler.run(call) == "ok"
+    assert attempts[1] - attempts[0] >= 0.045
+    assert scheduler.stats()["retries"] == 1
+
+    error = api_error(openai.RateLimitError, 429, {"retry-after": "5"})
+    assert scheduler.backoff_delay(0, error) >= 5
+    other = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(0)))
+    await asyncio.sleep(0.01)
+    assert not other.done()
+    other.cancel()
+
+
+async def test_status_errors_are_not_retried():
+    scheduler = RequestScheduler()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise api_error(openai.BadRequestError, 400)
+
+    with pytest.raises(OpenAIRequestError) as raised:
+        await scheduler.run(call)
+
+    assert isinstance(raised.value.__cause__, openai.BadRequestError)
+    assert len(calls) == 1
+    assert scheduler.stats()["failures"] == 1
+
+
+async def test_transient_errors_give_up_after_max_retries():
+    scheduler = RequestScheduler(max_retries=2, backoff_base=0.001)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise api_error(openai.InternalServerError, 500)
+
+    with pytest.raises(OpenAIRequestError):
+        await scheduler.run(call)
+
+    assert len(calls) == 3
+    assert scheduler.stats()["retries"] == 2
@@ -0,0 +1,52 @@
+import pytest
+
+from src.utils.style_tags import DEFAULT_STYLE_DESCRIPTION, StyleTagParser, parse_style_tags
+
+ANSWER = "Here is an idea. <style_request><metadata>smart casual, navy</metadata> Enjoy!"
+
+
+def test_parse_style_tags_strips_tags_and_returns_the_description():
+    assert parse_style_tags(ANSWER) == ("Here is an idea.  Enjoy!", "smart casual, navy")
+
+
+def test_answer_without_tags_has_no_style_description():
+    assert parse_style_tags("Just chatting") == ("Just chatting", None)
+
+
+def test_style_request_without_metadata_uses_the_default_description():
+    assert parse_style_tags("Sure <style_request>") == ("Sure", DEFAULT_STYLE_DESCRIPTION)
+
+
+def test_metadata_without_style_request_is_hidden_but_not_a_request():
+    assert parse_style_tags("Hi <metadata>casual</metadata>") == ("Hi", None)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16])
+def test_streamed_chunks_give_the_same_result_as_a_complete_answer(chunk_size):
+    parser = StyleTagParser()
+    visible = "".join(parser.feed(ANSWER[i:i + chunk_size]) for i in range(0, len(ANSWER), chunk_size))
+    visible += parser.finish()
+
+    assert visible.strip() == "Here is an idea.  Enjoy!"
+    assert parser.style_description == "smart casual, navy"
+
+
+def test_partial_opening_tag_is_held_back_until_it_is_decided():
+    parser = StyleTagParser()
+    assert parser.feed("Hello <sty") == "Hello "
+    assert parser.feed("lish") == "<stylish"
+    assert parser.finish() == ""
+
+
+def test_style_description_is_known_before_the_answer_ends():
+    parser = StyleTagParser()
+    parser.feed("<style_request><metadata>boho</metadata> and more text")
+
+    assert parser.style_description == "boho"
+
+
+def test_unterminated_metadata_is_dropped():
+    parser = StyleTagParser()
+    assert parser.feed("Text <style_request><metadata>never closed") == "Text "
+    assert parser.finish() == ""
+    assert parser.style_description == DEFAULT_STYLE_DESCRIPTION
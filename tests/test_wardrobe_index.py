@@ -0,0 +1,43 @@
+from src.services.open_ai.embeddings import HashingEmbeddingProvider
+from src.services.wardrobe_index.wardrobe_index import WardrobeIndex
+
+
+class CountingProvider(HashingEmbeddingProvider):
+    def __init__(self, dimensions: int = 32):
+        super().__init__(dimensions)
+        self.embedded = []
+
+    async def embed(self, texts: list, priority: int = 0):
+        self.embedded.extend(texts)
+        return await super().embed(texts, priority)
+
+
+async def test_load_embeds_only_items_without_a_vector_and_returns_them():
+    provider = CountingProvider()
+    index = WardrobeIndex(provider)
+    stored = (await provider.embed(["Navy cotton shirt"]))[0]
+    provider.embedded.clear()
+
+    embedded = await index.load(1, [
+        {"s3_key": "a", "summary": "Navy cotton shirt", "embedding": stored.tobytes()},
+        {"s3_key": "b", "summary": "Black leather boots"},
+    ])
+
+    assert provider.embedded == ["Black leather boots"]
+    assert list(embedded) == ["b"]
+    assert index.size(1) == 2
+
+
+async def test_top_k_per_category_ranks_by_similarity():
+    index = WardrobeIndex(CountingProvider(dimensions=256))
+    await index.load(1, [
+        {"s3_key": "shirt", "summary": "Navy cotton shirt"},
+        {"s3_key": "tee", "summary": "White cotton t-shirt"},
+        {"s3_key": "boots", "summary": "Black leather boots"},
+    ])
+
+    query = await index.embed_one("navy shirt")
+    candidates = index.top_k_per_category(1, query, k=1)
+
+    assert ("shirt", "Navy cotton shirt", "top") in candidates
+    assert {category for _, _, category in candidates} == {"top", "shoes"}
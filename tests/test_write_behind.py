@@ -0,0 +1,127 @@
+import asyncio
+
+from src.services.dynamo_db.write_behind import PendingWrites, WriteBehindBuffer
+
+
+class Writer:
+    """Records the batches it is given; fails the first `failures` of them for every user."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+        self.release = None
+
+    async def __call__(self, batch: dict) -> dict:
+        if self.release is not None:
+            await self.release.wait()
+        self.batches.append(batch)
+        if self.failures:
+            self.failures -= 1
+            return batch
+        return {}
+
+
+def item(s3_key: str) -> dict:
+    return {"s3_key": s3_key}
+
+
+async def test_writes_of_all_users_are_flushed_together_after_the_interval():
+    writer = Writer()
+    buffer = WriteBehindBuffer(writer, interval=0.02)
+    buffer.add_wardrobe_items("1", [item("a")])
+    buffer.set_survey("2", {"style": "casual"})
+    assert writer.batches == []
+
+    await asyncio.sleep(0.05)
+    assert len(writer.batches) == 1
+    assert set(writer.batches[0]) == {"1", "2"}
+    assert buffer.stats()["items_written"] == 1
+
+
+async def test_reaching_max_items_flushes_without_waiting():
+    writer = Writer()
+    buffer = WriteBehindBuffer(writer, interval=10, max_items=2)
+    buffer.add_wardrobe_items("1", [item("a"), item("b")])
+    await asyncio.sleep(0)
+
+    assert len(writer.batches) == 1
+    await buffer.close()
+
+
+async def test_queued_and_in_flight_writes_are_overlaid_on_reads():
+    writer = Writer()
+    writer.release = asyncio.Event()
+    buffer = WriteBehindBuffer(writer, interval=10)
+    buffer.add_wardrobe_items("1", [item("a")])
+    flush = asyncio.create_task(buffer.flush())
+    await asyncio.sleep(0)
+    buffer.add_wardrobe_items("1", [item("b")])
+    buffer.set_survey("1", {"style": "boho"})
+
+    user = buffer.overlay_user("1", {"user_id": "1", "wardrobe_version": 3})
+    assert user["wardrobe_version"] == 5
+    assert user["style"] == "boho"
+    assert buffer.overlay_wardrobe("1", [item("a")]) == [item("a"), item("b")]
+    assert buffer.overlay_user("1", None) is None
+
+    writer.release.set()
+    await flush
+    await buffer.close()
+    assert buffer.overlay_wardrobe("1", []) == []
+
+
+async def test_failed_writes_are_requeued_ahead_of_newer_ones():
+    writer = Writer(failures=1)
+    writer.release = asyncio.Event()
+    buffer = WriteBehindBuffer(writer, interval=10)
+    buffer.add_wardrobe_items("1", [item("a")])
+    buffer.set_survey("1", {"style": "old"})
+    flush = asyncio.create_task(buffer.flush())
+    await asyncio.sleep(0)
+    buffer.add_wardrobe_items("1", [item("b")])
+    buffer.set_survey("1", {"style": "new"})
+    writer.release.set()
+    await flush
+
+    requeued = buffer._pending["1"]
+    assert [entry["s3_key"] for entry in requeued.wardrobe_items] == ["a", "b"]
+    assert requeued.version_bumps == 2
+    assert requeued.survey == {"style": "new"}
+    assert buffer.stats()["failed_flushes"] == 1
+
+    await buffer.close()
+    assert buffer.stats()["pending_users"] == 0
+    assert buffer.stats()["items_written"] == 2
+
+
+async def test_attributes_are_set_on_queued_items_only():
+    buffer = WriteBehindBuffer(Writer(), interval=10)
+    buffer.add_wardrobe_items("1", [item("a")])
+
+    assert buffer.set_item_attribute("1", "file_id", {"a": "file-a", "b": "file-b"}) == {"b": "file-b"}
+    assert buffer._pending["1"].wardrobe_items == [{"s3_key": "a", "file_id": "file-a"}]
+    assert buffer.set_item_attribute("2", "file_id", {"c": "file-c"}) == {"c": "file-c"}
+    await buffer.close()
+
+
+async def test_write_now_waits_for_the_items_and_drops_them_when_they_fail():
+    writer = Writer(failures=1)
+    buffer = WriteBehindBuffer(writer, interval=10)
+    buffer.add_wardrobe_items("1", [item("a")])
+    buffer.add_wardrobe_items("2", [item("b")])
+
+    assert not await buffer.write_now("1", {"a"})
+    assert buffer._pending["1"].wardrobe_items == []
+    assert buffer._pending["2"].wardrobe_items == [item("b")]
+
+    buffer.add_wardrobe_items("1", [item("a")])
+    assert await buffer.write_now("1", {"a"})
+    assert buffer.stats()["pending_users"] == 0
+    await buffer.close()
+
+
+def test_pending_writes_is_empty_until_something_is_queued():
+    writes = PendingWrites()
+    assert not writes
+    writes.version_bumps = 1
+    assert writes